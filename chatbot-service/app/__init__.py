@@ -1,6 +1,7 @@
-from .core.ai.ai_service import get_answer, get_answer_stream
+from .core.ai.ai_service import get_answer, aget_answer, get_answer_stream
 
 __all__ = [
     "get_answer",
+    "aget_answer",
     "get_answer_stream"
 ]
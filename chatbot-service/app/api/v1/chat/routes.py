@@ -1,7 +1,17 @@
 from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.core.ai.ai_service import get_answer, get_answer_stream
+from app.core.ai.ai_service import aget_answer, get_answer_stream
+from app.core.geocoding import geocode_cache
+from app.core.spatial_index import listing_index
+from app.database.async_db_connection import async_db_pool
+from app.database.chat_history_writer import chat_history_writer
+from app.database.chat_history_cache import chat_history_cache
+from app.core.ai.history_compaction import history_compactor
+from app.core.ai.response_cache import response_cache
+from app.core.ai.tools import rental_api_cache
+from app.core.ai.intent_router import intent_router
+from app.core.ai.prompt_cache import prompt_cache_monitor
 import logging
 import json
 from typing import AsyncGenerator, Optional, Dict, Any
@@ -15,6 +25,8 @@ class ChatRequest(BaseModel):
     question: str
     thread_id: str
     query_params: Optional[Dict[str, Any]] = None
+    # Optional stream smoothing: coalesce tokens into frames of N milliseconds
+    stream_frame_ms: Optional[int] = None
 
 class ChatResponse(BaseModel):
     answer: str
@@ -30,7 +42,9 @@ async def chat(request: ChatRequest):
         print(f"============================\n")
         
         logger.info(f"Query parameters: {request.query_params}")
-        result = get_answer(request.question, request.thread_id, request.query_params)
+        # Async agent run: parallel tool calls execute concurrently and the
+        # event loop stays free for other requests
+        result = await aget_answer(request.question, request.thread_id, request.query_params)
         logger.info(f"Got result: {result}")
         
         if not isinstance(result, dict) or "output" not in result:
@@ -44,13 +58,14 @@ async def chat(request: ChatRequest):
             detail=f"Internal server error: {str(e)}"
         )
 
-async def event_generator(question: str, thread_id: str, query_params: Optional[Dict[str, Any]] = None) -> AsyncGenerator[str, None]:
+async def event_generator(question: str, thread_id: str, query_params: Optional[Dict[str, Any]] = None,
+                          frame_ms: Optional[int] = None) -> AsyncGenerator[str, None]:
     try:
         # Send initial event to establish connection
         yield f"data: {json.dumps({'status': 'connected'})}\n\n"
         
         # Stream the response with query parameters
-        async for chunk in get_answer_stream(question, thread_id, query_params):
+        async for chunk in get_answer_stream(question, thread_id, query_params, frame_ms):
             if chunk:  # Only yield if there's content
                 # Ensure proper field names for contact information
                 yield f"data: {json.dumps({'content': chunk})}\n\n"
@@ -85,7 +100,23 @@ async def chat_stream(request: ChatRequest, req: Request = None):
     }
     
     return StreamingResponse(
-        event_generator(request.question, request.thread_id, request.query_params),
+        event_generator(request.question, request.thread_id, request.query_params, request.stream_frame_ms),
         media_type="text/event-stream",
         headers=response_headers
-    ) 
\ No newline at end of file
+    )
+
+@router.get("/stats")
+async def chat_stats():
+    """Cache, index and database counters of the chat service"""
+    return {
+        "geocode_cache": geocode_cache.get_stats(),
+        "listing_index": listing_index.get_stats(),
+        "db_pool": async_db_pool.get_stats(),
+        "chat_history_writer": chat_history_writer.get_stats(),
+        "chat_history_cache": chat_history_cache.get_stats(),
+        "history_compaction": history_compactor.get_stats(),
+        "response_cache": response_cache.get_stats(),
+        "tool_cache": rental_api_cache.get_stats(),
+        "intent_router": intent_router.get_stats(),
+        "prompt_cache": prompt_cache_monitor.get_stats()
+    }
@@ -1,6 +1,7 @@
-from .ai_service import get_answer, get_answer_stream
+from .ai_service import get_answer, aget_answer, get_answer_stream
 
 __all__ = [
     "get_answer",
+    "aget_answer",
     "get_answer_stream"
 ]  
\ No newline at end of file
@@ -0,0 +1,78 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from langchain.agents import AgentExecutor
+
+
+class AgentRegistry:
+    """
+    Process-wide holder for the agent executor.
+
+    The executor (LLM client, system prompt, tools, AgentExecutor) is built
+    once - at startup via warm_up() or lazily on the first request - and is
+    then shared by every chat request. Per-request data is never stored on the
+    executor; it is passed to each invocation through build_config().
+    """
+
+    def __init__(self, factory: Callable[[], AgentExecutor]):
+        """
+        Args:
+            factory (Callable[[], AgentExecutor]): Function building a new executor
+        """
+        self._factory = factory
+        self._executor: Optional[AgentExecutor] = None
+        self._lock = threading.Lock()
+        self.built_at: Optional[float] = None
+        self.build_seconds: Optional[float] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self._executor is not None
+
+    def get(self) -> AgentExecutor:
+        """Return the shared executor, building it on first use"""
+        executor = self._executor
+        if executor is not None:
+            return executor
+
+        with self._lock:
+            if self._executor is None:
+                started = time.perf_counter()
+                self._executor = self._factory()
+                self.build_seconds = time.perf_counter() - started
+                self.built_at = time.time()
+                print(f"[AGENT] Agent executor built in {self.build_seconds * 1000:.1f}ms")
+            return self._executor
+
+    def warm_up(self) -> AgentExecutor:
+        """Build the executor ahead of the first request"""
+        return self.get()
+
+    def reset(self) -> None:
+        """Drop the current executor so the next request rebuilds it"""
+        with self._lock:
+            self._executor = None
+            self.built_at = None
+            self.build_seconds = None
+
+    @staticmethod
+    def build_config(context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build the per-invocation config carrying the request context
+
+        Args:
+            context (Dict[str, Any]): Request context (thread_id, query_params, ...)
+
+        Returns:
+            Dict[str, Any]: RunnableConfig passed to invoke / astream_events
+        """
+        thread_id = context.get("thread_id")
+        return {
+            "run_name": "chat_agent",
+            "metadata": {"thread_id": thread_id},
+            "configurable": {
+                "thread_id": thread_id,
+                "query_params": context.get("query_params") or {},
+            },
+        }
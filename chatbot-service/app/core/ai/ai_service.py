@@ -1,14 +1,13 @@
 from langchain.tools import BaseTool
 from langchain_openai import ChatOpenAI
-from langchain.agents import AgentExecutor, create_openai_functions_agent
+from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 import os
 from typing import List, Dict, AsyncGenerator, Any, Optional
 from dotenv import load_dotenv
-from app.database.chat_history_service import save_chat_history, get_recent_chat_history, format_chat_history
+from app.database.chat_history_service import get_formatted_history, aget_formatted_history, record_turn, arecord_turn
 from pydantic import BaseModel, Field
 from langchain_core.messages import AIMessageChunk
-from langchain.callbacks.base import BaseCallbackHandler
 from .tools import (
     CheckPropertiesDistrictTool, 
     CheckPropertiesStatusTool,
@@ -16,10 +15,16 @@ from .tools import (
     ShowPropertiesTool, 
     SearchPostsTool,
     FilteredPropertySearchTool,
-    NearbyLocationSearchTool,
-    GLOBAL_CONTEXT
+    NearbyLocationSearchTool
 )
-import time
+from .agent_registry import AgentRegistry
+from .stream_pacing import pace_stream
+from .request_context import request_context, set_request_context, reset_request_context
+from .history_compaction import history_compactor
+from .response_cache import response_cache, split_markers, RESPONSE_CACHE_FIRST_TURN_ONLY
+from .intent_router import intent_router
+from .observation_codec import ObservationRefs, format_compact_tool_messages, REFS_CONTEXT_KEY
+from .prompt_cache import prompt_cache_monitor, prompt_cache_key, format_agent_input, PROMPT_CACHE_KEY_ENABLED
 import json
 from datetime import datetime
 
@@ -41,22 +46,6 @@ nearby_location_search_tool = NearbyLocationSearchTool()
 # create_order_tool = CreateOrderTool()
 # update_order_status_tool = UpdateOrderStatusTool()
 
-class CustomHandler(BaseCallbackHandler):
-    """
-    Lớp xử lý callback tùy chỉnh để theo dõi và xử lý các sự kiện trong quá trình chat
-    """
-    def __init__(self, stream_delay: float = 0.1):
-        """
-        Args:
-            stream_delay (float): Thời gian delay giữa các token (giây)
-        """
-        super().__init__()
-        self.stream_delay = stream_delay
-        
-    def on_llm_new_token(self, token: str, **kwargs) -> None:
-        """Được gọi khi có token mới từ LLM."""
-        time.sleep(self.stream_delay)  # Thêm delay giữa các token
-
 def get_llm_and_agent() -> AgentExecutor:
     system_message = """You are a real estate assistant for Ho Chi Minh City properties. Your main tasks are:
 
@@ -257,17 +246,20 @@ ERROR HANDLING:
 - If any field is None/empty: Show "Not specified"
 - If district not found: Suggest similar districts or show all available districts
 
+TOOL RESULT FORMAT:
+Tool results are compact JSON with short keys: props=properties, n=name, p=price (million VND), a=area (m2),
+d=district, w=ward, bd=bedrooms, ba=bathrooms, ad=address, cn=contact name, cp=contact phone, img=image,
+km=distance in km, tt=travel minutes walking/motorbike/car, type=property type, tx=transaction type,
+total=total matches, pg=pagination. A field that is missing is not specified.
+Images and links appear as references like @img3 or @link2. Write them exactly as given
+(e.g. ![](@img3)); they are replaced by the real URL before the answer reaches the user.
+
+PARALLEL LOOKUPS:
+- When a question needs several independent lookups (e.g. comparing districts or price ranges),
+  request all the tool calls at once instead of one after another
+
 Always maintain a professional tone and be ready to provide more details about any specific property when asked."""
 
-    chat = ChatOpenAI(
-        temperature=0.7,  
-        streaming=True, 
-        model="gpt-4o-mini",
-        api_key=OPENAI_API_KEY,
-        # request_timeout=40,  
-        callbacks=[CustomHandler(stream_delay=0.02)] 
-    )
-    
     tools = [
         show_properties_tool,
         check_properties_district_tool,
@@ -277,6 +269,25 @@ Always maintain a professional tone and be ready to provide more details about a
         filtered_property_search_tool,
         nearby_location_search_tool
     ]
+    
+    # The system prompt and tool schemas form a static prefix shared by every
+    # request (per-request data only comes after it: history, then the human
+    # turn with the filters), so the provider can serve it from its prompt cache
+    model_kwargs = {}
+    if PROMPT_CACHE_KEY_ENABLED:
+        model_kwargs["prompt_cache_key"] = prompt_cache_key(system_message, tools)
+    
+    chat = ChatOpenAI(
+        temperature=0.7,  
+        streaming=True, 
+        model="gpt-4o-mini",
+        api_key=OPENAI_API_KEY,
+        # request_timeout=40,  
+        # Token usage (incl. cached prompt tokens) is also reported when streaming
+        stream_usage=True,
+        model_kwargs=model_kwargs,
+        callbacks=[prompt_cache_monitor]
+    )
 
     prompt = ChatPromptTemplate.from_messages([
         ("system", system_message),
@@ -285,10 +296,14 @@ Always maintain a professional tone and be ready to provide more details about a
         MessagesPlaceholder(variable_name="agent_scratchpad"),
     ])
 
-    agent = create_openai_functions_agent(
+    # Tool-calling agent: the model can request several tools in one turn
+    # (e.g. one search per district) and the executor runs them concurrently
+    agent = create_tool_calling_agent(
         llm=chat,
         tools=tools,
-        prompt=prompt
+        prompt=prompt,
+        # Tool results enter the scratchpad compact-encoded (short keys, URLs as references)
+        message_formatter=format_compact_tool_messages
     )
 
     agent_executor = AgentExecutor(
@@ -300,9 +315,35 @@ Always maintain a professional tone and be ready to provide more details about a
 
     return agent_executor
 
+# Shared executor, built once per process and reused by every request
+agent_registry = AgentRegistry(get_llm_and_agent)
+
+def warm_up_agent() -> None:
+    """Build the shared agent executor before serving traffic"""
+    agent_registry.warm_up()
+
+def _is_cacheable_turn(history: List[Dict]) -> bool:
+    """Answers to follow-up questions depend on the conversation, so only first turns are cached by default"""
+    return response_cache.enabled and (not RESPONSE_CACHE_FIRST_TURN_ONLY or not history)
+
+# Set in the request context by the stream when a tool call failed
+TOOL_FAILED_CONTEXT_KEY = "tool_failed"
+
+def _is_failed_tool_output(output: Any) -> bool:
+    """Tool results reporting an error (API failure, timeout, geocoding error)"""
+    return isinstance(output, dict) and (output.get("success") is False or "error" in output)
+
+def _has_failed_tool_call(result: Dict[str, Any]) -> bool:
+    """
+    Whether any tool call of the agent run failed. Such answers explain a
+    transient error and must not be replayed from the response cache.
+    """
+    return any(_is_failed_tool_output(step[1]) for step in result.get("intermediate_steps", [])
+               if isinstance(step, tuple) and len(step) > 1)
+
 def get_response(question: str, context: Dict[str, Any]) -> str:
     """Get a single response from the agent"""
-    agent = get_llm_and_agent()
+    agent = agent_registry.get()
     
     
     # Print query parameters for debugging
@@ -310,28 +351,65 @@ def get_response(question: str, context: Dict[str, Any]) -> str:
     print(f"Processing query parameters: {json.dumps(context.get('query_params', {}), indent=2)}")
     print("===============================================\n")
     
-    # Set global context for tools to access
-    global GLOBAL_CONTEXT
-    GLOBAL_CONTEXT.clear()
-    GLOBAL_CONTEXT.update(context)
+    # Get recent chat history (per-thread cache, MySQL on a cold miss)
+    history = get_formatted_history(context["thread_id"])
+    
+    # Repeated question with the same filters: answer from the cache
+    cacheable = _is_cacheable_turn(history)
+    if cacheable:
+        cached = response_cache.get(question, context.get("query_params"))
+        if cached is not None:
+            print("[RESPONSE_CACHE] Hit, returning cached answer")
+            record_turn(context["thread_id"], question, cached.text)
+            return cached.text
     
-    # Get recent chat history
-    history = get_recent_chat_history(context["thread_id"])
-    chat_history = format_chat_history(history)
+    # Plain structured search ("quận 3 dưới 4 triệu"): search directly, no agent
+    routed = intent_router.answer(question, context.get("query_params"))
+    if routed is not None:
+        response_text = routed.text + routed.marker
+        record_turn(context["thread_id"], question, response_text)
+        if cacheable:
+            response_cache.put(question, context.get("query_params"), split_markers(response_text))
+        return response_text
+    
+    # Compact the history to the prompt token budget
+    chat_history = history_compactor.compact(context["thread_id"], history)
     
     # Add query parameters to the input if available
-    input_text = question
-    if context.get("query_params"):
-        input_text = f"{question} (Current filters: {context['query_params']})"
+    input_text = format_agent_input(question, context.get("query_params"))
+    
+    # Get the response with intermediate steps; tools read the request
+    # context from the scoped context variable
+    context[REFS_CONTEXT_KEY] = ObservationRefs()
+    prompt_cache_monitor.begin(context)
+    with request_context(context):
+        result = agent.invoke(
+            {
+                "input": input_text,
+                "chat_history": chat_history
+            },
+            config=agent_registry.build_config(context)
+        )
+    prompt_cache_monitor.finish(context)
     
-    # Get the response with intermediate steps
-    result = agent.invoke({
-        "input": input_text,
-        "chat_history": chat_history
-    })
+    response_text = _finalize_response(result, context)
     
+    # Cached history is updated in place; the row is written in batches
+    record_turn(context["thread_id"], question, response_text)
+    
+    if cacheable and not _has_failed_tool_call(result):
+        response_cache.put(question, context.get("query_params"), split_markers(response_text))
+    
+    return response_text
+
+def _finalize_response(result: Dict[str, Any], context: Dict[str, Any]) -> str:
+    """Final answer text with location/filter update markers built from the tool calls"""
     # Extract the final response text
+    refs = context.get(REFS_CONTEXT_KEY)
     response_text = result.get("output", "")
+    if refs is not None:
+        # Swap the image/link references the model copied for the real URLs
+        response_text = refs.expand(response_text)
     
     # Track data to inject
     location_data_to_inject = None
@@ -438,32 +516,123 @@ def get_response(question: str, context: Dict[str, Any]) -> str:
         print(f"Injecting filter update marker to non-streaming response: {filter_update_marker}")
         response_text += filter_update_marker
     
-    save_chat_history(context["thread_id"], question, response_text)
+    return response_text
+
+async def aget_response(question: str, context: Dict[str, Any]) -> str:
+    """
+    Async version of get_response: tool calls emitted in one model turn run
+    concurrently on the event loop
+    """
+    agent = agent_registry.get()
+    
+    # Get recent chat history (per-thread cache, async pool on a cold miss)
+    history = await aget_formatted_history(context["thread_id"])
+    
+    # Repeated question with the same filters: answer from the cache
+    cacheable = _is_cacheable_turn(history)
+    if cacheable:
+        cached = await response_cache.aget(question, context.get("query_params"))
+        if cached is not None:
+            print("[RESPONSE_CACHE] Hit, returning cached answer")
+            await arecord_turn(context["thread_id"], question, cached.text)
+            return cached.text
+    
+    # Plain structured search ("quận 3 dưới 4 triệu"): search directly, no agent
+    routed = await intent_router.aanswer(question, context.get("query_params"))
+    if routed is not None:
+        response_text = routed.text + routed.marker
+        await arecord_turn(context["thread_id"], question, response_text)
+        if cacheable:
+            await response_cache.aput(question, context.get("query_params"), split_markers(response_text))
+        return response_text
+    
+    # Compact the history to the prompt token budget
+    chat_history = await history_compactor.acompact(context["thread_id"], history)
+    
+    # Add query parameters to the input if available
+    input_text = format_agent_input(question, context.get("query_params"))
+    
+    context[REFS_CONTEXT_KEY] = ObservationRefs()
+    prompt_cache_monitor.begin(context)
+    with request_context(context):
+        result = await agent.ainvoke(
+            {
+                "input": input_text,
+                "chat_history": chat_history
+            },
+            config=agent_registry.build_config(context)
+        )
+    prompt_cache_monitor.finish(context)
+    
+    response_text = _finalize_response(result, context)
+    
+    await arecord_turn(context["thread_id"], question, response_text)
+    
+    if cacheable and not _has_failed_tool_call(result):
+        await response_cache.aput(question, context.get("query_params"), split_markers(response_text))
     
     return response_text
 
 async def get_streaming_response(question: str, context: Dict[str, Any]) -> AsyncGenerator[str, None]:
     """Get a streaming response from the agent"""
-    agent = get_llm_and_agent()
+    agent = agent_registry.get()
     
     # Print query parameters for debugging
     print("\n==== AI SERVICE STREAMING FILTER PARAMETERS ====")
     print(f"Processing query parameters: {json.dumps(context.get('query_params', {}), indent=2)}")
     print("===============================================\n")
     
-    # Set global context for tools to access
-    global GLOBAL_CONTEXT
-    GLOBAL_CONTEXT.clear()
-    GLOBAL_CONTEXT.update(context)
+    # Get recent chat history (per-thread cache, async pool on a cold miss)
+    history = await aget_formatted_history(context["thread_id"])
+    
+    # Repeated question with the same filters: replay the cached stream,
+    # markers included, without calling the model or the tools
+    cacheable = _is_cacheable_turn(history)
+    if cacheable:
+        cached = await response_cache.aget(question, context.get("query_params"))
+        if cached is not None:
+            print("[RESPONSE_CACHE] Hit, replaying cached stream")
+            for chunk in cached.chunks:
+                yield chunk
+            await arecord_turn(context["thread_id"], question, cached.answer)
+            return
     
-    # Get recent chat history
-    history = get_recent_chat_history(context["thread_id"])
-    chat_history = format_chat_history(history)
+    # Plain structured search: stream the templated reply, no agent
+    routed = await intent_router.aanswer(question, context.get("query_params"))
+    if routed is not None:
+        chunks = routed.chunks()
+        for chunk in chunks:
+            yield chunk
+        await arecord_turn(context["thread_id"], question, routed.text)
+        if cacheable:
+            await response_cache.aput(question, context.get("query_params"), chunks)
+        return
+    
+    # Scope the request context for tools to access
+    context[REFS_CONTEXT_KEY] = ObservationRefs()
+    prompt_cache_monitor.begin(context)
+    context_token = set_request_context(context)
+    chunks = []
+    try:
+        async for chunk in _stream_agent_events(agent, question, context, history):
+            chunks.append(chunk)
+            yield chunk
+    finally:
+        reset_request_context(context_token)
+        prompt_cache_monitor.finish(context)
+    
+    # Only answers that streamed to the end, without failed tool calls, are cached
+    if cacheable and not context.get(TOOL_FAILED_CONTEXT_KEY):
+        await response_cache.aput(question, context.get("query_params"), chunks)
+
+async def _stream_agent_events(agent: AgentExecutor, question: str, context: Dict[str, Any],
+                               history: List[Dict]) -> AsyncGenerator[str, None]:
+    """Run the agent and yield text chunks plus location/filter update markers"""
+    # Compact the chat history to the prompt token budget
+    chat_history = await history_compactor.acompact(context["thread_id"], history)
     
     # Add query parameters to the input if available
-    input_text = question
-    if context.get("query_params"):
-        input_text = f"{question} (Current filters: {context['query_params']})"
+    input_text = format_agent_input(question, context.get("query_params"))
     
     # Print modified input text
     print(f"Modified input with filters: {input_text}")
@@ -472,6 +641,9 @@ async def get_streaming_response(question: str, context: Dict[str, Any]) -> Asyn
     location_data_to_inject = None
     filter_data_to_inject = None
     
+    # Image/link references in the model output are expanded as they stream
+    expander = (context.get(REFS_CONTEXT_KEY) or ObservationRefs()).stream_expander()
+    
     # Stream the response with context
     final_answer = ""
     async for event in agent.astream_events(
@@ -480,6 +652,7 @@ async def get_streaming_response(question: str, context: Dict[str, Any]) -> Asyn
             "chat_history": chat_history,
             "context": context  # Pass the context to make it available to tools
         },
+        config=agent_registry.build_config(context),
         version="v2"
     ):       
         # Capture tool results that contain location data
@@ -490,6 +663,8 @@ async def get_streaming_response(question: str, context: Dict[str, Any]) -> Asyn
             
             
             print(f"Tool execution completed: {tool_name}")
+            if _is_failed_tool_output(tool_output):
+                context[TOOL_FAILED_CONTEXT_KEY] = True
             if tool_name == "nearby_location_search" and isinstance(tool_output, dict):
                 print("Found nearby_location_search tool result, processing for location update")
                 
@@ -584,15 +759,19 @@ async def get_streaming_response(question: str, context: Dict[str, Any]) -> Asyn
         
         # Process text chunks from the model
         if event["event"] == "on_chat_model_stream":
-            content = event['data']['chunk'].content
+            content = expander.feed(event['data']['chunk'].content or "")
             if content:
                 final_answer += content
                 yield content
     
+    tail = expander.flush()
+    if tail:
+        final_answer += tail
+        yield tail
     
     # Save chat history to database
     if final_answer:
-        save_chat_history(context["thread_id"], question, final_answer)
+        await arecord_turn(context["thread_id"], question, final_answer)
 
 def get_answer(question: str, thread_id: str, query_params: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
     try:
@@ -609,7 +788,22 @@ def get_answer(question: str, thread_id: str, query_params: Optional[Dict[str, A
         print(f"Error in get_answer: {str(e)}")
         raise
 
-async def get_answer_stream(question: str, thread_id: str, query_params: Optional[Dict[str, Any]] = None) -> AsyncGenerator[str, None]:
+async def aget_answer(question: str, thread_id: str, query_params: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """Async version of get_answer used by the /chat endpoint"""
+    try:
+        context = {
+            "thread_id": thread_id,
+            "query_params": query_params or {}
+        }
+        response = await aget_response(question, context)
+        return {"output": response}
+    except Exception as e:
+        print(f"Error in aget_answer: {str(e)}")
+        raise
+
+async def get_answer_stream(question: str, thread_id: str, query_params: Optional[Dict[str, Any]] = None,
+                            frame_ms: Optional[int] = None) -> AsyncGenerator[str, None]:
+    """Stream the answer; frame_ms > 0 coalesces tokens into frames of that many milliseconds"""
     try:
         # Add query parameters to the context
         context = {
@@ -618,7 +812,7 @@ async def get_answer_stream(question: str, thread_id: str, query_params: Optiona
         }
         
         # Get the answer stream with context
-        async for chunk in get_streaming_response(question, context):
+        async for chunk in pace_stream(get_streaming_response(question, context), frame_ms):
             yield chunk
     except Exception as e:
         print(f"Error in get_answer_stream: {str(e)}")
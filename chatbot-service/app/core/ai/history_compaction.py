@@ -0,0 +1,339 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Prompt budget for chat_history (tokens); older turns beyond it are summarized
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+# Newest turns always kept verbatim, even when they alone exceed the budget
+HISTORY_KEEP_RECENT_TURNS = int(os.getenv("HISTORY_KEEP_RECENT_TURNS", "2"))
+# Single messages longer than this are truncated (long property lists)
+HISTORY_MAX_MESSAGE_TOKENS = int(os.getenv("HISTORY_MAX_MESSAGE_TOKENS", "400"))
+# "extractive" never calls a model; "llm" also asks the model for a better
+# summary, in the background after the turn, so it never delays an answer
+HISTORY_SUMMARY_MODE = os.getenv("HISTORY_SUMMARY_MODE", "extractive")
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "300"))
+HISTORY_SUMMARY_CACHE_SIZE = int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE", "2048"))
+
+TOKENIZER_MODEL = "gpt-4o-mini"
+# Per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_MARKER_BLOCKS = re.compile(
+    r"__LOCATION_UPDATE__.*?__END_LOCATION_UPDATE__|__FILTER_UPDATE__.*?__END_FILTER_UPDATE__",
+    re.DOTALL
+)
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+SUMMARY_PROMPT = """Summarize this real estate chat between a user and an assistant for later turns.
+Keep: what the user is looking for (area/district, landmark, budget, property type, size),
+filters applied, listings the user showed interest in (name/ID), and open questions.
+Drop greetings and full listing details. Write at most 6 short bullet points,
+in the language of the conversation.
+
+Previous summary:
+{previous}
+
+New turns:
+{turns}"""
+
+
+class TokenCounter:
+    """
+    Count tokens with tiktoken when its encoding can be loaded (it may need to
+    download the BPE file), otherwise estimate ~3 characters per token.
+    """
+
+    def __init__(self, model: str = TOKENIZER_MODEL):
+        self.model = model
+        self._encoding = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def encoding(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    try:
+                        import tiktoken
+                        self._encoding = tiktoken.encoding_for_model(self.model)
+                    except Exception as e:
+                        print(f"[HISTORY] tiktoken unavailable, estimating tokens: {str(e)[:120]}")
+                        self._encoding = None
+                    self._loaded = True
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        encoding = self.encoding
+        if encoding is not None:
+            return len(encoding.encode(text))
+        return len(text) // 3 + 1
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.count(text) <= max_tokens:
+            return text
+        encoding = self.encoding
+        if encoding is not None:
+            head = encoding.decode(encoding.encode(text)[:max_tokens])
+        else:
+            head = text[:max_tokens * 3]
+        return head.rstrip() + " …"
+
+    def count_messages(self, messages: List[Dict]) -> int:
+        return sum(self.count(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def strip_markers(text: str) -> str:
+    """Remove __LOCATION_UPDATE__ / __FILTER_UPDATE__ payloads from a stored answer"""
+    if not text or "__" not in text:
+        return text
+    return _BLANK_LINES.sub("\n\n", _MARKER_BLOCKS.sub("", text)).strip()
+
+
+def _turn_id(human: str, assistant: str) -> str:
+    return hashlib.sha1(f"{human}\x00{assistant}".encode("utf-8")).hexdigest()[:16]
+
+
+def extractive_summary(previous: str, turns: List[Tuple[str, str]], counter: TokenCounter,
+                       max_tokens: int = HISTORY_SUMMARY_MAX_TOKENS) -> str:
+    """Summary without a model call: the user's questions with the start of each answer"""
+    lines = [previous] if previous else []
+    for human, assistant in turns:
+        first_line = assistant.strip().split("\n", 1)[0]
+        lines.append(f"- User: {counter.truncate(human, 60)} / Assistant: {counter.truncate(first_line, 40)}")
+    summary = "\n".join(lines)
+    # Keep the newest lines when over budget
+    while counter.count(summary) > max_tokens and len(lines) > 1:
+        lines.pop(0)
+        summary = "\n".join(lines)
+    return summary
+
+
+class HistoryCompactor:
+    """
+    Shrink formatted chat history to a token budget.
+
+    1. Marker payloads are stripped and very long messages truncated.
+    2. If the history still exceeds budget_tokens, the newest turns that fit
+       (at least keep_recent_turns) stay verbatim and the older ones are
+       folded into a rolling per-thread summary, sent as one system message.
+
+    The summary is cached per thread together with the ids of the turns it
+    covers, so each turn is summarized once; later calls only fold in turns
+    that newly fell out of the verbatim window.
+
+    Turns are folded in extractively, so compaction never waits on a model.
+    In "llm" mode the model then rewrites the summary in the background and
+    the next request of the thread uses that version.
+    """
+
+    def __init__(self, budget_tokens: int = HISTORY_TOKEN_BUDGET,
+                 keep_recent_turns: int = HISTORY_KEEP_RECENT_TURNS,
+                 max_message_tokens: int = HISTORY_MAX_MESSAGE_TOKENS,
+                 summary_mode: str = HISTORY_SUMMARY_MODE,
+                 summarizer: Optional[Callable[[str], str]] = None,
+                 cache_size: int = HISTORY_SUMMARY_CACHE_SIZE,
+                 counter: Optional[TokenCounter] = None):
+        self.budget_tokens = budget_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.max_message_tokens = max_message_tokens
+        self.summary_mode = summary_mode
+        self.counter = counter or TokenCounter()
+        self._summarizer = summarizer
+        self._summary_llm = None
+        self._summaries: "OrderedDict[str, Tuple[set, str]]" = OrderedDict()
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._tasks: set = set()
+        self.stats = {"compactions": 0, "summaries": 0, "llm_summaries": 0, "summary_errors": 0,
+                      "tokens_in": 0, "tokens_out": 0}
+
+    # Summarizer -----------------------------------------------------------
+
+    def _llm(self):
+        if self._summary_llm is None:
+            from langchain_openai import ChatOpenAI
+
+            self._summary_llm = ChatOpenAI(model=TOKENIZER_MODEL, temperature=0,
+                                           max_tokens=HISTORY_SUMMARY_MAX_TOKENS)
+        return self._summary_llm
+
+    @property
+    def uses_llm(self) -> bool:
+        return self.summary_mode == "llm" or self._summarizer is not None
+
+    def _summarize(self, previous: str, turns: List[Tuple[str, str]]) -> str:
+        if self.uses_llm:
+            try:
+                summarizer = self._summarizer or (lambda prompt: self._llm().invoke(prompt).content)
+                return summarizer(self._summary_prompt(previous, turns)).strip()
+            except Exception as e:
+                self.stats["summary_errors"] += 1
+                print(f"[HISTORY] Summary call failed, using extractive summary: {str(e)}")
+        return extractive_summary(previous, turns, self.counter)
+
+    async def _asummarize(self, previous: str, turns: List[Tuple[str, str]]) -> str:
+        if self._summarizer is None and self.summary_mode == "llm":
+            try:
+                response = await self._llm().ainvoke(self._summary_prompt(previous, turns))
+                return response.content.strip()
+            except Exception as e:
+                self.stats["summary_errors"] += 1
+                print(f"[HISTORY] Summary call failed, using extractive summary: {str(e)}")
+                return extractive_summary(previous, turns, self.counter)
+        return await asyncio.to_thread(self._summarize, previous, turns)
+
+    def _summary_prompt(self, previous: str, turns: List[Tuple[str, str]]) -> str:
+        rendered = "\n".join(
+            f"User: {human}\nAssistant: {self.counter.truncate(assistant, 150)}" for human, assistant in turns
+        )
+        return SUMMARY_PROMPT.format(previous=previous or "(none)", turns=rendered)
+
+    # Compaction -------------------------------------------------------------
+
+    def _prepare(self, messages: List[Dict]) -> List[Tuple[str, str]]:
+        """Clean messages and pair them into (human, assistant) turns"""
+        turns = []
+        pending_human = None
+        for message in messages:
+            content = self.counter.truncate(strip_markers(message["content"]), self.max_message_tokens)
+            if message["role"] == "human":
+                if pending_human is not None:
+                    turns.append((pending_human, ""))
+                pending_human = content
+            else:
+                turns.append((pending_human or "", content))
+                pending_human = None
+        if pending_human is not None:
+            turns.append((pending_human, ""))
+        return turns
+
+    @staticmethod
+    def _render(turns: List[Tuple[str, str]]) -> List[Dict]:
+        messages = []
+        for human, assistant in turns:
+            if human:
+                messages.append({"role": "human", "content": human})
+            if assistant:
+                messages.append({"role": "assistant", "content": assistant})
+        return messages
+
+    def _split(self, turns: List[Tuple[str, str]]) -> int:
+        """Index of the first turn kept verbatim"""
+        budget = self.budget_tokens - HISTORY_SUMMARY_MAX_TOKENS
+        used = 0
+        keep_from = len(turns)
+        for i in range(len(turns) - 1, -1, -1):
+            cost = self.counter.count_messages(self._render([turns[i]]))
+            if used + cost > budget and len(turns) - i > self.keep_recent_turns:
+                break
+            used += cost
+            keep_from = i
+        return keep_from
+
+    def _plan(self, thread_id: str, messages: List[Dict]):
+        """
+        Returns:
+            (cleaned messages, None) when the history fits the budget, otherwise
+            ((older turns, recent turns, cached summary, turns still to summarize), True)
+        """
+        turns = self._prepare(messages)
+        cleaned = self._render(turns)
+        tokens_in = self.counter.count_messages(cleaned)
+        self.stats["compactions"] += 1
+        self.stats["tokens_in"] += tokens_in
+        if tokens_in <= self.budget_tokens:
+            self.stats["tokens_out"] += tokens_in
+            return cleaned, None
+
+        keep_from = self._split(turns)
+        older, recent = turns[:keep_from], turns[keep_from:]
+        with self._lock:
+            covered, summary = self._summaries.get(thread_id, (set(), ""))
+        new_turns = [turn for turn in older if _turn_id(*turn) not in covered]
+        return (older, recent, summary, new_turns), True
+
+    def _finish(self, thread_id: str, covered: set, recent: List[Tuple[str, str]],
+                summary: str) -> List[Dict]:
+        with self._lock:
+            self._summaries[thread_id] = (covered, summary)
+            self._summaries.move_to_end(thread_id)
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+
+        compacted = self._render(recent)
+        if summary:
+            compacted.insert(0, {"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+        self.stats["tokens_out"] += self.counter.count_messages(compacted)
+        return compacted
+
+    def _fold(self, thread_id: str, older: List[Tuple[str, str]], recent: List[Tuple[str, str]],
+              summary: str, new_turns: List[Tuple[str, str]]) -> Tuple[List[Dict], set]:
+        # Turns that left the history window never come back, so only the
+        # ids of the current older turns need to be remembered
+        covered = {_turn_id(*turn) for turn in older}
+        if new_turns:
+            summary = extractive_summary(summary, new_turns, self.counter)
+            self.stats["summaries"] += 1
+        return self._finish(thread_id, covered, recent, summary), covered
+
+    def _store_llm_summary(self, thread_id: str, covered: set, summary: str) -> None:
+        """Replace the extractive summary unless the thread has moved on meanwhile"""
+        with self._lock:
+            if self._summaries.get(thread_id, (None, ""))[0] == covered:
+                self._summaries[thread_id] = (covered, summary)
+                self.stats["llm_summaries"] += 1
+
+    def _refine(self, thread_id: str, covered: set, previous: str, turns: List[Tuple[str, str]]) -> None:
+        self._store_llm_summary(thread_id, covered, self._summarize(previous, turns))
+
+    async def _arefine(self, thread_id: str, covered: set, previous: str, turns: List[Tuple[str, str]]) -> None:
+        self._store_llm_summary(thread_id, covered, await self._asummarize(previous, turns))
+
+    def compact(self, thread_id: str, messages: List[Dict]) -> List[Dict]:
+        """
+        Compact formatted history ({"role", "content"} dicts, oldest first)
+
+        Returns:
+            List[Dict]: History within the token budget
+        """
+        plan, needs_summary = self._plan(thread_id, messages)
+        if not needs_summary:
+            return plan
+        older, recent, summary, new_turns = plan
+        compacted, covered = self._fold(thread_id, older, recent, summary, new_turns)
+        if new_turns and self.uses_llm:
+            threading.Thread(target=self._refine, args=(thread_id, covered, summary, new_turns),
+                             name="history-summary", daemon=True).start()
+        return compacted
+
+    async def acompact(self, thread_id: str, messages: List[Dict]) -> List[Dict]:
+        """Async version of compact (the model summary runs as a background task)"""
+        plan, needs_summary = self._plan(thread_id, messages)
+        if not needs_summary:
+            return plan
+        older, recent, summary, new_turns = plan
+        compacted, covered = self._fold(thread_id, older, recent, summary, new_turns)
+        if new_turns and self.uses_llm:
+            task = asyncio.ensure_future(self._arefine(thread_id, covered, summary, new_turns))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return compacted
+
+    def get_stats(self) -> Dict:
+        tokens_in = self.stats["tokens_in"]
+        return {
+            **self.stats,
+            "summarized_threads": len(self._summaries),
+            "token_reduction": round(1 - self.stats["tokens_out"] / tokens_in, 4) if tokens_in else 0.0
+        }
+
+
+# Shared compactor used by the chat service
+history_compactor = HistoryCompactor()
@@ -0,0 +1,350 @@
+import json
+import os
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..gazetteer import hcmc_gazetteer
+from ..text_utils import fold_accents, district_key
+from .tools import SearchPostsTool
+
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "1") == "1"
+# Listings shown in a templated reply (same limit the agent prompt uses)
+INTENT_ROUTER_MAX_RESULTS = int(os.getenv("INTENT_ROUTER_MAX_RESULTS", "5"))
+
+_NUM = r"(\d+(?:\.\d+)?)"
+_PRICE_UNIT = r"(trieu|tr|million|mil|ty|ti|billion)"
+_AREA_UNIT = r"(?:m2|m²|met vuong|m)\b"
+
+# Price: "3-5 triệu", "từ 3 đến 5 tr", "dưới 4 triệu", "trên 2tr", "1.5 tỷ"
+_PRICE_RANGE = re.compile(rf"(?:\btu\s+|\bfrom\s+)?{_NUM}\s*(?:{_PRICE_UNIT}\s*)?(?:-|\bden\b|\btoi\b|\bto\b)\s*{_NUM}\s*{_PRICE_UNIT}\b")
+_PRICE_MAX = re.compile(rf"(?:\bduoi\b|\btoi da\b|\bkhong qua\b|\bit hon\b|\bunder\b|\bbelow\b|\bmax\b|<)\s*{_NUM}\s*{_PRICE_UNIT}\b")
+_PRICE_MIN = re.compile(rf"(?:\btren\b|\bhon\b|\btu\b|\btoi thieu\b|\bover\b|\babove\b|\bfrom\b|\bmin\b|>)\s*{_NUM}\s*{_PRICE_UNIT}\b")
+# Area: "20-30m2", "trên 25 m2", "30m2" (a bare size means "at least")
+_AREA_RANGE = re.compile(rf"(?:\btu\s+|\bfrom\s+)?{_NUM}\s*(?:m2|m²|m)?\s*(?:-|\bden\b|\btoi\b|\bto\b)\s*{_NUM}\s*{_AREA_UNIT}")
+_AREA_MAX = re.compile(rf"(?:\bduoi\b|\btoi da\b|\bkhong qua\b|\bunder\b|\bbelow\b|<)\s*{_NUM}\s*{_AREA_UNIT}")
+_AREA_MIN = re.compile(rf"(?:\btren\b|\btu\b|\btoi thieu\b|\bover\b|\babove\b|\bfrom\b|>)?\s*{_NUM}\s*{_AREA_UNIT}")
+_BEDROOMS = re.compile(r"\b(\d{1,2})\s*(?:phong ngu|pn|bedrooms?|br)\b")
+_BATHROOMS = re.compile(r"\b(\d{1,2})\s*(?:phong tam|toilet|wc|ve sinh|bathrooms?)\b")
+_NUMBERED_DISTRICT = re.compile(r"\b(?:quan|q|district)\s*\.?\s*(\d{1,2})\b")
+
+# Phrases resolved through SearchPostsTool._format_property_type, longest first
+_PROPERTY_PHRASES = [
+    "can ho dich vu", "nha nguyen can", "phong tro", "nha tro", "nha rieng", "nha pho", "can ho", "chung cu",
+    "biet thu", "mat bang", "van phong", "dat nen", "apartment", "studio", "villa", "office", "house",
+    "room", "phong", "nha", "dat",
+]
+# Synonyms the tool mapping doesn't know
+_PROPERTY_ALIASES = {
+    "can ho dich vu": "can ho", "studio": "can ho", "nha tro": "phong tro",
+    "nha nguyen can": "nha", "nha rieng": "nha", "nha pho": "nha",
+}
+_PROPERTY_TYPE = re.compile(r"\b(" + "|".join(_PROPERTY_PHRASES) + r")\b")
+# "bán" folds to "ban" (also "bạn"), so selling is not detected here
+_TRANSACTION_TYPE = re.compile(r"\b(cho thue|thue|rent|mua|buy)\b")
+API_PROPERTY_TYPES = {"room", "apartment", "house", "commercial", "land"}
+# Replies are templated in Vietnamese: messages without any Vietnamese go to the agent
+_VIETNAMESE_WORDS = re.compile(r"\b(quan|huyen|phong|trieu|tr|ty|can ho|chung cu|nha|dat|duoi|tren|thue|tim)\b")
+
+# Words that carry no filter; any other leftover word sends the message to the agent
+_FILLER_WORDS = set("""
+tim kiem can muon cho toi minh em anh chi o tai khu vuc gia co nao khong ko hay giup goi y
+liet ke xem mot cai dang voi va thang vnd dong d tphcm hcm sai gon thanh pho ho chi minh
+find search show me i want need a an the in at for with looking please some any list per month
+""".split())
+
+# query_params keys (frontend filters) that map onto search arguments
+_QUERY_PARAM_ARGS = {
+    "minPrice": "min_price", "maxPrice": "max_price", "minArea": "min_area", "maxArea": "max_area",
+    "propertyType": "property_type", "transactionType": "transaction_type", "district": "district",
+    "minBedrooms": "min_bedrooms", "minBathrooms": "min_bathrooms",
+}
+
+_PROPERTY_LABELS = {
+    "room": "phòng trọ", "apartment": "căn hộ", "house": "nhà", "commercial": "mặt bằng", "land": "đất",
+}
+
+
+def _fold(text: str) -> str:
+    """Accent-folded, casefolded text that keeps decimal points ("3,5" -> "3.5")"""
+    text = fold_accents(unicodedata.normalize("NFC", text)).casefold()
+    text = re.sub(r"(\d),(\d)", r"\1.\2", text)
+    text = re.sub(r"[^\w\s.\-<>²]", " ", text)
+    text = re.sub(r"(?<!\d)\.|\.(?!\d)", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _named_districts() -> Dict[str, str]:
+    """Folded key -> API name for the non-numbered districts in the gazetteer ("binh thanh" -> "Bình Thạnh")"""
+    districts = {}
+    for name, category in zip(hcmc_gazetteer.names, hcmc_gazetteer.categories):
+        key = district_key(name)
+        if category != "district" or not key or any(ch.isdigit() for ch in key):
+            continue
+        api_name = re.sub(r"^(?:Quận|Huyện|Thành phố)\s+", "", name)
+        districts[key] = api_name
+    return districts
+
+
+def _price_millions(value: str, unit: str) -> float:
+    amount = float(value)
+    return amount * 1000 if unit in ("ty", "ti", "billion") else amount
+
+
+@dataclass
+class SearchIntent:
+    """Filters extracted from a message, as SearchPostsTool arguments"""
+    args: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def filter_update(self) -> Dict[str, Any]:
+        """Filters in the frontend's camelCase format (for __FILTER_UPDATE__)"""
+        arg_params = {arg: param for param, arg in _QUERY_PARAM_ARGS.items()}
+        return {arg_params[arg]: value for arg, value in self.args.items() if arg in arg_params}
+
+
+@dataclass
+class RoutedAnswer:
+    """Templated reply for a message answered without the agent"""
+    text: str
+    filters: Dict[str, Any]
+
+    @property
+    def marker(self) -> str:
+        return f"\n\n__FILTER_UPDATE__{json.dumps(self.filters)}__END_FILTER_UPDATE__\n\n"
+
+    def chunks(self) -> List[str]:
+        """Stream shape: filter update first (like a finished tool call), then the text by paragraph"""
+        paragraphs = self.text.split("\n\n")
+        return [self.marker] + [p + "\n\n" for p in paragraphs[:-1]] + paragraphs[-1:]
+
+
+class IntentRouter:
+    """
+    Rule-based fast path for messages that are one structured search, e.g.
+    "quận 3 dưới 4 triệu 2 phòng ngủ" or "căn hộ Bình Thạnh 30m2".
+
+    parse() pulls filters out of the message with regular expressions, reusing
+    the district, property type and transaction type normalizers of
+    SearchPostsTool. A message is routed only when every word is either a
+    recognized filter or filler ("tìm", "cho mình", "ở"...); anything else
+    (follow-ups, comparisons, landmarks, questions about a listing) returns
+    None and goes to the agent.
+    """
+
+    def __init__(self, search_tool: Optional[SearchPostsTool] = None,
+                 max_results: int = INTENT_ROUTER_MAX_RESULTS,
+                 enabled: bool = INTENT_ROUTER_ENABLED):
+        self.search_tool = search_tool or SearchPostsTool()
+        self.max_results = max_results
+        self.enabled = enabled
+        self.districts = _named_districts()
+        names = sorted(self.districts, key=len, reverse=True)
+        self._named_district = re.compile(
+            r"\b(?:(?:quan|huyen|tp|thanh pho)\s+)?(" + "|".join(re.escape(name) for name in names) + r")\b"
+        ) if names else None
+        self.stats = {"routed": 0, "passed": 0, "search_errors": 0}
+
+    # Parsing ----------------------------------------------------------------
+
+    @staticmethod
+    def _take(pattern: re.Pattern, text: str) -> Tuple[Optional[re.Match], str]:
+        """First match of pattern and the text with the match blanked out"""
+        match = pattern.search(text)
+        if match is None:
+            return None, text
+        return match, text[:match.start()] + " " + text[match.end():]
+
+    def parse(self, question: str) -> Optional[SearchIntent]:
+        """
+        Extract search filters from a message
+
+        Returns:
+            Optional[SearchIntent]: The filters, or None if the message isn't a plain search
+        """
+        if not question or len(question) > 200:
+            return None
+        text = _fold(question)
+        if fold_accents(question) == question and not _VIETNAMESE_WORDS.search(text):
+            return None
+        args: Dict[str, Any] = {}
+
+        match, text = self._take(_BEDROOMS, text)
+        if match:
+            args["min_bedrooms"] = int(match.group(1))
+        match, text = self._take(_BATHROOMS, text)
+        if match:
+            args["min_bathrooms"] = int(match.group(1))
+
+        match, text = self._take(_PRICE_RANGE, text)
+        if match:
+            low_unit = match.group(2) or match.group(4)
+            args["min_price"] = _price_millions(match.group(1), low_unit)
+            args["max_price"] = _price_millions(match.group(3), match.group(4))
+        else:
+            match, text = self._take(_PRICE_MAX, text)
+            if match:
+                args["max_price"] = _price_millions(match.group(1), match.group(2))
+            match, text = self._take(_PRICE_MIN, text)
+            if match:
+                args["min_price"] = _price_millions(match.group(1), match.group(2))
+
+        match, text = self._take(_AREA_RANGE, text)
+        if match:
+            args["min_area"], args["max_area"] = float(match.group(1)), float(match.group(2))
+        else:
+            match, text = self._take(_AREA_MAX, text)
+            if match:
+                args["max_area"] = float(match.group(1))
+            match, text = self._take(_AREA_MIN, text)
+            if match:
+                args["min_area"] = float(match.group(1))
+
+        match, text = self._take(_NUMBERED_DISTRICT, text)
+        if match:
+            args["district"] = self.search_tool._normalize_district(f"Quận {match.group(1)}")
+        elif self._named_district is not None:
+            match, text = self._take(self._named_district, text)
+            if match:
+                args["district"] = self.districts[match.group(1)]
+
+        match, text = self._take(_PROPERTY_TYPE, text)
+        if match:
+            phrase = _PROPERTY_ALIASES.get(match.group(1), match.group(1))
+            property_type = self.search_tool._format_property_type(phrase)
+            if property_type not in API_PROPERTY_TYPES:
+                return None
+            args["property_type"] = property_type
+
+        match, text = self._take(_TRANSACTION_TYPE, text)
+        if match:
+            args["transaction_type"] = self.search_tool._format_transaction_type(match.group(1))
+
+        # Something to search by, and nothing left that we didn't understand
+        if "district" not in args and "property_type" not in args:
+            return None
+        if any(word not in _FILLER_WORDS for word in text.split()):
+            return None
+        return SearchIntent(args)
+
+    def route(self, question: str, query_params: Optional[Dict[str, Any]] = None) -> Optional[SearchIntent]:
+        """
+        Intent for a message plus the frontend filters it doesn't override, or
+        None when the agent should answer
+        """
+        if not self.enabled:
+            return None
+        query_params = {k: v for k, v in (query_params or {}).items() if v not in (None, "", [])}
+        # Map, bounds or other UI state the fast path can't honor
+        if any(key not in _QUERY_PARAM_ARGS for key in query_params):
+            self.stats["passed"] += 1
+            return None
+        intent = self.parse(question)
+        if intent is None:
+            self.stats["passed"] += 1
+            return None
+        for key, value in query_params.items():
+            intent.args.setdefault(_QUERY_PARAM_ARGS[key], value)
+        return intent
+
+    # Reply ------------------------------------------------------------------
+
+    @staticmethod
+    def _describe(args: Dict[str, Any]) -> str:
+        parts = [_PROPERTY_LABELS.get(args.get("property_type"), "bất động sản")]
+        if args.get("transaction_type") == "rent":
+            parts.append("cho thuê")
+        elif args.get("transaction_type") == "buy":
+            parts.append("để mua")
+        if args.get("district"):
+            district = str(args["district"])
+            parts.append(f"ở Quận {district}" if district.isdigit() else f"ở {district}")
+        if args.get("min_price") is not None and args.get("max_price") is not None:
+            parts.append(f"giá {args['min_price']:g}-{args['max_price']:g} triệu")
+        elif args.get("max_price") is not None:
+            parts.append(f"giá dưới {args['max_price']:g} triệu")
+        elif args.get("min_price") is not None:
+            parts.append(f"giá từ {args['min_price']:g} triệu")
+        if args.get("min_area") is not None and args.get("max_area") is not None:
+            parts.append(f"diện tích {args['min_area']:g}-{args['max_area']:g} m²")
+        elif args.get("min_area") is not None:
+            parts.append(f"diện tích từ {args['min_area']:g} m²")
+        elif args.get("max_area") is not None:
+            parts.append(f"diện tích dưới {args['max_area']:g} m²")
+        if args.get("min_bedrooms"):
+            parts.append(f"từ {args['min_bedrooms']} phòng ngủ")
+        if args.get("min_bathrooms"):
+            parts.append(f"từ {args['min_bathrooms']} phòng tắm")
+        return " ".join(parts[:2]) + (", " + ", ".join(parts[2:]) if parts[2:] else "")
+
+    @staticmethod
+    def _format_listing(index: int, prop: Dict) -> str:
+        price = prop.get("price")
+        area = prop.get("area")
+        image = (prop.get("images") or [{}])[0]
+        image_url = image.get("url") if isinstance(image, dict) else image
+        district = str(prop.get("district") or "")
+        if district.isdigit():
+            district = f"Quận {district}"
+        lines = [
+            f"{index}. **{prop.get('name') or 'Bất động sản'}**",
+            f"   - Giá: {f'{float(price):g} triệu VND' if price is not None else 'Liên hệ'}",
+            f"   - Diện tích: {f'{float(area):g} m²' if area is not None else 'Chưa cập nhật'}",
+            f"   - Khu vực: {district or 'Chưa cập nhật'}",
+        ]
+        if prop.get("bedrooms") is not None:
+            lines.append(f"   - Phòng ngủ: {prop['bedrooms']}")
+        lines.append(f"   - Địa chỉ: {prop.get('displayedAddress') or 'Chưa cập nhật'}")
+        lines.append(f"   - Liên hệ: {prop.get('contactName') or 'Chưa cập nhật'} - {prop.get('contactPhone') or ''}".rstrip(" -"))
+        lines.append(f"   - Hình ảnh: ![]({image_url})" if image_url else "   - Hình ảnh: Không có hình ảnh")
+        return "\n".join(lines)
+
+    def render(self, intent: SearchIntent, result: Dict) -> str:
+        """Templated reply for a search result"""
+        properties = result.get("properties") or []
+        description = self._describe(intent.args)
+        if not properties:
+            return (f"Hiện chưa có {description} phù hợp.\n\n"
+                    "Bạn có thể nới rộng khoảng giá, diện tích hoặc thử khu vực lân cận để xem thêm lựa chọn.")
+
+        total = (result.get("pagination") or {}).get("total_records") or len(properties)
+        shown = properties[:self.max_results]
+        listings = "\n\n".join(self._format_listing(i + 1, prop) for i, prop in enumerate(shown))
+        return (f"Mình tìm thấy {total} {description}. Dưới đây là {len(shown)} lựa chọn nổi bật:\n\n"
+                f"{listings}\n\n"
+                "Bạn muốn xem chi tiết căn nào hoặc lọc thêm theo tiêu chí khác không?")
+
+    def _answer(self, intent: SearchIntent, result: Any) -> Optional[RoutedAnswer]:
+        if not isinstance(result, dict) or not result.get("success"):
+            # Search failed: let the agent handle it (and explain the error)
+            self.stats["search_errors"] += 1
+            return None
+        self.stats["routed"] += 1
+        print(f"[INTENT_ROUTER] Answered without the agent: {intent.args}")
+        return RoutedAnswer(self.render(intent, result), intent.filter_update)
+
+    def answer(self, question: str, query_params: Optional[Dict[str, Any]] = None) -> Optional[RoutedAnswer]:
+        """Answer a plain search message directly, or None to use the agent"""
+        intent = self.route(question, query_params)
+        if intent is None:
+            return None
+        return self._answer(intent, self.search_tool.invoke(dict(intent.args)))
+
+    async def aanswer(self, question: str, query_params: Optional[Dict[str, Any]] = None) -> Optional[RoutedAnswer]:
+        intent = self.route(question, query_params)
+        if intent is None:
+            return None
+        return self._answer(intent, await self.search_tool.ainvoke(dict(intent.args)))
+
+    def get_stats(self) -> Dict:
+        handled = self.stats["routed"] + self.stats["passed"] + self.stats["search_errors"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "fast_path_rate": round(self.stats["routed"] / handled, 4) if handled else 0.0
+        }
+
+
+# Shared router used by the chat service
+intent_router = IntentRouter()
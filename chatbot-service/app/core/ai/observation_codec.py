@@ -0,0 +1,213 @@
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain.agents.format_scratchpad.tools import format_to_tool_messages
+from langchain_core.agents import AgentAction
+from langchain_core.messages import BaseMessage
+
+from .request_context import get_request_context
+
+OBSERVATION_COMPACT_ENABLED = os.getenv("OBSERVATION_COMPACT_ENABLED", "1") == "1"
+
+# Key of the ObservationRefs instance in the request context
+REFS_CONTEXT_KEY = "observation_refs"
+
+# Tool result keys -> short keys (legend in the agent's system prompt)
+SHORT_KEYS = {
+    "properties": "props",
+    "name": "n",
+    "price": "p",
+    "area": "a",
+    "district": "d",
+    "ward": "w",
+    "bedrooms": "bd",
+    "bathrooms": "ba",
+    "address": "ad",
+    "displayedAddress": "ad",
+    "contact_name": "cn",
+    "contactName": "cn",
+    "contact_phone": "cp",
+    "contactPhone": "cp",
+    "images": "img",
+    "image": "img",
+    "distance_km": "km",
+    "travel_times": "tt",
+    "property_type": "type",
+    "propertyType": "type",
+    "transaction_type": "tx",
+    "transactionType": "tx",
+    "total_found": "total",
+    "total_records": "total",
+    "pagination": "pg",
+    "current_page": "page",
+    "total_pages": "pages",
+    "has_more": "more",
+    "location_name": "loc",
+    "search_radius_km": "r_km",
+    "description": "desc",
+    "summary": "sum",
+    "filters_used": "filters",
+}
+
+# Fields the model never needs: derivable from other fields or only read by
+# the service itself (coordinates feed the location update marker, which is
+# built from the raw tool output)
+DROPPED_KEYS = {
+    "distance_desc", "district_normalized", "properties_on_page", "coordinates",
+    "createdAt", "updatedAt", "deletedAt",
+}
+
+# Placeholder values the tools fill in for missing data; a missing key says the same
+PLACEHOLDER_VALUES = {
+    "Not specified", "Chưa cập nhật", "Contact for price", "No image available", "Unnamed Property",
+    "N/A", "Distance unknown - No coordinates", "Distance unknown - Invalid coordinates",
+}
+
+_URL = re.compile(r"^https?://\S+$")
+_REF = re.compile(r"@(img|link)(\d+)")
+# End of a chunk that may be the start of a reference ("@", "@im", "@img1")
+_PARTIAL_REF = re.compile(r"@(?:i(?:m(?:g\d*)?)?|l(?:i(?:n(?:k\d*)?)?)?)?$")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class ObservationRefs:
+    """
+    Per-request store for values kept out of the prompt (image URLs, links).
+
+    The encoder replaces each URL with a short reference (@img1, @link2); the
+    model copies references into its answer and expand() swaps the real URLs
+    back in. The same URL always gets the same reference, so re-encoding
+    earlier steps on every agent iteration is stable.
+    """
+
+    def __init__(self):
+        self._refs: Dict[str, str] = {}
+        self._values: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def ref(self, value: str, kind: str = "link") -> str:
+        token = self._refs.get(value)
+        if token is None:
+            token = f"@{kind}{len(self._values) + 1}"
+            self._refs[value] = token
+            self._values[token] = value
+        return token
+
+    def expand(self, text: str) -> str:
+        """Replace references with their values (unknown references are left as they are)"""
+        if not text or "@" not in text:
+            return text
+        return _REF.sub(lambda m: self._values.get(m.group(0), m.group(0)), text)
+
+    def stream_expander(self) -> "RefStreamExpander":
+        return RefStreamExpander(self)
+
+
+class RefStreamExpander:
+    """
+    Expand references in streamed text. A chunk ending in what may be the
+    start of a reference is held back until the next chunk completes it.
+    """
+
+    def __init__(self, refs: ObservationRefs):
+        self.refs = refs
+        self._pending = ""
+
+    def feed(self, chunk: str) -> str:
+        text = self._pending + chunk
+        match = _PARTIAL_REF.search(text)
+        if match:
+            self._pending = text[match.start():]
+            text = text[:match.start()]
+        else:
+            self._pending = ""
+        return self.refs.expand(text)
+
+    def flush(self) -> str:
+        text, self._pending = self._pending, ""
+        return self.refs.expand(text)
+
+
+def _compact_number(value: float) -> Any:
+    if value != value:  # NaN
+        return None
+    rounded = round(value, 2)
+    return int(rounded) if rounded.is_integer() else rounded
+
+
+def _compact(value: Any, refs: Optional[ObservationRefs], key: Optional[str] = None) -> Any:
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, float):
+        return _compact_number(value)
+    if isinstance(value, str):
+        text = _WHITESPACE.sub(" ", value).strip()
+        if not text or text in PLACEHOLDER_VALUES:
+            return None
+        if refs is not None and _URL.match(text):
+            return refs.ref(text, "img" if key in ("images", "image", "url") else "link")
+        return text
+    if isinstance(value, dict):
+        if key in ("images", "image") and "url" in value:
+            return _compact(value.get("url"), refs, "image")
+        if key == "travel_times":
+            # {"walking": 12, "motorbike": 5, "car": 4} -> "12/5/4"
+            minutes = [value.get(mode) for mode in ("walking", "motorbike", "car")]
+            return "/".join(str(m) for m in minutes) if all(m is not None for m in minutes) else None
+        compacted = {}
+        for name, item in value.items():
+            if name in DROPPED_KEYS:
+                continue
+            item = _compact(item, refs, name)
+            if item is None or item == [] or item == {}:
+                continue
+            compacted[SHORT_KEYS.get(name, name)] = item
+        # success=True is the default; only failures are worth tokens
+        if compacted.get("success") is True:
+            del compacted["success"]
+        return compacted
+    if isinstance(value, (list, tuple)):
+        if key == "images":
+            # Only the first image is ever shown
+            return _compact(value[0], refs, "image") if value else None
+        items = [_compact(item, refs, key) for item in value]
+        return [item for item in items if item is not None]
+    if hasattr(value, "__float__"):
+        return _compact_number(float(value))
+    return value
+
+
+def encode_observation(observation: Any, refs: Optional[ObservationRefs] = None) -> str:
+    """
+    Compact JSON for a tool result in the agent scratchpad: short keys, no
+    null/placeholder/default fields, URLs replaced by references (when a
+    refs store is given), no whitespace, non-ASCII kept as is
+
+    Example:
+        {"properties": [{"name": "Phòng 12", "price": 3.5, "bathrooms": "Not specified",
+                         "images": {"url": "https://cdn/x.jpg"}}], "success": True}
+        -> '{"props":[{"n":"Phòng 12","p":3.5,"img":"@img1"}]}'
+    """
+    if isinstance(observation, str):
+        return observation
+    try:
+        return json.dumps(_compact(observation, refs), ensure_ascii=False, separators=(",", ":"))
+    except (TypeError, ValueError):
+        return str(observation)
+
+
+def format_compact_tool_messages(intermediate_steps: Sequence[Tuple[AgentAction, Any]]) -> List[BaseMessage]:
+    """
+    message_formatter for create_tool_calling_agent: like the default
+    format_to_tool_messages, but observations are compact-encoded
+    """
+    if not OBSERVATION_COMPACT_ENABLED:
+        return format_to_tool_messages(intermediate_steps)
+    refs = get_request_context().get(REFS_CONTEXT_KEY)
+    return format_to_tool_messages([
+        (action, encode_observation(observation, refs)) for action, observation in intermediate_steps
+    ])
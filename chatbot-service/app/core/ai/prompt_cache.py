@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from .request_context import get_request_context
+
+# Send a prompt_cache_key so requests sharing the static prefix are routed
+# to the same provider cache
+PROMPT_CACHE_KEY_ENABLED = os.getenv("PROMPT_CACHE_KEY_ENABLED", "1") == "1"
+PROMPT_CACHE_LOG = os.getenv("PROMPT_CACHE_LOG", "1") == "1"
+
+# Key of the PromptUsage record in the request context
+PROMPT_USAGE_CONTEXT_KEY = "prompt_usage"
+
+_EMPTY_FILTER_VALUES = (None, "", [], {})
+
+
+def prompt_cache_key(system_message: str, tools: Sequence[Any]) -> str:
+    """
+    Routing key for provider-side prompt caching. It only depends on the
+    static prefix (system prompt and tool schemas), so it changes exactly
+    when that prefix does.
+    """
+    digest = hashlib.sha1(system_message.encode("utf-8"))
+    for tool in tools:
+        digest.update(f"\x00{tool.name}\x00{tool.description}".encode("utf-8"))
+    return f"rental-agent-{digest.hexdigest()[:16]}"
+
+
+def format_agent_input(question: str, query_params: Optional[Dict[str, Any]]) -> str:
+    """
+    Human turn sent to the agent: the question, then the frontend filters.
+
+    The filters are the only per-request data in the prompt besides the
+    history, so they go last and are rendered canonically (sorted keys, empty
+    values dropped, compact JSON): the same filters always give the same text.
+
+    Example:
+        format_agent_input("Phòng gần ĐH Bách Khoa", {"maxPrice": 5, "district": ""})
+        -> 'Phòng gần ĐH Bách Khoa\\n\\nCurrent filters: {"maxPrice":5}'
+    """
+    filters = {key: value for key, value in (query_params or {}).items() if value not in _EMPTY_FILTER_VALUES}
+    if not filters:
+        return question
+    rendered = json.dumps(filters, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return f"{question}\n\nCurrent filters: {rendered}"
+
+
+@dataclass
+class PromptUsage:
+    """Prompt token usage of one chat request (all model calls of the agent run)"""
+    calls: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def cached_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+class PromptCacheMonitor(BaseCallbackHandler):
+    """
+    Records cached vs uncached prompt tokens reported by the provider.
+
+    Attached to the chat model, so it sees every agent call. Totals are kept
+    process-wide; begin()/finish() around an agent run also collect the
+    usage of that request (through the request context) and log it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "llm_calls": 0, "calls_with_cache_hit": 0, "calls_without_usage": 0,
+                      "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+
+    @staticmethod
+    def _usage(response: LLMResult) -> Optional[Dict[str, int]]:
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    details = usage.get("input_token_details") or {}
+                    return {"prompt": usage.get("input_tokens") or 0,
+                            "cached": details.get("cache_read") or 0,
+                            "completion": usage.get("output_tokens") or 0}
+        token_usage = (response.llm_output or {}).get("token_usage")
+        if token_usage:
+            details = token_usage.get("prompt_tokens_details") or {}
+            return {"prompt": token_usage.get("prompt_tokens") or 0,
+                    "cached": details.get("cached_tokens") or 0,
+                    "completion": token_usage.get("completion_tokens") or 0}
+        return None
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        usage = self._usage(response)
+        with self._lock:
+            self.stats["llm_calls"] += 1
+            if usage is None:
+                self.stats["calls_without_usage"] += 1
+                return
+            self.stats["prompt_tokens"] += usage["prompt"]
+            self.stats["cached_tokens"] += usage["cached"]
+            self.stats["completion_tokens"] += usage["completion"]
+            if usage["cached"]:
+                self.stats["calls_with_cache_hit"] += 1
+
+        request_usage = get_request_context().get(PROMPT_USAGE_CONTEXT_KEY)
+        if request_usage is not None:
+            request_usage.calls += 1
+            request_usage.prompt_tokens += usage["prompt"]
+            request_usage.cached_tokens += usage["cached"]
+            request_usage.completion_tokens += usage["completion"]
+
+    def begin(self, context: Dict[str, Any]) -> PromptUsage:
+        """Start collecting the usage of a request (call before scoping the request context)"""
+        usage = PromptUsage()
+        context[PROMPT_USAGE_CONTEXT_KEY] = usage
+        return usage
+
+    def finish(self, context: Dict[str, Any]) -> Optional[PromptUsage]:
+        """Stop collecting for a request and log its usage"""
+        usage = context.pop(PROMPT_USAGE_CONTEXT_KEY, None)
+        if usage is None or not usage.calls:
+            return usage
+        with self._lock:
+            self.stats["requests"] += 1
+        if PROMPT_CACHE_LOG:
+            print(f"[PROMPT] thread={context.get('thread_id')} calls={usage.calls} "
+                  f"prompt_tokens={usage.prompt_tokens} cached={usage.cached_tokens} "
+                  f"({usage.cached_ratio:.0%})")
+        return usage
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            prompt_tokens = self.stats["prompt_tokens"]
+            return {
+                **self.stats,
+                "uncached_tokens": prompt_tokens - self.stats["cached_tokens"],
+                "cached_ratio": round(self.stats["cached_tokens"] / prompt_tokens, 4) if prompt_tokens else 0.0
+            }
+
+
+# Shared monitor attached to the agent's chat model
+prompt_cache_monitor = PromptCacheMonitor()
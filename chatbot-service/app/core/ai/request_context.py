@@ -0,0 +1,57 @@
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Iterator, Optional
+
+# Context of the chat request being served (thread_id, query_params, ...).
+# Every asyncio task / executor thread sees its own value, so overlapping
+# agent invocations in one process never read each other's filters.
+_request_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("chat_request_context", default=None)
+
+
+def set_request_context(context: Dict[str, Any]) -> Token:
+    """
+    Bind the request context to the current execution context
+
+    Args:
+        context (Dict[str, Any]): Request context (thread_id, query_params, ...)
+
+    Returns:
+        Token: Token to pass to reset_request_context()
+    """
+    return _request_context.set(dict(context))
+
+
+def reset_request_context(token: Token) -> None:
+    """Restore the context that was active before set_request_context()"""
+    try:
+        _request_context.reset(token)
+    except ValueError:
+        # Generator finalised from another context (e.g. client disconnect);
+        # the request's own context is discarded with its task anyway
+        pass
+
+
+def get_request_context() -> Dict[str, Any]:
+    """Return the context of the current request, or an empty dict outside a request"""
+    return _request_context.get() or {}
+
+
+def get_query_params() -> Dict[str, Any]:
+    """Return the frontend filters of the current request"""
+    return get_request_context().get("query_params") or {}
+
+
+@contextmanager
+def request_context(context: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """
+    Scope the request context to a block
+
+    Usage:
+        with request_context({"thread_id": "abc", "query_params": {...}}):
+            agent.invoke(...)
+    """
+    token = set_request_context(context)
+    try:
+        yield get_request_context()
+    finally:
+        reset_request_context(token)
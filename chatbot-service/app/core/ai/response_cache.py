@@ -0,0 +1,407 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .stream_pacing import is_control_chunk
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+# Edits to existing posts don't move the listing version, so the TTL bounds their staleness
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))  # seconds
+# Answers depend on earlier turns, so by default only a thread's first question is cached
+RESPONSE_CACHE_FIRST_TURN_ONLY = os.getenv("RESPONSE_CACHE_FIRST_TURN_ONLY", "1") == "1"
+# Seconds between listing version checks against the rental API
+RESPONSE_CACHE_VERSION_CHECK = float(os.getenv("RESPONSE_CACHE_VERSION_CHECK", "30"))
+# Embedding tier: off unless enabled, it costs one embedding call per miss
+RESPONSE_CACHE_SEMANTIC = os.getenv("RESPONSE_CACHE_SEMANTIC", "0") == "1"
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.93"))
+RESPONSE_CACHE_EMBEDDING_MODEL = os.getenv("RESPONSE_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+
+_WHITESPACE = re.compile(r"\s+")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_NUMBERS = re.compile(r"\d+(?:[.,]\d+)?")
+_MARKER_CHUNKS = re.compile(
+    r"(\n*__LOCATION_UPDATE__.*?__END_LOCATION_UPDATE__\n*|\n*__FILTER_UPDATE__.*?__END_FILTER_UPDATE__\n*)",
+    re.DOTALL
+)
+
+
+def normalize_question(question: str) -> str:
+    """
+    Cache key for a question: NFC, casefolded, punctuation dropped, whitespace
+    collapsed. Diacritics are kept ("bán" and "bạn" are different words).
+
+    Example: "Phòng trọ  Quận 7, dưới 5 triệu?" -> "phòng trọ quận 7 dưới 5 triệu"
+    """
+    if not question:
+        return ""
+    text = unicodedata.normalize("NFC", question).casefold()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def split_markers(text: str) -> List[str]:
+    """
+    Split a /chat answer into stream-shaped chunks: model text and one chunk
+    per __LOCATION_UPDATE__ / __FILTER_UPDATE__ marker
+    """
+    return [part for part in _MARKER_CHUNKS.split(text or "") if part]
+
+
+def _canonical_value(value: Any) -> Any:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return int(value) if float(value).is_integer() else round(float(value), 6)
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            return _canonical_value(float(text))
+        except ValueError:
+            return unicodedata.normalize("NFC", text).casefold()
+    if isinstance(value, (list, tuple)):
+        return [_canonical_value(item) for item in value]
+    if isinstance(value, dict):
+        return canonicalize_filters(value)
+    return str(value)
+
+
+def canonicalize_filters(query_params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Drop empty filters and normalize values so equivalent filter sets compare
+    equal: {"maxPrice": "5000000", "district": "Quận 7 ", "ward": None}
+    -> {"district": "quận 7", "maxPrice": 5000000}
+    """
+    canonical = {}
+    for key, value in (query_params or {}).items():
+        if value is None or value == "" or value == [] or value == {}:
+            continue
+        canonical[str(key)] = _canonical_value(value)
+    return dict(sorted(canonical.items()))
+
+
+@dataclass
+class CachedResponse:
+    """A finished answer as it was streamed (text chunks and update markers)"""
+    chunks: List[str]
+    version: Any
+    expires_at: float
+    hits: int = 0
+
+    @property
+    def text(self) -> str:
+        """Full answer including markers (what /chat returns)"""
+        return "".join(self.chunks)
+
+    @property
+    def answer(self) -> str:
+        """Model text only (what the streaming path records in history)"""
+        return "".join(chunk for chunk in self.chunks if not is_control_chunk(chunk))
+
+
+@dataclass
+class _VectorIndex:
+    """
+    Brute-force cosine index over question embeddings. Vectors are unit
+    length, so one matrix product scores every entry; the matrix is rebuilt
+    lazily after inserts/removals (the cache holds at most a few thousand).
+    """
+    vectors: Dict[str, Tuple[str, Tuple[str, ...], np.ndarray]] = field(default_factory=dict)
+    _keys: List[str] = field(default_factory=list)
+    _scopes: Optional[np.ndarray] = None
+    _numbers: List[Tuple[str, ...]] = field(default_factory=list)
+    _matrix: Optional[np.ndarray] = None
+
+    def add(self, key: str, scope: str, numbers: Tuple[str, ...], vector: np.ndarray) -> None:
+        self.vectors[key] = (scope, numbers, vector)
+        self._matrix = None
+
+    def remove(self, key: str) -> None:
+        if self.vectors.pop(key, None) is not None:
+            self._matrix = None
+
+    def clear(self) -> None:
+        self.vectors.clear()
+        self._matrix = None
+
+    def search(self, scope: str, numbers: Tuple[str, ...], vector: np.ndarray,
+               threshold: float) -> Optional[Tuple[str, float]]:
+        if not self.vectors:
+            return None
+        if self._matrix is None:
+            self._keys = list(self.vectors)
+            self._scopes = np.asarray([self.vectors[key][0] for key in self._keys])
+            self._numbers = [self.vectors[key][1] for key in self._keys]
+            self._matrix = np.vstack([self.vectors[key][2] for key in self._keys])
+
+        scores = self._matrix @ vector
+        # Only entries with the same filters can answer the question
+        scores[self._scopes != scope] = -1.0
+        for i in np.argsort(scores)[::-1]:
+            if scores[i] < threshold:
+                return None
+            # "dưới 5 triệu" and "dưới 3 triệu" embed almost identically:
+            # numbers in the question must match exactly
+            if self._numbers[i] == numbers:
+                return self._keys[i], float(scores[i])
+        return None
+
+
+class ResponseCache:
+    """
+    Cache of finished chatbot answers keyed on the normalized question and
+    the canonicalized query_params.
+
+    - Exact tier: LRU dict with TTL
+    - Semantic tier (optional): nearest cached question by embedding cosine
+      similarity, restricted to the same filters and the same numbers
+    - Every entry records the listing version it was produced under; when the
+      rental API's active posts change (count or newest post) all entries are
+      dropped
+
+    A hit holds the chunks exactly as they were streamed, so it can be
+    replayed with its __LOCATION_UPDATE__ / __FILTER_UPDATE__ markers without
+    calling the model or the tools.
+    """
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE, ttl: int = RESPONSE_CACHE_TTL,
+                 version_source: Optional[Callable[[], Any]] = None,
+                 semantic: bool = RESPONSE_CACHE_SEMANTIC,
+                 similarity: float = RESPONSE_CACHE_SIMILARITY,
+                 embedder: Any = None,
+                 enabled: bool = RESPONSE_CACHE_ENABLED):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version_source = version_source
+        self.semantic = semantic
+        self.similarity = similarity
+        self.enabled = enabled
+        self._embedder = embedder
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._vectors = _VectorIndex()
+        self._version: Any = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0,
+                      "invalidations": 0, "embedding_errors": 0}
+
+    # Keys -----------------------------------------------------------------
+
+    @staticmethod
+    def make_key(question: str, query_params: Optional[Dict[str, Any]]) -> Tuple[str, str, str]:
+        """
+        Returns:
+            Tuple[str, str, str]: (entry key, normalized question, filters scope)
+        """
+        normalized = normalize_question(question)
+        scope = json.dumps(canonicalize_filters(query_params), ensure_ascii=False, sort_keys=True)
+        key = hashlib.sha1(f"{normalized}\x00{scope}".encode("utf-8")).hexdigest()
+        return key, normalized, scope
+
+    # Listing version --------------------------------------------------------
+
+    def _sync_version(self) -> Any:
+        """Drop every entry if the listing version moved since the last check"""
+        if self.version_source is None:
+            return None
+        version = self.version_source()
+        if version is None:
+            # Version unknown (rental API unreachable): TTL alone bounds staleness
+            return self._version
+        with self._lock:
+            if self._version is not None and version != self._version:
+                self.stats["invalidations"] += 1
+                print(f"[RESPONSE_CACHE] Listings changed, dropping {len(self._entries)} cached answers")
+                self._entries.clear()
+                self._vectors.clear()
+            self._version = version
+        return version
+
+    # Embeddings -------------------------------------------------------------
+
+    def _get_embedder(self):
+        if self._embedder is None:
+            from langchain_openai import OpenAIEmbeddings
+
+            self._embedder = OpenAIEmbeddings(model=RESPONSE_CACHE_EMBEDDING_MODEL)
+        return self._embedder
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        try:
+            return self._unit(self._get_embedder().embed_query(text))
+        except Exception as e:
+            self.stats["embedding_errors"] += 1
+            print(f"[RESPONSE_CACHE] Embedding failed, exact match only: {str(e)}")
+            return None
+
+    async def _aembed(self, text: str) -> Optional[np.ndarray]:
+        try:
+            return self._unit(await self._get_embedder().aembed_query(text))
+        except Exception as e:
+            self.stats["embedding_errors"] += 1
+            print(f"[RESPONSE_CACHE] Embedding failed, exact match only: {str(e)}")
+            return None
+
+    # Lookup / store -----------------------------------------------------------
+
+    def _take(self, key: str, version: Any) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.time() or (version is not None and entry.version != version):
+                del self._entries[key]
+                self._vectors.remove(key)
+                return None
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            return entry
+
+    def _get_similar(self, normalized: str, scope: str, vector: Optional[np.ndarray],
+                     version: Any) -> Optional[CachedResponse]:
+        if vector is None:
+            return None
+        with self._lock:
+            match = self._vectors.search(scope, tuple(_NUMBERS.findall(normalized)), vector, self.similarity)
+        if match is None:
+            return None
+        entry = self._take(match[0], version)
+        if entry is not None:
+            self.stats["semantic_hits"] += 1
+            print(f"[RESPONSE_CACHE] Semantic hit (similarity {match[1]:.3f})")
+        return entry
+
+    def get(self, question: str, query_params: Optional[Dict[str, Any]]) -> Optional[CachedResponse]:
+        """Cached answer for the question and filters, or None on a miss"""
+        if not self.enabled:
+            return None
+        version = self._sync_version()
+        key, normalized, scope = self.make_key(question, query_params)
+        entry = self._take(key, version)
+        if entry is not None:
+            self.stats["hits"] += 1
+        elif self.semantic:
+            entry = self._get_similar(normalized, scope, self._embed(normalized), version)
+        if entry is None:
+            self.stats["misses"] += 1
+        return entry
+
+    async def aget(self, question: str, query_params: Optional[Dict[str, Any]]) -> Optional[CachedResponse]:
+        """Async version of get (the version check and embedding don't block the loop)"""
+        if not self.enabled:
+            return None
+        version = await asyncio.to_thread(self._sync_version)
+        key, normalized, scope = self.make_key(question, query_params)
+        entry = self._take(key, version)
+        if entry is not None:
+            self.stats["hits"] += 1
+        elif self.semantic:
+            entry = self._get_similar(normalized, scope, await self._aembed(normalized), version)
+        if entry is None:
+            self.stats["misses"] += 1
+        return entry
+
+    def _store(self, key: str, normalized: str, scope: str, chunks: List[str],
+               vector: Optional[np.ndarray], version: Any) -> None:
+        entry = CachedResponse(chunks=list(chunks), version=version, expires_at=time.time() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            if vector is not None:
+                self._vectors.add(key, scope, tuple(_NUMBERS.findall(normalized)), vector)
+            while len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                self._vectors.remove(evicted)
+            self.stats["stores"] += 1
+
+    def put(self, question: str, query_params: Optional[Dict[str, Any]], chunks: List[str]) -> None:
+        """Store a finished answer (chunks in stream order, markers included)"""
+        if not self.enabled or all(is_control_chunk(chunk) for chunk in chunks):
+            return
+        version = self._sync_version()
+        key, normalized, scope = self.make_key(question, query_params)
+        vector = self._embed(normalized) if self.semantic else None
+        self._store(key, normalized, scope, chunks, vector, version)
+
+    async def aput(self, question: str, query_params: Optional[Dict[str, Any]], chunks: List[str]) -> None:
+        if not self.enabled or all(is_control_chunk(chunk) for chunk in chunks):
+            return
+        version = await asyncio.to_thread(self._sync_version)
+        key, normalized, scope = self.make_key(question, query_params)
+        vector = await self._aembed(normalized) if self.semantic else None
+        self._store(key, normalized, scope, chunks, vector, version)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            hits = self.stats["hits"] + self.stats["semantic_hits"]
+            lookups = hits + self.stats["misses"]
+            return {
+                **self.stats,
+                "enabled": self.enabled,
+                "semantic": self.semantic,
+                "entries": len(self._entries),
+                "version": str(self._version) if self._version is not None else None,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class _ListingsVersion:
+    """
+    Current listing version, probed from the rental API at most every
+    `interval` seconds.
+
+    The answers are built from /posts (the backend's rental_posts table), so
+    the version is read from there too: one GET /posts?limit=1 gives the
+    number of active posts and the newest one. New, deleted and deactivated
+    posts change it; edits to older posts don't, only the TTL bounds those.
+    """
+
+    def __init__(self, interval: float = RESPONSE_CACHE_VERSION_CHECK):
+        self.interval = interval
+        self._value: Any = None
+        self._checked_at = 0.0
+
+    @staticmethod
+    def _probe() -> Optional[tuple]:
+        from app.core.http_client import http_client, rental_posts_request
+
+        try:
+            response = http_client.send(rental_posts_request({"page": 1, "limit": 1}))
+            response.raise_for_status()
+            body = response.json()
+        except Exception as e:
+            print(f"[RESPONSE_CACHE] Listing version check failed: {str(e)}")
+            return None
+        newest = (body.get("data") or [{}])[0]
+        total = (body.get("pagination") or {}).get("total_records")
+        return total, newest.get("id"), newest.get("updatedAt")
+
+    def __call__(self) -> Any:
+        if time.time() - self._checked_at >= self.interval:
+            self._checked_at = time.time()
+            self._value = self._probe()
+        return self._value
+
+
+# Shared cache used by the chat service
+response_cache = ResponseCache(version_source=_ListingsVersion())
@@ -0,0 +1,107 @@
+import asyncio
+import os
+from typing import AsyncGenerator, AsyncIterator, Optional
+
+# Default frame window for /chat/stream (0 = forward every token immediately)
+DEFAULT_FRAME_MS = int(os.getenv("STREAM_FRAME_MS", "0"))
+# Upper bound a client can request, so a frame never holds text for too long
+MAX_FRAME_MS = int(os.getenv("STREAM_MAX_FRAME_MS", "500"))
+
+# Chunks carrying these markers are control frames for the frontend and are
+# never merged with model text
+CONTROL_MARKERS = ("__LOCATION_UPDATE__", "__FILTER_UPDATE__")
+
+_DONE = object()
+
+
+def resolve_frame_ms(frame_ms: Optional[int]) -> int:
+    """
+    Clamp the requested frame window to [0, MAX_FRAME_MS]
+
+    Args:
+        frame_ms (Optional[int]): Window requested by the client, None for the default
+
+    Returns:
+        int: Frame window in milliseconds
+    """
+    if frame_ms is None:
+        frame_ms = DEFAULT_FRAME_MS
+    return max(0, min(int(frame_ms), MAX_FRAME_MS))
+
+
+def is_control_chunk(chunk: str) -> bool:
+    return any(marker in chunk for marker in CONTROL_MARKERS)
+
+
+async def pace_stream(source: AsyncIterator[str], frame_ms: Optional[int] = None) -> AsyncGenerator[str, None]:
+    """
+    Forward a token stream, optionally coalescing tokens into time-window frames
+
+    With a window of 0 every chunk is passed through as soon as it arrives.
+    Otherwise the tokens received during a window are joined and sent as one
+    frame when the window closes. Waiting is done on the event loop, so other
+    streams served by the same worker are never blocked.
+
+    Args:
+        source (AsyncIterator[str]): Upstream chunks (model tokens and control markers)
+        frame_ms (Optional[int]): Frame window in milliseconds
+
+    Yields:
+        str: Chunks or coalesced frames
+    """
+    window_ms = resolve_frame_ms(frame_ms)
+    if window_ms == 0:
+        async for chunk in source:
+            yield chunk
+        return
+
+    window = window_ms / 1000
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for chunk in source:
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            await queue.put(_DONE)
+
+    pump_task = asyncio.create_task(pump())
+    buffer = []
+    deadline = None
+
+    try:
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                # Window closed: flush what we collected
+                yield "".join(buffer)
+                buffer = []
+                deadline = None
+                continue
+
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            if is_control_chunk(item):
+                if buffer:
+                    yield "".join(buffer)
+                    buffer = []
+                    deadline = None
+                yield item
+                continue
+
+            buffer.append(item)
+            if deadline is None:
+                deadline = loop.time() + window
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        pump_task.cancel()
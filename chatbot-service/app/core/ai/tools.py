@@ -9,12 +9,32 @@ from decimal import Decimal
 import math
 from datetime import datetime
 from ..location_utils import LocationUtils
-import requests
+from ..geo_batch import (coordinates_from_records, compute_distances, COORD_MISSING, COORD_UNPARSEABLE,
+                         MEAN_EARTH_RADIUS_KM)
+from ..http_client import http_client, HttpRequest, rental_posts_request, RENTAL_SERVICE_URL
+from ..geocoding import cached_geocode_flow, geocode_cache, default_geocoder, GeocodingError, GeocodeResult
+from ..gazetteer import hcmc_gazetteer
+from ..spatial_index import listing_index, parse_bounds
+from ..text_utils import normalize_district
+from .request_context import get_query_params
+import asyncio
+import concurrent.futures
+import httpx
 import json
-from requests.adapters import HTTPAdapter
-from urllib.parse import urlparse, urlunparse
+import numpy as np
 import os
-from urllib.parse import quote
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Generator
+
+# Shared cache of rental API /posts responses
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE_ENABLED", "1") == "1"
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "512"))
+TOOL_CACHE_TTL = int(os.getenv("TOOL_CACHE_TTL", "60"))  # seconds
+# Upper bound for one async tool call; the agent gets an error result instead of waiting
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "20"))  # seconds
 
 # class ProductSearchInput(BaseModel):
 #     product_name: str = Field(..., description="The name of the product to search for")
@@ -27,11 +47,238 @@ from urllib.parse import quote
 #     def _run(self, product_name: str) -> Optional[Dict]:
 #         return get_product_by_name(product_name)
 
+def _canonical_param(name: str, value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float, Decimal)):
+        number = float(value)
+        # 5000000, 5000000.0 and "5000000" produce the same key
+        return str(int(number)) if number.is_integer() else repr(round(number, 6))
+    text = unicodedata.normalize("NFC", str(value)).strip()
+    if name == "district":
+        return normalize_district(text).casefold()
+    try:
+        return _canonical_param(name, float(text))
+    except ValueError:
+        return text.casefold()
+
+
+def canonical_params(params: Optional[Dict[str, Any]]) -> Tuple[Tuple[str, str], ...]:
+    """
+    Order-independent key for query parameters: empty values dropped, numbers
+    formatted one way, strings trimmed and casefolded, district normalized
+    ("Quận 7" and "7" are the same lookup)
+    """
+    canonical = []
+    for name, value in (params or {}).items():
+        if value is None or value == "":
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ",".join(_canonical_param(name, item) for item in value)
+        else:
+            value = _canonical_param(name, value)
+        canonical.append((name, value))
+    return tuple(sorted(canonical))
+
+
+class RentalApiCache:
+    """
+    Memoization layer for GET /posts calls made by the tools.
+
+    - Responses are keyed on the canonical query parameters and kept in an
+      LRU with TTL; only 200 responses are stored
+    - Concurrent identical requests are collapsed: the first caller sends the
+      request and the others wait for its response (single flight)
+
+    Sync callers never wait on an async in-flight request: sync get_answer
+    callers run on a worker thread and must not block on a future owned by
+    the event loop, whose request they can't drive or cancel.
+    """
+
+    def __init__(self, max_size: int = TOOL_CACHE_SIZE, ttl: int = TOOL_CACHE_TTL,
+                 enabled: bool = TOOL_CACHE_ENABLED):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries: "OrderedDict[tuple, Tuple[float, httpx.Response]]" = OrderedDict()
+        self._inflight: Dict[tuple, Tuple[concurrent.futures.Future, bool]] = {}
+        # Running async fetches (the event loop only keeps weak references)
+        self._tasks: set = set()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(request: HttpRequest) -> Optional[tuple]:
+        """Cache key for a rental API listing lookup, None for any other request"""
+        if request.method != "GET" or request.url != f"{RENTAL_SERVICE_URL}/posts":
+            return None
+        return canonical_params(request.params)
+
+    def _lookup(self, key: tuple) -> Optional[httpx.Response]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    def _claim(self, key: tuple, is_async: bool):
+        """
+        Returns:
+            (cached response, None, False) on a hit, otherwise (None, future, leader)
+            where the leader sends the request and completes the future
+        """
+        with self._lock:
+            response = self._lookup(key)
+            if response is not None:
+                self.stats["hits"] += 1
+                return response, None, False
+            inflight = self._inflight.get(key)
+            if inflight is not None and (is_async or not inflight[1]):
+                self.stats["coalesced"] += 1
+                return None, inflight[0], False
+            self.stats["misses"] += 1
+            future = concurrent.futures.Future()
+            if inflight is None:
+                self._inflight[key] = (future, is_async)
+            return None, future, True
+
+    def _complete(self, key: tuple, future: concurrent.futures.Future,
+                  response: Optional[httpx.Response] = None, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            if self._inflight.get(key, (None,))[0] is future:
+                del self._inflight[key]
+            if response is not None and response.status_code == 200:
+                self._entries[key] = (time.time() + self.ttl, response)
+                self._entries.move_to_end(key)
+                self.stats["stores"] += 1
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.stats["evictions"] += 1
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(response)
+
+    def send(self, request: HttpRequest) -> httpx.Response:
+        """Sync sender for http_client.run_flow"""
+        key = self.make_key(request) if self.enabled else None
+        if key is None:
+            return http_client.send(request)
+        response, future, leader = self._claim(key, is_async=False)
+        if response is not None:
+            return response
+        if not leader:
+            return future.result()
+        try:
+            response = http_client.send(request)
+        except BaseException as e:
+            self._complete(key, future, error=e)
+            raise
+        self._complete(key, future, response=response)
+        return response
+
+    async def asend(self, request: HttpRequest) -> httpx.Response:
+        """Async sender for http_client.arun_flow"""
+        key = self.make_key(request) if self.enabled else None
+        if key is None:
+            return await http_client.asend(request)
+        response, future, leader = self._claim(key, is_async=True)
+        if response is not None:
+            return response
+        if not leader:
+            # Waiting on the future doesn't block the event loop; the shield
+            # keeps a caller's own timeout from cancelling the shared future
+            return await asyncio.shield(asyncio.wrap_future(future))
+        # The request runs as its own task: a leader that times out stops
+        # waiting, but the request the coalesced callers wait on carries on
+        task = asyncio.ensure_future(self._afetch(key, future, request))
+        self._tasks.add(task)
+        task.add_done_callback(self._forget_task)
+        return await asyncio.shield(task)
+
+    async def _afetch(self, key: tuple, future: concurrent.futures.Future,
+                      request: HttpRequest) -> httpx.Response:
+        try:
+            response = await http_client.asend(request)
+        except Exception as e:
+            self._complete(key, future, error=e)
+            raise
+        except BaseException:
+            # Cancelled with the event loop: waiters get an ordinary error
+            self._complete(key, future, error=RuntimeError("Rental API request was cancelled"))
+            raise
+        self._complete(key, future, response=response)
+        return response
+
+    def _forget_task(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        # Errors already reached the waiters through the future; retrieving
+        # them here avoids "exception was never retrieved" when the leader left
+        if not task.cancelled():
+            task.exception()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "in_flight": len(self._inflight),
+                "hit_rate": round((self.stats["hits"] + self.stats["coalesced"]) / lookups, 4) if lookups else 0.0
+            }
+
+
+# Shared by every tool that lists posts
+rental_api_cache = RentalApiCache()
+
+class HttpApiTool(BaseTool):
+    """
+    Base class for tools that call HTTP APIs (rental service, Goong).
+
+    Subclasses implement _flow(): a generator that yields HttpRequest objects,
+    receives the httpx.Response for each one and returns the tool result.
+    _run drives the flow with the pooled sync client and _arun with the pooled
+    async client, so agent runs on the event loop never block on tool I/O.
+    Rental API listing calls go through the shared RentalApiCache.
+
+    Tool calls requested in the same model turn run concurrently; each async
+    call is bounded by `timeout` seconds.
+    """
+
+    timeout: ClassVar[float] = TOOL_TIMEOUT
+
+    def _flow(self, *args, **kwargs) -> Generator[HttpRequest, httpx.Response, Dict]:
+        raise NotImplementedError
+
+    def _run(self, *args, **kwargs) -> Dict:
+        return http_client.run_flow(self._flow(*args, **kwargs), send=rental_api_cache.send)
+
+    async def _arun(self, *args, **kwargs) -> Dict:
+        try:
+            return await asyncio.wait_for(
+                http_client.arun_flow(self._flow(*args, **kwargs), send=rental_api_cache.asend),
+                timeout=self.timeout
+            )
+        except asyncio.TimeoutError:
+            print(f"[DEBUG] Tool {self.name} timed out after {self.timeout}s")
+            return {
+                "success": False,
+                "error": f"{self.name} timed out after {self.timeout:g} seconds, try again or narrow the search"
+            }
+
 class ShowPropertiesInput(BaseModel):
     query: Optional[str] = Field(default="", description="Optional search query to filter properties")
     page: Optional[int] = Field(default=1, description="Page number for pagination")
 
-class ShowPropertiesTool(BaseTool):
+class ShowPropertiesTool(HttpApiTool):
     name: Annotated[str, Field(description="Tool name")] = "show_properties"
     description: Annotated[str, Field(description="Tool description")] = """
     Show an overview of available properties.
@@ -66,7 +313,7 @@ class ShowPropertiesTool(BaseTool):
             "images": first_image
         }
 
-    def _run(self, query: str = "", page: int = 1) -> Dict:
+    def _flow(self, query: str = "", page: int = 1) -> Generator[HttpRequest, httpx.Response, Dict]:
         try:
             print(f"\n[DEBUG] ShowPropertiesTool making API call (page: {page})")
             
@@ -77,19 +324,11 @@ class ShowPropertiesTool(BaseTool):
             }
             
             # Print API call information
-            print(f"[DEBUG] URL: http://localhost:8080/api/posts")
+            print(f"[DEBUG] URL: {RENTAL_SERVICE_URL}/posts")
             print(f"[DEBUG] Params: {params}")
             
-            # Use a session with the debugging adapter
-            session = requests.Session()
-            session.mount('http://', DebuggingAdapter())
-            session.mount('https://', DebuggingAdapter())
-            
-            # Make API call using the session
-            response = session.get(
-                "http://localhost:8080/api/posts",
-                params=params
-            )
+            # Make API call using the pooled client
+            response = yield rental_posts_request(params)
             
             if response.status_code != 200:
                 print(f"[DEBUG] API call failed with status code {response.status_code}: {response.text}")
@@ -176,7 +415,7 @@ class CheckPropertiesPriceRangeInput(BaseModel):
     min_price: float = Field(..., description="Minimum price in millions VND")
     max_price: float = Field(..., description="Maximum price in millions VND")
 
-class CheckPropertiesDistrictTool(BaseTool):
+class CheckPropertiesDistrictTool(HttpApiTool):
     name: Annotated[str, Field(description="Tool name")] = "check_properties_district"
     description: Annotated[str, Field(description="Tool description")] = """
     Search for properties in a specific district.
@@ -224,27 +463,9 @@ class CheckPropertiesDistrictTool(BaseTool):
         - Nếu là "Quận X" hoặc "District X" -> trả về "X" 
         - Giữ nguyên các tên quận/huyện khác như "Bình Thạnh", "Thủ Đức"
         """
-        import re
-        
-        # Chuẩn hóa district input
-        district = district.strip()
-        
-        # Mẫu regex bắt "Quận X" hoặc "District X" (với X là số)
-        quan_pattern = re.compile(r'^(?:quận|quan|district|q)\s*(\d+)$', re.IGNORECASE)
-        match = quan_pattern.match(district)
-        
-        if match:
-            # Nếu match "Quận X" -> trả về X (số)
-            return match.group(1)
-        
-        # Kiểm tra nếu district chỉ là số
-        if district.isdigit():
-            return district
-            
-        # Giữ nguyên các quận/huyện khác
-        return district
+        return normalize_district(district)
 
-    def _run(self, district: str, page: int = 1) -> Dict:
+    def _flow(self, district: str, page: int = 1) -> Generator[HttpRequest, httpx.Response, Dict]:
         print(f"\n[DEBUG] CheckPropertiesDistrictTool called with district: {district}, page: {page}")
         
         # Normalize district parameter
@@ -262,24 +483,11 @@ class CheckPropertiesDistrictTool(BaseTool):
             
             # Print API call information
             print(f"\n[DEBUG] CheckPropertiesDistrictTool making API call:")
-            print(f"[DEBUG] URL: http://localhost:8080/api/posts")
+            print(f"[DEBUG] URL: {RENTAL_SERVICE_URL}/posts")
             print(f"[DEBUG] Params: {params}")
-            
-            # Build full URL for display
-            param_strings = [f"{key}={value}" for key, value in params.items()]
-            full_url = f"http://localhost:8080/api/posts?{'&'.join(param_strings)}"
-            print(f"[DEBUG] Full URL: {full_url}")
-            
-            # Use a session with the debugging adapter to capture and print request details
-            session = requests.Session()
-            session.mount('http://', DebuggingAdapter())
-            session.mount('https://', DebuggingAdapter())
                 
-            # Make API call using the session
-            response = session.get(
-                "http://localhost:8080/api/posts",
-                params=params
-            )
+            # Make API call using the pooled client
+            response = yield rental_posts_request(params)
             
             # Print response details
             print(f"\n[DEBUG] ============ RESPONSE DETAILS ============")
@@ -343,7 +551,7 @@ class CheckPropertiesDistrictTool(BaseTool):
                 "error": f"Error fetching properties: {str(e)}"
             }
 
-class CheckPropertiesStatusTool(BaseTool):
+class CheckPropertiesStatusTool(HttpApiTool):
     name: Annotated[str, Field(description="Tool name")] = "check_properties_status"
     description: Annotated[str, Field(description="Tool description")] = """
     Search for properties with a specific status.
@@ -367,7 +575,7 @@ class CheckPropertiesStatusTool(BaseTool):
     """
     args_schema: type[BaseModel] = CheckPropertiesStatusInput
 
-    def _run(self, status: str) -> List[Dict]:
+    def _flow(self, status: str) -> Generator[HttpRequest, httpx.Response, Dict]:
         print(f"\n[DEBUG] CheckPropertiesStatusTool called with status: {status}")
         
         try:
@@ -379,19 +587,11 @@ class CheckPropertiesStatusTool(BaseTool):
             }
             
             # Print API call information
-            print(f"[DEBUG] URL: http://localhost:8080/api/posts")
+            print(f"[DEBUG] URL: {RENTAL_SERVICE_URL}/posts")
             print(f"[DEBUG] Params: {params}")
             
-            # Use a session with the debugging adapter
-            session = requests.Session()
-            session.mount('http://', DebuggingAdapter())
-            session.mount('https://', DebuggingAdapter())
-            
-            # Make API call using the session
-            response = session.get(
-                "http://localhost:8080/api/posts",
-                params=params
-            )
+            # Make API call using the pooled client
+            response = yield rental_posts_request(params)
             
             if response.status_code != 200:
                 print(f"[DEBUG] API call failed with status code {response.status_code}: {response.text}")
@@ -429,7 +629,7 @@ class CheckPropertiesStatusTool(BaseTool):
                 "properties": []
             }
 
-class CheckPropertiesPriceRangeTool(BaseTool):
+class CheckPropertiesPriceRangeTool(HttpApiTool):
     name: Annotated[str, Field(description="Tool name")] = "check_properties_price_range"
     description: Annotated[str, Field(description="Tool description")] = """
     Search for properties within a specified price range.
@@ -453,7 +653,7 @@ class CheckPropertiesPriceRangeTool(BaseTool):
     """
     args_schema: type[BaseModel] = CheckPropertiesPriceRangeInput
 
-    def _run(self, min_price: float, max_price: float) -> Dict:
+    def _flow(self, min_price: float, max_price: float) -> Generator[HttpRequest, httpx.Response, Dict]:
         """
         Search for properties within price range
         
@@ -477,19 +677,11 @@ class CheckPropertiesPriceRangeTool(BaseTool):
             }
             
             # Print API call information
-            print(f"[DEBUG] URL: http://localhost:8080/api/posts")
+            print(f"[DEBUG] URL: {RENTAL_SERVICE_URL}/posts")
             print(f"[DEBUG] Params: {params}")
             
-            # Use a session with the debugging adapter
-            session = requests.Session()
-            session.mount('http://', DebuggingAdapter())
-            session.mount('https://', DebuggingAdapter())
-            
-            # Make API call using the session
-            response = session.get(
-                "http://localhost:8080/api/posts",
-                params=params
-            )
+            # Make API call using the pooled client
+            response = yield rental_posts_request(params)
             
             if response.status_code != 200:
                 print(f"[DEBUG] API call failed with status code {response.status_code}: {response.text}")
@@ -537,6 +729,12 @@ class LocationBaseMixin:
     """
     Mixin class for shared location-based functionality
     """
+    TRAVEL_SPEEDS: ClassVar[Dict[str, float]] = {
+        "walking": 5.0,      # Đi bộ
+        "motorbike": 25.0,   # Xe máy (có tính đến tắc đường)
+        "car": 20.0          # Ô tô (có tính đến tắc đường)
+    }
+
     def haversine_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
         """
         Tính khoảng cách giữa hai điểm trên bản đồ sử dụng công thức Haversine
@@ -572,14 +770,8 @@ class LocationBaseMixin:
         Returns:
             dict: Thời gian di chuyển theo từng phương tiện
         """
-        speeds = {
-            "walking": 5.0,      # Đi bộ
-            "motorbike": 25.0,   # Xe máy (có tính đến tắc đường)
-            "car": 20.0         # Ô tô (có tính đến tắc đường)
-        }
-        
         travel_times = {}
-        for mode, speed in speeds.items():
+        for mode, speed in self.TRAVEL_SPEEDS.items():
             time_hours = distance_km / speed
             time_minutes = int(time_hours * 60)
             travel_times[mode] = time_minutes
@@ -659,74 +851,54 @@ class LocationBaseMixin:
         Returns:
             List[Dict]: All properties with distance info, sorted by distance
         """
+        lats, lons, status = coordinates_from_records(properties)
+        batch = compute_distances(ref_lat, ref_lon, lats, lons)
+        travel = batch.travel_minutes(self.TRAVEL_SPEEDS, rounding="floor")
+
+        # batch.order already puts valid distances first, nearest first
         all_properties = []
-        
-        for prop in properties:
-            try:
-                if not prop.get("latitude") or not prop.get("longitude"):
-                    # For properties without coordinates, mark as unknown distance
-                    property_with_distance = {
-                        **prop,
-                        "distance_km": None,
-                        "distance_desc": "Distance unknown - No coordinates",
-                        "travel_times": None,
-                        "coordinates": None
-                    }
-                    all_properties.append(property_with_distance)
-                    continue
-                    
-                lat = float(prop["latitude"])
-                lon = float(prop["longitude"])
-                
-                if not self.validate_coordinates(lat, lon):
-                    property_with_distance = {
-                        **prop,
-                        "distance_km": None,
-                        "distance_desc": "Distance unknown - Invalid coordinates",
-                        "travel_times": None,
-                        "coordinates": {
-                            "latitude": lat,
-                            "longitude": lon
-                        }
+        for i in batch.order.tolist():
+            prop = properties[i]
+            if status[i] == COORD_MISSING:
+                # For properties without coordinates, mark as unknown distance
+                extra = {
+                    "distance_km": None,
+                    "distance_desc": "Distance unknown - No coordinates",
+                    "travel_times": None,
+                    "coordinates": None
+                }
+            elif status[i] == COORD_UNPARSEABLE:
+                extra = {
+                    "distance_km": None,
+                    "distance_desc": f"Distance calculation error: could not parse "
+                                     f"({prop.get('latitude')!r}, {prop.get('longitude')!r})",
+                    "travel_times": None,
+                    "coordinates": None
+                }
+            elif not batch.valid[i]:
+                extra = {
+                    "distance_km": None,
+                    "distance_desc": "Distance unknown - Invalid coordinates",
+                    "travel_times": None,
+                    "coordinates": {
+                        "latitude": float(lats[i]),
+                        "longitude": float(lons[i])
                     }
-                    all_properties.append(property_with_distance)
-                    continue
-                
-                lat, lon = self.fix_coordinates(lat, lon)
-                
-                # Calculate distance for all properties
-                distance = self.haversine_distance(ref_lat, ref_lon, lat, lon)
-                travel_times = self.calculate_travel_times(distance)
-                
-                property_with_distance = {
-                    **prop,
+                }
+            else:
+                distance = float(batch.distances_km[i])
+                extra = {
                     "distance_km": distance,
                     "distance_desc": f"{distance:.2f}km",
-                    "travel_times": travel_times,
+                    "travel_times": {mode: int(minutes[i]) for mode, minutes in travel.items()},
                     "coordinates": {
-                        "latitude": lat,
-                        "longitude": lon
+                        "latitude": float(batch.lats[i]),
+                        "longitude": float(batch.lons[i])
                     }
                 }
-                
-                all_properties.append(property_with_distance)
-                    
-            except (ValueError, TypeError) as e:
-                # For any other errors, include property with error note
-                property_with_distance = {
-                    **prop,
-                    "distance_km": None,
-                    "distance_desc": f"Distance calculation error: {str(e)}",
-                    "travel_times": None,
-                    "coordinates": None
-                }
-                all_properties.append(property_with_distance)
-        
-        # Sort properties: those with valid distances first, sorted by distance
-        return sorted(
-            all_properties,
-            key=lambda x: (x["distance_km"] is None, x["distance_km"] if x["distance_km"] is not None else float('inf'))
-        )
+            all_properties.append({**prop, **extra})
+
+        return all_properties
 
 class LocationCheckingInput(BaseModel):
     landmark_type: str = Field(
@@ -753,19 +925,7 @@ class SearchPostsInput(BaseModel):
     radius: Optional[int] = Field(default=None, description="Radius for location search in kilometers")
     bounds: Optional[str] = Field(default=None, description="Boundary coordinates for area search [minLat, minLng, maxLat, maxLng]")
 
-# Custom HTTP adapter to capture request details
-class DebuggingAdapter(HTTPAdapter):
-    def add_headers(self, request, **kwargs):
-        super().add_headers(request, **kwargs)
-        print(f"\n[DEBUG] ============ FULL REQUEST DETAILS ============")
-        print(f"[DEBUG] Request method: {request.method}")
-        print(f"[DEBUG] Request URL: {request.url}")
-        print(f"[DEBUG] Request headers: {json.dumps(dict(request.headers), indent=2)}")
-        print(f"[DEBUG] Request body: {request.body}")
-        print(f"[DEBUG] ===============================================")
-        return request
-
-class SearchPostsTool(BaseTool):
+class SearchPostsTool(HttpApiTool):
     name: Annotated[str, Field(description="Tool name")] = "search_posts"
     description: Annotated[str, Field(description="Tool description")] = """
     Search for rental properties with various filters.
@@ -789,6 +949,8 @@ class SearchPostsTool(BaseTool):
     Note: Prices are in millions VND (3 = 3,000,000 VND)
     """
     args_schema: type[BaseModel] = SearchPostsInput
+    # In-process spatial index answering radius/bounds searches without the rental API
+    listing_index: Any = Field(default=listing_index, exclude=True)
     
     def _normalize_district(self, district: str) -> str:
         """
@@ -796,28 +958,7 @@ class SearchPostsTool(BaseTool):
         - Nếu là "Quận X" hoặc "District X" -> trả về "X" 
         - Giữ nguyên các tên quận/huyện khác như "Bình Thạnh", "Thủ Đức"
         """
-        if district is None:
-            return None
-            
-        import re
-        
-        # Chuẩn hóa district input
-        district = district.strip()
-        
-        # Mẫu regex bắt "Quận X" hoặc "District X" (với X là số)
-        quan_pattern = re.compile(r'^(?:quận|quan|district|q)\s*(\d+)$', re.IGNORECASE)
-        match = quan_pattern.match(district)
-        
-        if match:
-            # Nếu match "Quận X" -> trả về X (số)
-            return match.group(1)
-        
-        # Kiểm tra nếu district chỉ là số
-        if district.isdigit():
-            return district
-            
-        # Giữ nguyên các quận/huyện khác
-        return district
+        return normalize_district(district)
 
     def _format_property_type(self, property_type: str) -> Optional[str]:
         """
@@ -902,15 +1043,65 @@ class SearchPostsTool(BaseTool):
         }
         
         return mapping.get(transaction_type, transaction_type)
+
+    def _summarize(self, properties: List[Dict]) -> str:
+        """Generate a summary for the AI to use"""
+        property_types = set(p.get("propertyType", "") for p in properties if p.get("propertyType"))
+        price_range = f"{min(p.get('price', float('inf')) for p in properties if p.get('price'))} - {max(p.get('price', 0) for p in properties if p.get('price'))} triệu VND" if any(p.get("price") for p in properties) else "N/A"
+        districts = set(p.get("district", "") for p in properties if p.get("district"))
+        
+        return f"""Tìm thấy {len(properties)} bất động sản phù hợp với tiêu chí.
+                Loại bất động sản: {', '.join(property_types) or 'Đa dạng'}
+                Khoảng giá: {price_range}
+                Khu vực: {', '.join(districts) or 'Đa dạng'}
+                """
+
+    def _search_local_index(self, page: int, limit: int, filters: Dict,
+                            center_lat: Optional[float], center_lng: Optional[float],
+                            radius: Optional[int], bounds: Optional[str]) -> Optional[Dict]:
+        """
+        Answer a radius or bounds search from the listing index
+
+        Returns:
+            Optional[Dict]: Search results, or None if the index can't answer this query
+        """
+        if self.listing_index is None or not self.listing_index.is_ready:
+            return None
+
+        if bounds is not None:
+            box = parse_bounds(bounds)
+            if box is None:
+                return None
+            properties, total = self.listing_index.within_bounds(*box, page=page, limit=limit, **filters)
+        elif center_lat is not None and center_lng is not None and radius is not None:
+            properties, total = self.listing_index.nearby(
+                float(center_lat), float(center_lng), float(radius), page=page, limit=limit, **filters
+            )
+        else:
+            return None
+
+        print(f"[DEBUG] SearchPostsTool answered from the listing index: {total} matches")
+        return {
+            "success": True,
+            "summary": self._summarize(properties),
+            "properties": properties,
+            "pagination": {
+                "current_page": page,
+                "limit": limit,
+                "total_records": total,
+                "total_pages": max(math.ceil(total / limit), 1)
+            },
+            "total_found": len(properties)
+        }
     
-    def _run(self, page: int = 1, limit: int = 10, 
-             min_price: Optional[float] = None, max_price: Optional[float] = None, 
-             min_area: Optional[float] = None, max_area: Optional[float] = None,
-             property_type: Optional[str] = None, transaction_type: Optional[str] = None,
-             province: Optional[str] = None, district: Optional[str] = None, ward: Optional[str] = None,
-             min_bedrooms: Optional[int] = None, min_bathrooms: Optional[int] = None,
-             center_lat: Optional[float] = None, center_lng: Optional[float] = None,
-             radius: Optional[int] = None, bounds: Optional[str] = None) -> Dict:
+    def _flow(self, page: int = 1, limit: int = 10, 
+              min_price: Optional[float] = None, max_price: Optional[float] = None, 
+              min_area: Optional[float] = None, max_area: Optional[float] = None,
+              property_type: Optional[str] = None, transaction_type: Optional[str] = None,
+              province: Optional[str] = None, district: Optional[str] = None, ward: Optional[str] = None,
+              min_bedrooms: Optional[int] = None, min_bathrooms: Optional[int] = None,
+              center_lat: Optional[float] = None, center_lng: Optional[float] = None,
+              radius: Optional[int] = None, bounds: Optional[str] = None) -> Generator[HttpRequest, httpx.Response, Dict]:
         """
         Search for rental properties with various filters
         
@@ -992,26 +1183,32 @@ class SearchPostsTool(BaseTool):
             if bounds is not None:
                 params["bounds"] = bounds
             
+            # Spatial searches without text location filters can be answered locally
+            if province is None and district is None and ward is None:
+                local_result = self._search_local_index(
+                    params["page"], params["limit"],
+                    {
+                        "property_type": property_type,
+                        "transaction_type": transaction_type,
+                        "min_price": min_price,
+                        "max_price": max_price,
+                        "min_area": min_area,
+                        "max_area": max_area,
+                        "min_bedrooms": min_bedrooms,
+                        "min_bathrooms": min_bathrooms
+                    },
+                    center_lat, center_lng, radius, bounds
+                )
+                if local_result is not None:
+                    return local_result
+            
             # Print API call information
             print(f"\n[DEBUG] SearchPostsTool making API call:")
-            print(f"[DEBUG] URL: http://localhost:8080/api/posts")
+            print(f"[DEBUG] URL: {RENTAL_SERVICE_URL}/posts")
             print(f"[DEBUG] Params: {params}")
-            
-            # Build full URL for display
-            param_strings = [f"{key}={value}" for key, value in params.items()]
-            full_url = f"http://localhost:8080/api/posts?{'&'.join(param_strings)}"
-            print(f"[DEBUG] Full URL: {full_url}")
-            
-            # Use a session with the debugging adapter to capture and print request details
-            session = requests.Session()
-            session.mount('http://', DebuggingAdapter())
-            session.mount('https://', DebuggingAdapter())
                 
-            # Make API call using the session
-            response = session.get(
-                "http://localhost:8080/api/posts",
-                params=params
-            )
+            # Make API call using the pooled client
+            response = yield rental_posts_request(params)
             
             # Print response details
             print(f"\n[DEBUG] ============ RESPONSE DETAILS ============")
@@ -1044,16 +1241,7 @@ class SearchPostsTool(BaseTool):
                 properties = response_data["data"]["data"]
                 pagination = response_data["data"].get("pagination", {})
                 
-                # Generate a summary for the AI to use
-                property_types = set(p.get("propertyType", "") for p in properties if p.get("propertyType"))
-                price_range = f"{min(p.get('price', float('inf')) for p in properties if p.get('price'))} - {max(p.get('price', 0) for p in properties if p.get('price'))} triệu VND" if properties else "N/A"
-                districts = set(p.get("district", "") for p in properties if p.get("district"))
-                
-                summary = f"""Tìm thấy {len(properties)} bất động sản phù hợp với tiêu chí.
-                Loại bất động sản: {', '.join(property_types) or 'Đa dạng'}
-                Khoảng giá: {price_range}
-                Khu vực: {', '.join(districts) or 'Đa dạng'}
-                """
+                summary = self._summarize(properties)
                 
                 return {
                     "success": True,
@@ -1074,19 +1262,6 @@ class SearchPostsTool(BaseTool):
                 "success": False,
                 "error": f"Error searching posts: {str(e)}"
             }
-            
-    async def _arun(self, page: int = 1, limit: int = 10, 
-                   min_price: Optional[float] = None, max_price: Optional[float] = None, 
-                   min_area: Optional[float] = None, max_area: Optional[float] = None,
-                   property_type: Optional[str] = None, transaction_type: Optional[str] = None,
-                   province: Optional[str] = None, district: Optional[str] = None, ward: Optional[str] = None,
-                   min_bedrooms: Optional[int] = None, min_bathrooms: Optional[int] = None,
-                   center_lat: Optional[float] = None, center_lng: Optional[float] = None,
-                   radius: Optional[int] = None, bounds: Optional[str] = None) -> Dict:
-        """Async implementation of _run"""
-        return self._run(page, limit, min_price, max_price, min_area, max_area,
-                       property_type, transaction_type, province, district, ward,
-                       min_bedrooms, min_bathrooms, center_lat, center_lng, radius, bounds)
 
 def get_properties_with_filters(query_params: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
@@ -1103,11 +1278,9 @@ def get_properties_with_filters(query_params: Dict[str, Any]) -> List[Dict[str,
         print(f"Filter parameters: {json.dumps(query_params, indent=2)}")
         print("========================================\n")
         
-        # Convert query parameters to URL query string
-        query_string = "?" + "&".join([f"{k}={v}" for k, v in query_params.items() if v is not None])
-        
         # Make request to rental service
-        response = requests.get(f"{RENTAL_SERVICE_URL}/posts{query_string}")
+        params = {k: v for k, v in query_params.items() if v is not None}
+        response = rental_api_cache.send(rental_posts_request(params))
         response.raise_for_status()
         
         # Parse response
@@ -1122,8 +1295,6 @@ def get_properties_with_filters(query_params: Dict[str, Any]) -> List[Dict[str,
         print(f"Error getting properties with filters: {str(e)}")
         return []
 
-RENTAL_SERVICE_URL = "http://localhost:8080/api"
-
 class FilteredPropertySearchInput(BaseModel):
     max_price_constraint: Optional[float] = Field(default=None, description="Maximum price constraint in millions VND")
     min_bedrooms: Optional[int] = Field(default=None, description="Minimum number of bedrooms required")
@@ -1132,10 +1303,7 @@ class FilteredPropertySearchInput(BaseModel):
     max_area: Optional[float] = Field(default=None, description="Maximum area in square meters")
     page: Optional[int] = Field(default=1, description="Page number for pagination")
 
-# Global context for sharing data between tools and AI service
-GLOBAL_CONTEXT = {}
-
-class FilteredPropertySearchTool(BaseTool):
+class FilteredPropertySearchTool(HttpApiTool):
     name: Annotated[str, Field(description="Tool name")] = "filtered_property_search"
     description: Annotated[str, Field(description="Tool description")] = """
     Search for properties based on the user's current filter selection plus additional constraints.
@@ -1172,13 +1340,13 @@ class FilteredPropertySearchTool(BaseTool):
             "address": prop.get('displayedAddress', 'Not specified'),
         }
     
-    def _run(self, 
-             max_price_constraint: Optional[float] = None,
-             min_bedrooms: Optional[int] = None, 
-             min_bathrooms: Optional[int] = None,
-             min_area: Optional[float] = None,
-             max_area: Optional[float] = None,
-             page: int = 1) -> Dict:
+    def _flow(self, 
+              max_price_constraint: Optional[float] = None,
+              min_bedrooms: Optional[int] = None, 
+              min_bathrooms: Optional[int] = None,
+              min_area: Optional[float] = None,
+              max_area: Optional[float] = None,
+              page: int = 1) -> Generator[HttpRequest, httpx.Response, Dict]:
         """
         Search for properties using the current filter parameters plus additional constraints
         
@@ -1202,11 +1370,10 @@ class FilteredPropertySearchTool(BaseTool):
         print(f"[DEBUG] page: {page}")
         
         try:
-            # Get the current filter parameters from the global context
-            current_filters = {}
+            # Get the current filter parameters of this request
+            current_filters = get_query_params()
             
-            if GLOBAL_CONTEXT and "query_params" in GLOBAL_CONTEXT:
-                current_filters = GLOBAL_CONTEXT["query_params"]
+            if current_filters:
                 print(f"[DEBUG] Current filters from frontend: {json.dumps(current_filters, indent=2)}")
             else:
                 print("[DEBUG] No current filters found from frontend")
@@ -1254,10 +1421,7 @@ class FilteredPropertySearchTool(BaseTool):
             print(f"[DEBUG] Final combined filters: {json.dumps(combined_filters, indent=2)}")
             
             # Make the API request with the combined filters
-            response = requests.get(
-                f"{RENTAL_SERVICE_URL}/posts", 
-                params=combined_filters
-            )
+            response = yield rental_posts_request(combined_filters)
             
             if response.status_code != 200:
                 print(f"[DEBUG] API call failed with status code {response.status_code}: {response.text}")
@@ -1345,7 +1509,7 @@ class NearbyLocationSearchInput(BaseModel):
     page: Optional[int] = Field(default=1, description="Page number for pagination")
     property_type: Optional[str] = Field(default=None, description="Type of property (room, apartment, house, etc.)")
 
-class NearbyLocationSearchTool(BaseTool):
+class NearbyLocationSearchTool(HttpApiTool):
     name: Annotated[str, Field(description="Tool name")] = "nearby_location_search"
     description: Annotated[str, Field(description="Tool description")] = """
     Search for properties near a specific location by name.
@@ -1370,6 +1534,13 @@ class NearbyLocationSearchTool(BaseTool):
     - property_type: Type of property filter (optional)
     """
     args_schema: type[BaseModel] = NearbyLocationSearchInput
+    # Geocoder and cache are injectable so tests can run offline with StubGeocoder
+    geocoder: Any = Field(default=default_geocoder, exclude=True)
+    geocode_cache: Any = Field(default=geocode_cache, exclude=True)
+    gazetteer: Any = Field(default=hcmc_gazetteer, exclude=True)
+    listing_index: Any = Field(default=listing_index, exclude=True)
+    # Geocoding plus the radius search: two round trips in the worst case
+    timeout: ClassVar[float] = float(os.getenv("NEARBY_TOOL_TIMEOUT", str(TOOL_TIMEOUT * 1.5)))
     
     def format_property(self, prop: Dict) -> Dict:
         """Format a single property for display"""
@@ -1383,19 +1554,19 @@ class NearbyLocationSearchTool(BaseTool):
             "bathrooms": prop.get('bathrooms', 'Not specified'),
             "contact_name": prop.get('contactName', 'Not specified'),
             "contact_phone": prop.get('contactPhone', 'Not specified'),
-            "image": prop.get('images', [{'url': 'No image available'}])[0],  # Only include the first image to save tokens
+            "image": (prop.get('images') or [{'url': 'No image available'}])[0],  # Only include the first image to save tokens
             "address": prop.get('displayedAddress', 'Not specified'),
         }
     
-    def _run(self, 
-             location_name: str,
-             radius: int = 2,
-             max_price: Optional[float] = None,
-             min_price: Optional[float] = None,
-             min_area: Optional[float] = None,
-             max_area: Optional[float] = None,
-             page: int = 1,
-             property_type: Optional[str] = None) -> Dict:
+    def _flow(self, 
+              location_name: str,
+              radius: int = 2,
+              max_price: Optional[float] = None,
+              min_price: Optional[float] = None,
+              min_area: Optional[float] = None,
+              max_area: Optional[float] = None,
+              page: int = 1,
+              property_type: Optional[str] = None) -> Generator[HttpRequest, httpx.Response, Dict]:
         """
         Search for properties near a specific location
         
@@ -1412,83 +1583,66 @@ class NearbyLocationSearchTool(BaseTool):
         Returns:
             Dict: Search results with properties near the specified location
         """
-        # Goong API key - should be set in an environment variable
-        goong_api_key = os.getenv("GOONG_API_KEY", "JHIeym2SpVnWISoW6ZfalFvRibdkYfpzRRCwQ1nG")
-        
         print(f"\n[DEBUG] NearbyLocationSearchTool called with location: {location_name}")
         print(f"[DEBUG] Search radius: {radius} km")
         print(f"[DEBUG] Price constraints: max_price={max_price}, min_price={min_price}")
         print(f"[DEBUG] Other parameters: page={page}, property_type={property_type}")
         
         try:
-            # Step 1: Call Goong Autocomplete API to get place_id
-            encoded_location = quote(location_name)
-            autocomplete_url = f"https://rsapi.goong.io/Place/AutoComplete?input={encoded_location}&api_key={goong_api_key}"
-            
-            print(f"[DEBUG] Calling Goong Autocomplete API: {autocomplete_url}")
-            
-            autocomplete_response = requests.get(autocomplete_url)
-            if autocomplete_response.status_code != 200:
-                print(f"[DEBUG] Autocomplete API call failed: {autocomplete_response.status_code}")
-                return {
-                    "success": False,
-                    "error": f"Autocomplete API call failed: {autocomplete_response.status_code}",
-                    "properties": []
-                }
-            
-            autocomplete_data = autocomplete_response.json()
-            if not autocomplete_data.get("predictions"):
-                print(f"[DEBUG] No locations found for '{location_name}'")
-                return {
-                    "success": False,
-                    "error": f"No locations found for '{location_name}'",
-                    "properties": []
-                }
-            
-            # Get the first prediction's place_id
-            place_id = autocomplete_data["predictions"][0].get("place_id")
-            matched_location = autocomplete_data["predictions"][0].get("description", location_name)
-            print(f"[DEBUG] Found place_id: {place_id}")
-            print(f"[DEBUG] Matched location: {matched_location}")
-            
-            # Step 2: Call Goong Geocode API to get coordinates
-            geocode_url = f"https://rsapi.goong.io/geocode?place_id={place_id}&api_key={goong_api_key}"
-            
-            print(f"[DEBUG] Calling Goong Geocode API")
-            
-            geocode_response = requests.get(geocode_url)
-            if geocode_response.status_code != 200:
-                print(f"[DEBUG] Geocode API call failed: {geocode_response.status_code}")
+            # Step 1-2: Resolve the location to coordinates: bundled gazetteer
+            # first, then the geocode cache, then Goong
+            try:
+                local_match = self.gazetteer.resolve(location_name) if self.gazetteer is not None else None
+                if local_match is not None:
+                    print(f"[DEBUG] Resolved '{location_name}' locally: {local_match.landmark.name} (score {local_match.score})")
+                    geocoded = GeocodeResult(None, local_match.landmark.name, local_match.landmark.lat, local_match.landmark.lon)
+                else:
+                    geocoded = yield from cached_geocode_flow(self.geocoder, self.geocode_cache, location_name)
+            except GeocodingError as e:
+                print(f"[DEBUG] {str(e)}")
                 return {
                     "success": False,
-                    "error": f"Geocode API call failed: {geocode_response.status_code}",
+                    "error": str(e),
                     "properties": []
                 }
             
-            geocode_data = geocode_response.json()
-            if not geocode_data.get("results"):
-                print(f"[DEBUG] No geocode results found")
-                return {
-                    "success": False,
-                    "error": "No geocode results found",
-                    "properties": []
-                }
+            matched_location = geocoded.description
+            lat = geocoded.lat
+            lng = geocoded.lng
             
-            # Extract lat and lng from the first result
-            location = geocode_data["results"][0].get("geometry", {}).get("location", {})
-            lat = location.get("lat")
-            lng = location.get("lng")
+            print(f"[DEBUG] Location coordinates: lat={lat}, lng={lng}")
             
-            if not lat or not lng:
-                print(f"[DEBUG] No coordinates found in geocode response")
+            # Answer from the in-process listing index when it is loaded
+            if self.listing_index is not None and self.listing_index.is_ready:
+                properties, total_records = self.listing_index.nearby(
+                    lat, lng, radius, page=page, limit=10,
+                    min_price=min_price, max_price=max_price,
+                    min_area=min_area, max_area=max_area,
+                    property_type=property_type
+                )
+                total_pages = max(math.ceil(total_records / 10), 1)
+                print(f"[DEBUG] Found {total_records} properties near {matched_location} in the listing index")
+                
+                formatted_properties = []
+                for prop in properties:
+                    formatted = self.format_property(prop)
+                    formatted["distance_km"] = prop["distance_km"]
+                    formatted_properties.append(formatted)
+                
                 return {
-                    "success": False,
-                    "error": "No coordinates found in geocode response",
-                    "properties": []
+                    "success": True,
+                    "location_name": matched_location,
+                    "coordinates": {"lat": lat, "lng": lng},
+                    "search_radius_km": radius,
+                    "properties": formatted_properties,
+                    "total_found": total_records,
+                    "pagination": {
+                        "current_page": page,
+                        "total_pages": total_pages,
+                        "has_more": page < total_pages
+                    }
                 }
             
-            print(f"[DEBUG] Location coordinates: lat={lat}, lng={lng}")
-            
             # Step 3: Search for properties near these coordinates
             # Build query parameters
             params = {
@@ -1519,7 +1673,7 @@ class NearbyLocationSearchTool(BaseTool):
             print(f"[DEBUG] Searching for properties with params: {params}")
             
             # Make the API call to the rental service
-            response = requests.get(f"{RENTAL_SERVICE_URL}/posts", params=params)
+            response = yield rental_posts_request(params)
             
             if response.status_code != 200:
                 print(f"[DEBUG] API call failed with status code {response.status_code}: {response.text}")
@@ -1543,33 +1697,18 @@ class NearbyLocationSearchTool(BaseTool):
                 
                 formatted_properties = [self.format_property(prop) for prop in properties]
                 
-                for i, prop in enumerate(formatted_properties):
-                    if "coordinates" in properties[i]:
-                        prop_lat = properties[i]["coordinates"].get("latitude")
-                        prop_lng = properties[i]["coordinates"].get("longitude")
-                        if prop_lat and prop_lng:
-                            from math import radians, cos, sin, asin, sqrt
-                            
-                            def haversine(lat1, lon1, lat2, lon2):
-                                # Convert decimal degrees to radians
-                                lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-                                
-                                # Haversine formula
-                                dlon = lon2 - lon1
-                                dlat = lat2 - lat1
-                                a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-                                c = 2 * asin(sqrt(a))
-                                r = 6371  
-                                return round(c * r, 2)
-                            
-                            distance = haversine(lat, lng, prop_lat, prop_lng)
-                            prop["distance_km"] = distance
-                
-                # Sort properties by distance if distance is available
-                formatted_properties = sorted(
-                    formatted_properties,
-                    key=lambda x: x.get("distance_km", float('inf'))
+                # Distances for the whole page in one vectorized pass, measured
+                # as before: mean earth radius, coordinates taken as given
+                prop_lats, prop_lngs, _ = coordinates_from_records(
+                    [prop.get("coordinates") or {} for prop in properties]
                 )
+                batch = compute_distances(lat, lng, prop_lats, prop_lngs,
+                                          earth_radius_km=MEAN_EARTH_RADIUS_KM, hcmc_only=False)
+                for i in np.flatnonzero(batch.valid).tolist():
+                    formatted_properties[i]["distance_km"] = float(batch.distances_km[i])
+
+                # Sort properties by distance, those without one last
+                formatted_properties = [formatted_properties[i] for i in batch.order.tolist()]
                 
                 return {
                     "success": True,
@@ -0,0 +1,283 @@
+import json
+import os
+import re
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .location_utils import Landmark, LocationUtils
+from .text_utils import normalize_text
+
+GAZETTEER_PATH = os.getenv(
+    "GAZETTEER_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "hcmc_gazetteer.json")
+)
+# Minimum score for an exact/prefix match to be trusted instead of calling the
+# geocoder (fuzzy-only matches always go to the geocoder)
+GAZETTEER_MATCH_THRESHOLD = float(os.getenv("GAZETTEER_MATCH_THRESHOLD", "0.8"))
+
+# Abbreviations expanded in both names and queries: "ĐH" -> "đại học", "Q1" -> "quận 1"
+_ABBREVIATIONS = {
+    "dh": "dai hoc",
+    "truong": "",
+    "bv": "benh vien",
+    "bx": "ben xe",
+    "cv": "cong vien",
+    "svd": "san van dong",
+    "kcx": "khu che xuat",
+    "kdt": "khu do thi",
+    "tttm": "trung tam thuong mai",
+    "tp": "thanh pho",
+    "district": "quan",
+    "university": "dai hoc",
+    "hospital": "benh vien",
+    "station": "ga",
+    "airport": "san bay",
+}
+_DISTRICT_TOKEN = re.compile(r"^q(\d{1,2})$")
+# Leading words that only say "near ..." and carry no place information
+_LEADING_NOISE = ("gan", "near", "quanh", "around", "khu vuc")
+# Phrases naming a kind of place rather than a place ("bệnh viện", "đại học"):
+# a query made only of these is too vague to resolve locally
+_GENERIC_PHRASES = re.compile(
+    r"\b(?:dai hoc|benh vien|ben xe|cong vien|san van dong|san bay|ga|metro|cho|sieu thi|"
+    r"trung tam thuong mai|trung tam|khu che xuat|khu do thi|nha tho|quan|huyen|phuong|"
+    r"thanh pho|market|mall|center)\b"
+)
+
+
+def _is_specific_prefix(key: str, matched_key: str) -> bool:
+    """
+    Whether a query that is the start of a name is enough to identify the
+    place: it is more than generic words ("bệnh viện"), ends on a word
+    boundary, covers at least half of the name, and the rest of the name is
+    only generic words ("ben thanh" for "ben thanh market", but not "phu my"
+    for "phu my hung" or "vinhomes" for "vinhomes central park")
+    """
+    if not _GENERIC_PHRASES.sub("", key).strip() or not matched_key.startswith(key + " "):
+        return False
+    rest = matched_key[len(key) + 1:]
+    return 2 * len(key) >= len(matched_key) and not _GENERIC_PHRASES.sub("", rest).strip()
+
+
+def gazetteer_key(text: str) -> str:
+    """Normalize a place name or query to the key used by the index"""
+    tokens = []
+    for token in normalize_text(text).split():
+        match = _DISTRICT_TOKEN.match(token)
+        if match:
+            tokens.extend(["quan", match.group(1)])
+            continue
+        expanded = _ABBREVIATIONS.get(token, token)
+        if expanded:
+            tokens.append(expanded)
+    key = " ".join(tokens)
+    for noise in _LEADING_NOISE:
+        if key.startswith(noise + " "):
+            key = key[len(noise) + 1:]
+    return key
+
+
+def _trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass(frozen=True)
+class GazetteerMatch:
+    landmark: Landmark
+    category: str
+    score: float
+    matched_key: str
+    # "exact" (name or alias), "prefix" (start of one place's name only),
+    # "ambiguous_prefix" (start of several places' names) or "fuzzy"
+    kind: str = "fuzzy"
+
+
+class Gazetteer:
+    """
+    Offline place-name index for HCMC.
+
+    Places are stored column-wise (names / categories / addresses lists plus
+    float arrays for coordinates) and each place can be reached through
+    several keys (name and aliases). Keys are accent-folded and searchable by:
+    - exact match (dict probe)
+    - prefix match (bisect over the sorted key list)
+    - fuzzy match (character-trigram index, Dice coefficient, lowered for
+      query words the candidate doesn't contain)
+
+    Only exact matches and unique prefixes are trusted by resolve(); fuzzy
+    matches are for suggestions and ranking.
+    """
+
+    def __init__(self, places: Iterable[Tuple[str, str, float, float, str, List[str]]] = ()):
+        self.names: List[str] = []
+        self.categories: List[str] = []
+        self.addresses: List[str] = []
+        self.lats = array("d")
+        self.lons = array("d")
+
+        self._keys: List[str] = []
+        self._key_place = array("I")
+        self._exact: Dict[str, int] = {}
+        self._sorted_keys: List[str] = []
+        self._sorted_ids = array("I")
+        self._trigram_index: Dict[str, array] = {}
+        self._key_trigram_counts = array("H")
+
+        for place in places:
+            self.add(*place)
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, name: str, category: str, lat: float, lon: float, address: str = "",
+            aliases: Optional[List[str]] = None) -> None:
+        """Add a place; call _build() afterwards to refresh the search structures"""
+        place_id = len(self.names)
+        self.names.append(name)
+        self.categories.append(category)
+        self.addresses.append(address)
+        self.lats.append(float(lat))
+        self.lons.append(float(lon))
+
+        for alias in [name] + list(aliases or []):
+            key = gazetteer_key(alias)
+            if key and key not in self._exact:
+                self._exact[key] = len(self._keys)
+                self._keys.append(key)
+                self._key_place.append(place_id)
+
+    def _build(self) -> None:
+        order = sorted(range(len(self._keys)), key=self._keys.__getitem__)
+        self._sorted_keys = [self._keys[i] for i in order]
+        self._sorted_ids = array("I", order)
+
+        postings: Dict[str, List[int]] = {}
+        counts = array("H")
+        for key_id, key in enumerate(self._keys):
+            grams = _trigrams(key)
+            counts.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(key_id)
+        self._trigram_index = {gram: array("I", ids) for gram, ids in postings.items()}
+        self._key_trigram_counts = counts
+
+    def _match(self, key_id: int, score: float, kind: str = "fuzzy") -> GazetteerMatch:
+        place_id = self._key_place[key_id]
+        landmark = Landmark(
+            self.names[place_id],
+            self.lats[place_id],
+            self.lons[place_id],
+            self.addresses[place_id]
+        )
+        return GazetteerMatch(landmark, self.categories[place_id], round(score, 4), self._keys[key_id], kind)
+
+    def search(self, query: str, limit: int = 5, min_score: float = 0.5) -> List[GazetteerMatch]:
+        """
+        Find places matching a query, best first
+
+        Args:
+            query (str): Place name as typed by the user, with or without accents
+            limit (int): Maximum number of matches
+            min_score (float): Minimum score in [0, 1]
+
+        Returns:
+            List[GazetteerMatch]: Matches, at most one per place
+        """
+        key = gazetteer_key(query)
+        if not key:
+            return []
+
+        scores: Dict[int, float] = {}
+        kinds: Dict[int, str] = {}
+
+        exact_id = self._exact.get(key)
+        if exact_id is not None:
+            if limit == 1:
+                return [self._match(exact_id, 1.0, "exact")]
+            scores[exact_id] = 1.0
+            kinds[exact_id] = "exact"
+
+        # Prefix: the query is the beginning of a longer name. A prefix shared
+        # by several places ("vincom") is ambiguous and scored lower.
+        if len(key) >= 4:
+            pos = bisect_left(self._sorted_keys, key)
+            prefix_hits = []
+            while pos < len(self._sorted_keys) and self._sorted_keys[pos].startswith(key):
+                prefix_hits.append((self._sorted_ids[pos], len(self._sorted_keys[pos])))
+                pos += 1
+            unique = len({self._key_place[key_id] for key_id, _ in prefix_hits}) == 1
+            base = 0.8 if unique else 0.5
+            for key_id, candidate_length in prefix_hits:
+                score = base + 0.2 * len(key) / candidate_length
+                if score > scores.get(key_id, 0.0):
+                    scores[key_id] = score
+                    kinds[key_id] = "prefix" if unique else "ambiguous_prefix"
+
+        # Fuzzy: shared character trigrams. Query words missing from the
+        # candidate lower the score ("Bách Khoa Hà Nội" is not "Bách Khoa")
+        grams = _trigrams(key)
+        query_tokens = key.split()
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for key_id in self._trigram_index.get(gram, ()):
+                shared[key_id] = shared.get(key_id, 0) + 1
+        for key_id, count in shared.items():
+            score = 2.0 * count / (len(grams) + self._key_trigram_counts[key_id])
+            candidate_tokens = set(self._keys[key_id].split())
+            coverage = sum(token in candidate_tokens for token in query_tokens) / len(query_tokens)
+            score *= 0.5 + 0.5 * coverage
+            if score > scores.get(key_id, 0.0):
+                scores[key_id] = score
+                kinds[key_id] = "fuzzy"
+
+        best_per_place: Dict[int, Tuple[float, int]] = {}
+        for key_id, score in scores.items():
+            if score < min_score:
+                continue
+            place_id = self._key_place[key_id]
+            if place_id not in best_per_place or score > best_per_place[place_id][0]:
+                best_per_place[place_id] = (score, key_id)
+
+        ranked = sorted(best_per_place.values(), key=lambda item: -item[0])[:limit]
+        return [self._match(key_id, score, kinds[key_id]) for score, key_id in ranked]
+
+    def resolve(self, query: str, min_score: float = GAZETTEER_MATCH_THRESHOLD) -> Optional[GazetteerMatch]:
+        """
+        Return the best match if it is certain enough to skip the geocoder: an
+        exact name/alias match, or the start of exactly one place's name that
+        already says which place it is (see _is_specific_prefix)
+        """
+        matches = self.search(query, limit=1, min_score=min_score)
+        if not matches:
+            return None
+        match = matches[0]
+        if match.kind == "exact":
+            return match
+        if match.kind == "prefix" and _is_specific_prefix(gazetteer_key(query), match.matched_key):
+            return match
+        return None
+
+    @classmethod
+    def from_file(cls, path: str = GAZETTEER_PATH) -> "Gazetteer":
+        """Load the bundled gazetteer plus LocationUtils.LANDMARKS"""
+        places = []
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            places.extend(tuple(place) for place in data.get("places", []))
+        except (OSError, ValueError) as e:
+            print(f"[GAZETTEER] Could not load {path}: {str(e)}")
+
+        for landmark in LocationUtils.LANDMARKS.values():
+            places.append((landmark.name, "airport", landmark.lat, landmark.lon, landmark.address,
+                           ["Sân bay Tân Sơn Nhất", "Sân bay", "Tân Sơn Nhất", "TSN"]))
+
+        return cls(places)
+
+
+# Shared index, loaded once at import
+hcmc_gazetteer = Gazetteer.from_file()
@@ -0,0 +1,145 @@
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Mapping, Tuple
+
+import numpy as np
+
+# Earth radius at HCMC latitude (km), same value as the scalar helpers
+EARTH_RADIUS_KM = 6378.137 - 21.385 * math.sin(math.radians(10.8231))
+# Mean earth radius (km), used by the nearby search tool
+MEAN_EARTH_RADIUS_KM = 6371.0
+
+# HCMC bounds (slightly extended to include neighbouring areas)
+HCMC_LAT_RANGE = (10.3, 11.1)   # Cần Giờ - Củ Chi
+HCMC_LON_RANGE = (106.2, 107.1)  # Củ Chi - Cần Giờ
+
+# Coordinate parsing status per record
+COORD_OK = 0
+COORD_MISSING = 1
+COORD_UNPARSEABLE = 2
+
+
+def coordinates_from_records(records: Iterable[Mapping[str, Any]],
+                             lat_key: str = "latitude",
+                             lon_key: str = "longitude") -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pull coordinates out of property dicts into float arrays
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: (lats, lons, status) where
+            lats/lons are NaN when unusable and status holds COORD_* codes
+    """
+    lats, lons, status = [], [], []
+    for record in records:
+        lat, lon = record.get(lat_key), record.get(lon_key)
+        if not lat or not lon:
+            lats.append(np.nan)
+            lons.append(np.nan)
+            status.append(COORD_MISSING)
+            continue
+        try:
+            lats.append(float(lat))
+            lons.append(float(lon))
+            status.append(COORD_OK)
+        except (ValueError, TypeError):
+            lats.append(np.nan)
+            lons.append(np.nan)
+            status.append(COORD_UNPARSEABLE)
+    return (np.asarray(lats, dtype=np.float64),
+            np.asarray(lons, dtype=np.float64),
+            np.asarray(status, dtype=np.int8))
+
+
+def _in_hcmc(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    return ((lats >= HCMC_LAT_RANGE[0]) & (lats <= HCMC_LAT_RANGE[1]) &
+            (lons >= HCMC_LON_RANGE[0]) & (lons <= HCMC_LON_RANGE[1]))
+
+
+def fix_coordinates(lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Swap lat/lon pairs that were stored reversed (detected with the HCMC ranges)"""
+    swapped = _in_hcmc(lons, lats)
+    return np.where(swapped, lons, lats), np.where(swapped, lats, lons)
+
+
+def validate_coordinates(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Mask of coordinates inside HCMC, in original or swapped order"""
+    with np.errstate(invalid="ignore"):
+        in_range = (np.abs(lats) <= 90) & (np.abs(lons) <= 180)
+        return in_range & (_in_hcmc(lats, lons) | _in_hcmc(lons, lats))
+
+
+def haversine_km(ref_lat: float, ref_lon: float, lats: np.ndarray, lons: np.ndarray,
+                 earth_radius_km: float = EARTH_RADIUS_KM) -> np.ndarray:
+    """Great-circle distance (km) from one reference point to many points"""
+    ref_lat_r, ref_lon_r = math.radians(ref_lat), math.radians(ref_lon)
+    lats_r = np.radians(lats)
+    dlat = lats_r - ref_lat_r
+    dlon = np.radians(lons) - ref_lon_r
+    a = np.sin(dlat / 2) ** 2 + math.cos(ref_lat_r) * np.cos(lats_r) * np.sin(dlon / 2) ** 2
+    return 2 * earth_radius_km * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+@dataclass
+class DistanceBatch:
+    """Result of a batch distance computation, aligned with the input order"""
+    lats: np.ndarray          # fixed latitudes (NaN where unusable)
+    lons: np.ndarray          # fixed longitudes
+    valid: np.ndarray         # bool mask: coordinates usable (and inside HCMC unless hcmc_only=False)
+    distances_km: np.ndarray  # rounded to 2 decimals, NaN where not valid
+    order: np.ndarray         # indices sorted by distance, invalid entries last (stable)
+
+    def travel_minutes(self, speeds_kmh: Mapping[str, float], rounding: str = "floor") -> Dict[str, np.ndarray]:
+        """
+        Travel time per transport mode, in whole minutes (-1 where not valid)
+
+        Args:
+            speeds_kmh (Mapping[str, float]): Speed per mode, e.g. {"walking": 5.0}
+            rounding (str): "floor" (truncate) or "round"
+        """
+        distances = np.where(self.valid, self.distances_km, 0.0)
+        result = {}
+        for mode, speed in speeds_kmh.items():
+            minutes = distances / speed * 60
+            minutes = np.floor(minutes) if rounding == "floor" else np.round(minutes)
+            result[mode] = np.where(self.valid, minutes, -1).astype(np.int64)
+        return result
+
+    def within(self, radius_km: float) -> np.ndarray:
+        """Indices of valid points within radius, nearest first"""
+        with np.errstate(invalid="ignore"):
+            mask = self.valid & (self.distances_km <= radius_km)
+        return self.order[mask[self.order]]
+
+
+def compute_distances(ref_lat: float, ref_lon: float, lats: np.ndarray, lons: np.ndarray,
+                      earth_radius_km: float = EARTH_RADIUS_KM, hcmc_only: bool = True) -> DistanceBatch:
+    """
+    Fix, validate and measure a batch of coordinates in one pass
+
+    Args:
+        ref_lat, ref_lon: Reference point
+        lats, lons: Candidate coordinates (NaN for missing)
+        earth_radius_km: Radius used by the haversine
+        hcmc_only: Swap reversed pairs and drop points outside HCMC; with
+            False every parsed coordinate is measured as given
+
+    Returns:
+        DistanceBatch: Distances plus an argsort putting the nearest first
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+
+    if hcmc_only:
+        valid = validate_coordinates(lats, lons)
+        fixed_lats, fixed_lons = fix_coordinates(lats, lons)
+    else:
+        valid = np.isfinite(lats) & np.isfinite(lons)
+        fixed_lats, fixed_lons = lats, lons
+    with np.errstate(invalid="ignore"):
+        distances = np.round(haversine_km(ref_lat, ref_lon, fixed_lats, fixed_lons, earth_radius_km), 2)
+    distances = np.where(valid, distances, np.nan)
+
+    sort_key = np.where(valid, distances, np.inf)
+    order = np.argsort(sort_key, kind="stable")
+
+    return DistanceBatch(fixed_lats, fixed_lons, valid, distances, order)
@@ -0,0 +1,239 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Generator, Optional
+
+import httpx
+
+from .http_client import HttpRequest
+from .text_utils import normalize_text
+
+GOONG_API_URL = "https://rsapi.goong.io"
+
+# Cache settings
+GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", "2048"))
+GEOCODE_CACHE_TTL = int(os.getenv("GEOCODE_CACHE_TTL", str(30 * 24 * 3600)))  # seconds
+GEOCODE_CACHE_PATH = os.getenv(
+    "GEOCODE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", ".cache", "geocode_cache.sqlite3")
+)
+
+
+@dataclass(frozen=True)
+class GeocodeResult:
+    place_id: Optional[str]
+    description: str
+    lat: float
+    lng: float
+
+
+class GeocodingError(Exception):
+    """Raised when a location name can't be resolved to coordinates"""
+
+
+GeocodeFlow = Generator[HttpRequest, httpx.Response, GeocodeResult]
+
+
+class GoongGeocoder:
+    """
+    Resolve a location name with Goong: AutoComplete -> place_id, then
+    Geocode -> coordinates. Requests are yielded so the caller decides whether
+    they run on the sync or async HTTP client.
+    """
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("GOONG_API_KEY", "JHIeym2SpVnWISoW6ZfalFvRibdkYfpzRRCwQ1nG")
+
+    def flow(self, location_name: str) -> GeocodeFlow:
+        print(f"[DEBUG] Calling Goong Autocomplete API for: {location_name}")
+        autocomplete_response = yield HttpRequest(
+            url=f"{GOONG_API_URL}/Place/AutoComplete",
+            params={"input": location_name, "api_key": self.api_key}
+        )
+        if autocomplete_response.status_code != 200:
+            raise GeocodingError(f"Autocomplete API call failed: {autocomplete_response.status_code}")
+
+        predictions = autocomplete_response.json().get("predictions")
+        if not predictions:
+            raise GeocodingError(f"No locations found for '{location_name}'")
+
+        # Use the first prediction
+        place_id = predictions[0].get("place_id")
+        description = predictions[0].get("description", location_name)
+        print(f"[DEBUG] Found place_id: {place_id}")
+        print(f"[DEBUG] Matched location: {description}")
+
+        print(f"[DEBUG] Calling Goong Geocode API")
+        geocode_response = yield HttpRequest(
+            url=f"{GOONG_API_URL}/geocode",
+            params={"place_id": place_id, "api_key": self.api_key}
+        )
+        if geocode_response.status_code != 200:
+            raise GeocodingError(f"Geocode API call failed: {geocode_response.status_code}")
+
+        results = geocode_response.json().get("results")
+        if not results:
+            raise GeocodingError("No geocode results found")
+
+        location = results[0].get("geometry", {}).get("location", {})
+        lat = location.get("lat")
+        lng = location.get("lng")
+        if not lat or not lng:
+            raise GeocodingError("No coordinates found in geocode response")
+
+        return GeocodeResult(place_id, description, float(lat), float(lng))
+
+
+class StubGeocoder:
+    """
+    Offline geocoder answering from a fixed table, for tests and local runs
+
+    Usage:
+        geocoder = StubGeocoder({"bach khoa": GeocodeResult("p1", "ĐH Bách Khoa", 10.7725, 106.6579)})
+    """
+
+    def __init__(self, entries: Optional[Dict[str, GeocodeResult]] = None):
+        self.entries = {normalize_text(name): result for name, result in (entries or {}).items()}
+        self.calls = 0
+
+    def flow(self, location_name: str) -> GeocodeFlow:
+        self.calls += 1
+        result = self.entries.get(normalize_text(location_name))
+        if result is None:
+            raise GeocodingError(f"No locations found for '{location_name}'")
+        return result
+        yield  # makes this a generator that never issues a request
+
+
+class GeocodeCache:
+    """
+    Two-level cache for geocoding results keyed on the normalized location name.
+
+    - Level 1: in-memory LRU with TTL
+    - Level 2: SQLite file that survives restarts (skipped when path is None)
+    """
+
+    def __init__(self, path: Optional[str] = GEOCODE_CACHE_PATH,
+                 max_size: int = GEOCODE_CACHE_SIZE, ttl: int = GEOCODE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+
+        if path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute("""
+                    CREATE TABLE IF NOT EXISTS geocode_cache (
+                        location_key TEXT PRIMARY KEY,
+                        place_id TEXT,
+                        description TEXT NOT NULL,
+                        lat REAL NOT NULL,
+                        lng REAL NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                """)
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"[GEOCODE] Persistent cache disabled: {str(e)}")
+                self._db = None
+
+    @staticmethod
+    def make_key(location_name: str) -> str:
+        return normalize_text(location_name)
+
+    def get(self, location_name: str) -> Optional[GeocodeResult]:
+        key = self.make_key(location_name)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return result
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT place_id, description, lat, lng, expires_at FROM geocode_cache WHERE location_key = ?",
+                    (key,)
+                ).fetchone()
+                if row is not None and row[4] > now:
+                    result = GeocodeResult(row[0], row[1], row[2], row[3])
+                    self._remember(key, result, row[4])
+                    self.stats["disk_hits"] += 1
+                    return result
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, location_name: str, result: GeocodeResult) -> None:
+        key = self.make_key(location_name)
+        expires_at = time.time() + self.ttl
+
+        with self._lock:
+            self._remember(key, result, expires_at)
+            self.stats["writes"] += 1
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO geocode_cache VALUES (?, ?, ?, ?, ?, ?)",
+                        (key, result.place_id, result.description, result.lat, result.lng, expires_at)
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"[GEOCODE] Error writing persistent cache: {str(e)}")
+
+    def _remember(self, key: str, result: GeocodeResult, expires_at: float) -> None:
+        self._memory[key] = (expires_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM geocode_cache")
+                self._db.commit()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            lookups = hits + self.stats["misses"]
+            return {
+                **self.stats,
+                "memory_entries": len(self._memory),
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+            }
+
+
+def cached_geocode_flow(geocoder, cache: GeocodeCache, location_name: str) -> GeocodeFlow:
+    """
+    Resolve a location through the cache, calling the geocoder only on a miss
+
+    Raises:
+        GeocodingError: If the location can't be resolved
+    """
+    result = cache.get(location_name)
+    if result is not None:
+        print(f"[DEBUG] Geocode cache hit for '{location_name}'")
+        return result
+
+    result = yield from geocoder.flow(location_name)
+    cache.put(location_name, result)
+    return result
+
+
+# Shared cache and geocoder used by the location tools
+geocode_cache = GeocodeCache()
+default_geocoder = GoongGeocoder()
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Generator, Optional
+
+import httpx
+
+# Rental service (NestJS backend) base URL
+RENTAL_SERVICE_URL = os.getenv("RENTAL_SERVICE_URL", "http://localhost:8080/api")
+
+# Connection limits and timeouts shared by every outgoing HTTP call
+HTTP_TIMEOUT = httpx.Timeout(
+    float(os.getenv("HTTP_READ_TIMEOUT", "15")),
+    connect=float(os.getenv("HTTP_CONNECT_TIMEOUT", "3")),
+    pool=float(os.getenv("HTTP_POOL_TIMEOUT", "5")),
+)
+HTTP_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
+    keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30")),
+)
+
+
+@dataclass
+class HttpRequest:
+    """A request yielded by a tool flow, executed by the sync or async client"""
+    url: str
+    params: Optional[Dict[str, Any]] = None
+    method: str = "GET"
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+def rental_posts_request(params: Dict[str, Any]) -> HttpRequest:
+    """Build a GET /posts request against the rental service"""
+    return HttpRequest(url=f"{RENTAL_SERVICE_URL}/posts", params=params)
+
+
+def _log_request(request: httpx.Request) -> None:
+    print(f"[DEBUG] HTTP {request.method} {request.url}")
+
+
+async def _alog_request(request: httpx.Request) -> None:
+    _log_request(request)
+
+
+class HttpClientPool:
+    """
+    Process-wide pooled HTTP clients with keep-alive connections.
+
+    One httpx.Client serves sync callers (threads share its connection pool)
+    and one httpx.AsyncClient per event loop serves async callers, so
+    repeated calls to the same host reuse open TCP connections instead of
+    handshaking every time.
+    """
+
+    def __init__(self, timeout: httpx.Timeout = HTTP_TIMEOUT, limits: httpx.Limits = HTTP_LIMITS):
+        self._timeout = timeout
+        self._limits = limits
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(
+                        timeout=self._timeout,
+                        limits=self._limits,
+                        event_hooks={"request": [_log_request]},
+                    )
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        # Async connections are bound to the loop that opened them
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(
+                timeout=self._timeout,
+                limits=self._limits,
+                event_hooks={"request": [_alog_request]},
+            )
+            self._async_loop = loop
+        return self._async_client
+
+    def send(self, request: HttpRequest) -> httpx.Response:
+        return self.client.request(request.method, request.url, params=request.params, headers=request.headers)
+
+    async def asend(self, request: HttpRequest) -> httpx.Response:
+        return await self.async_client.request(request.method, request.url, params=request.params, headers=request.headers)
+
+    def run_flow(self, flow: Generator[HttpRequest, httpx.Response, Any],
+                 send: Optional[Callable[[HttpRequest], httpx.Response]] = None) -> Any:
+        """
+        Drive a request flow with the sync client
+
+        A flow is a generator that yields HttpRequest objects, receives the
+        matching httpx.Response (or has the transport error thrown into it)
+        and finally returns its result. `send` replaces the client call, e.g.
+        with a caching layer.
+        """
+        send = send or self.send
+        try:
+            request = next(flow)
+            while True:
+                try:
+                    response = send(request)
+                except Exception as e:
+                    request = flow.throw(e)
+                else:
+                    request = flow.send(response)
+        except StopIteration as stop:
+            return stop.value
+
+    async def arun_flow(self, flow: Generator[HttpRequest, httpx.Response, Any],
+                        send: Optional[Callable[[HttpRequest], Awaitable[httpx.Response]]] = None) -> Any:
+        """Drive a request flow with the async client without blocking the event loop"""
+        send = send or self.asend
+        try:
+            request = next(flow)
+            while True:
+                try:
+                    response = await send(request)
+                except Exception as e:
+                    request = flow.throw(e)
+                else:
+                    request = flow.send(response)
+        except StopIteration as stop:
+            return stop.value
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self) -> None:
+        if self._async_client is not None and not self._async_client.is_closed:
+            await self._async_client.aclose()
+        self._async_client = None
+        self._async_loop = None
+        self.close()
+
+
+# Shared pool used by all tools
+http_client = HttpClientPool()
@@ -1,7 +1,11 @@
 import math
-from typing import Tuple, Dict, Optional
+from typing import Tuple, Dict, Optional, Sequence
 from dataclasses import dataclass
 
+import numpy as np
+
+from .geo_batch import compute_distances, DistanceBatch
+
 @dataclass
 class Landmark:
     name: str
@@ -116,6 +120,22 @@ class LocationUtils:
         
         return round(R * c, 2)
 
+    @staticmethod
+    def rank_by_distance(lat: float, lon: float,
+                         lats: Sequence[float], lons: Sequence[float]) -> DistanceBatch:
+        """
+        Vectorized calculate_distance from one point to many candidates,
+        with coordinate fix-up, HCMC validation and a nearest-first argsort
+        """
+        return compute_distances(lat, lon, np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64))
+
+    @staticmethod
+    def calculate_travel_times_batch(batch: DistanceBatch) -> Dict[str, np.ndarray]:
+        """
+        calculate_travel_times for every point of a batch (-1 where coordinates are invalid)
+        """
+        return batch.travel_minutes(LocationUtils.TRAVEL_SPEEDS, rounding="round")
+
     @staticmethod
     def get_distance_category(distance: float) -> str:
         """
@@ -174,4 +194,15 @@ class LocationUtils:
         return {
             "landmark": landmark,
             "distance_info": LocationUtils.format_distance_info(distance)
-        } 
\ No newline at end of file
+        }
+
+    @staticmethod
+    def find_landmark(name: str) -> Optional[Landmark]:
+        """
+        Find a landmark by name in LANDMARKS and the bundled HCMC gazetteer
+        (accent-insensitive exact or unique-prefix matching)
+        """
+        from .gazetteer import hcmc_gazetteer
+
+        match = hcmc_gazetteer.resolve(name)
+        return match.landmark if match else None
@@ -0,0 +1,417 @@
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .geo_batch import fix_coordinates, haversine_km, validate_coordinates
+
+# Off by default: the index is built from the chatbot-service properties table,
+# not from the backend's rental_posts that /posts and the frontend map serve,
+# so enabling it changes which listings radius/bounds/nearby searches return
+SPATIAL_INDEX_ENABLED = os.getenv("SPATIAL_INDEX_ENABLED", "0") == "1"
+SPATIAL_INDEX_CELL_DEG = float(os.getenv("SPATIAL_INDEX_CELL_DEG", "0.01"))  # ~1.1 km
+SPATIAL_INDEX_REFRESH = int(os.getenv("SPATIAL_INDEX_REFRESH", "300"))  # seconds between sync checks
+
+KM_PER_DEG_LAT = 110.574
+
+
+def _km_per_deg_lon(lat: float) -> float:
+    return 111.320 * max(math.cos(math.radians(lat)), 1e-6)
+
+
+class SpatialGridIndex:
+    """
+    Uniform lat/lon grid over a fixed set of points.
+
+    Points are sorted by cell id so every cell is one contiguous slice of the
+    arrays; a query only touches the cells overlapping its bounding box and
+    then measures the few candidates with the vectorized haversine.
+    """
+
+    def __init__(self, lats: Sequence[float], lons: Sequence[float], cell_deg: float = SPATIAL_INDEX_CELL_DEG):
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        valid = validate_coordinates(lats, lons)
+        lats, lons = fix_coordinates(lats, lons)
+
+        self.cell_deg = cell_deg
+        point_ids = np.flatnonzero(valid)
+        lats, lons = lats[point_ids], lons[point_ids]
+
+        self.lat0 = float(lats.min()) if len(lats) else 0.0
+        self.lon0 = float(lons.min()) if len(lons) else 0.0
+        rows = ((lats - self.lat0) // cell_deg).astype(np.int64)
+        cols = ((lons - self.lon0) // cell_deg).astype(np.int64)
+        self.n_rows = int(rows.max()) + 1 if len(rows) else 0
+        self.n_cols = int(cols.max()) + 1 if len(cols) else 0
+
+        cells = rows * max(self.n_cols, 1) + cols
+        order = np.argsort(cells, kind="stable")
+        self.point_ids = point_ids[order]
+        self.lats = lats[order]
+        self.lons = lons[order]
+
+        sorted_cells = cells[order]
+        unique_cells, starts, counts = np.unique(sorted_cells, return_index=True, return_counts=True)
+        self._cells: Dict[int, Tuple[int, int]] = {
+            int(cell): (int(start), int(start + count))
+            for cell, start, count in zip(unique_cells, starts, counts)
+        }
+
+    def __len__(self) -> int:
+        return len(self.point_ids)
+
+    def _cell_range(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> Tuple[int, int, int, int]:
+        return (int((min_lat - self.lat0) // self.cell_deg), int((max_lat - self.lat0) // self.cell_deg),
+                int((min_lon - self.lon0) // self.cell_deg), int((max_lon - self.lon0) // self.cell_deg))
+
+    def _candidates(self, row_min: int, row_max: int, col_min: int, col_max: int) -> np.ndarray:
+        """Positions (into the sorted arrays) of all points in a block of cells"""
+        row_min, row_max = max(row_min, 0), min(row_max, self.n_rows - 1)
+        col_min, col_max = max(col_min, 0), min(col_max, self.n_cols - 1)
+        slices = []
+        for row in range(row_min, row_max + 1):
+            base = row * self.n_cols
+            for col in range(col_min, col_max + 1):
+                span = self._cells.get(base + col)
+                if span is not None:
+                    slices.append(np.arange(span[0], span[1]))
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(slices)
+
+    def bounds(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        """Point ids inside a lat/lon box"""
+        if not len(self):
+            return np.empty(0, dtype=np.int64)
+        positions = self._candidates(*self._cell_range(min_lat, min_lon, max_lat, max_lon))
+        lats, lons = self.lats[positions], self.lons[positions]
+        mask = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+        return self.point_ids[positions[mask]]
+
+    def radius(self, lat: float, lon: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Point ids within radius_km of (lat, lon), nearest first
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (point ids, distances in km)
+        """
+        if not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        dlat = radius_km / KM_PER_DEG_LAT
+        dlon = radius_km / _km_per_deg_lon(lat)
+        positions = self._candidates(*self._cell_range(lat - dlat, lon - dlon, lat + dlat, lon + dlon))
+        distances = haversine_km(lat, lon, self.lats[positions], self.lons[positions])
+        mask = distances <= radius_km
+        positions, distances = positions[mask], distances[mask]
+        order = np.argsort(distances, kind="stable")
+        return self.point_ids[positions[order]], distances[order]
+
+    def nearest(self, lat: float, lon: float, k: int,
+                max_radius_km: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The k nearest point ids, expanding rings of cells until the k-th
+        distance is closer than any cell not yet visited
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (point ids, distances in km)
+        """
+        if not len(self) or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        row = int((lat - self.lat0) // self.cell_deg)
+        col = int((lon - self.lon0) // self.cell_deg)
+        km_lon = _km_per_deg_lon(lat)
+        # Ring at which the visited block covers the whole grid
+        max_ring = max(abs(row), abs(self.n_rows - 1 - row), abs(col), abs(self.n_cols - 1 - col))
+
+        ring = 0
+        while True:
+            positions = self._candidates(row - ring, row + ring, col - ring, col + ring)
+            # Distance from the query to the nearest edge of the visited block
+            covered_km = min(
+                (lat - (self.lat0 + (row - ring) * self.cell_deg)) * KM_PER_DEG_LAT,
+                (self.lat0 + (row + ring + 1) * self.cell_deg - lat) * KM_PER_DEG_LAT,
+                (lon - (self.lon0 + (col - ring) * self.cell_deg)) * km_lon,
+                (self.lon0 + (col + ring + 1) * self.cell_deg - lon) * km_lon,
+            )
+            done = ring >= max_ring or (max_radius_km is not None and covered_km >= max_radius_km)
+            if len(positions) >= k or done:
+                distances = haversine_km(lat, lon, self.lats[positions], self.lons[positions])
+                if len(positions) >= k and np.partition(distances, k - 1)[k - 1] <= covered_km:
+                    done = True
+                if done:
+                    if max_radius_km is not None:
+                        keep = distances <= max_radius_km
+                        positions, distances = positions[keep], distances[keep]
+                    order = np.argsort(distances, kind="stable")[:k]
+                    return self.point_ids[positions[order]], distances[order]
+            ring += 1
+
+
+class ListingIndex:
+    """
+    In-process spatial index over active listings, kept in sync with the
+    properties table. That is a different table from the rental API's
+    rental_posts, so the index only gives the same results as /posts when the
+    two are kept identical (see SPATIAL_INDEX_ENABLED).
+
+    Listings are stored column-wise (numpy arrays for the filterable fields,
+    a list of API-shaped dicts for display) on top of a SpatialGridIndex.
+    The loader returns rows from the database and the version loader returns
+    a cheap signature (row count, last update) used to skip rebuilds when
+    nothing changed. Staleness checks run in a background thread so queries
+    never wait on the database.
+    """
+
+    def __init__(self,
+                 loader: Optional[Callable[[], List[Dict]]] = None,
+                 version_loader: Optional[Callable[[], Any]] = None,
+                 refresh_interval: int = SPATIAL_INDEX_REFRESH,
+                 cell_deg: float = SPATIAL_INDEX_CELL_DEG):
+        self.loader = loader
+        self.version_loader = version_loader
+        self.refresh_interval = refresh_interval
+        self.cell_deg = cell_deg
+
+        self.version: Any = None
+        self.loaded_at: Optional[float] = None
+        self.build_seconds: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._state: Optional[Dict[str, Any]] = None
+
+    @property
+    def is_ready(self) -> bool:
+        state = self._state
+        return state is not None and len(state["grid"]) > 0
+
+    def __len__(self) -> int:
+        state = self._state
+        return len(state["grid"]) if state is not None else 0
+
+    def load(self, rows: List[Dict], version: Any = None) -> None:
+        """Build the index from property rows (DB column names) and swap it in"""
+        start = time.perf_counter()
+
+        def column(name, default=np.nan):
+            values = []
+            for row in rows:
+                value = row.get(name)
+                try:
+                    values.append(float(value) if value is not None else default)
+                except (TypeError, ValueError):
+                    values.append(default)
+            return np.asarray(values, dtype=np.float64)
+
+        state = {
+            "grid": SpatialGridIndex(column("latitude"), column("longitude"), self.cell_deg),
+            "price": column("price"),
+            "area": column("area"),
+            "bedrooms": column("bedrooms"),
+            "bathrooms": column("bathrooms"),
+            "property_type": np.asarray([str(row.get("property_type") or "").lower() for row in rows]),
+            "transaction_type": np.asarray([str(row.get("transaction_type") or "").lower() for row in rows]),
+            "records": [self._to_record(row) for row in rows],
+        }
+
+        self._state = state
+        self.version = version
+        self.loaded_at = time.time()
+        self.build_seconds = time.perf_counter() - start
+        print(f"[SPATIAL] Indexed {len(state['grid'])} listings in {self.build_seconds * 1000:.1f}ms")
+
+    @staticmethod
+    def _to_record(row: Dict) -> Dict:
+        """Shape a properties row like a rental API post"""
+        image_url = row.get("image_url")
+        return {
+            "id": row.get("id"),
+            "name": row.get("name"),
+            "price": float(row["price"]) if row.get("price") is not None else None,
+            "area": float(row["area"]) if row.get("area") is not None else None,
+            "propertyType": row.get("property_type"),
+            "transactionType": row.get("transaction_type"),
+            "district": row.get("district"),
+            "ward": row.get("ward"),
+            "bedrooms": row.get("bedrooms"),
+            "bathrooms": row.get("bathrooms"),
+            "contactName": row.get("contact_name"),
+            "contactPhone": row.get("contact_phone"),
+            "displayedAddress": row.get("displayed_address"),
+            "images": [{"url": image_url}] if image_url else [],
+            "coordinates": {
+                "latitude": float(row["latitude"]) if row.get("latitude") is not None else None,
+                "longitude": float(row["longitude"]) if row.get("longitude") is not None else None,
+            },
+        }
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Reload from the database if the listing version changed
+
+        Returns:
+            bool: True if the index was rebuilt
+        """
+        if self.loader is None:
+            return False
+        try:
+            version = self.version_loader() if self.version_loader is not None else None
+            if not force and self._state is not None and version is not None and version == self.version:
+                return False
+            rows = self.loader()
+            if rows is None:
+                # Loader failed: keep serving the previous snapshot
+                return False
+            self.load(rows, version)
+            return True
+        except Exception as e:
+            print(f"[SPATIAL] Error refreshing listing index: {str(e)}")
+            return False
+        finally:
+            self._checked_at = time.time()
+
+    def warm_up(self) -> None:
+        """Load the index once at startup (errors are logged, queries fall back to HTTP)"""
+        if SPATIAL_INDEX_ENABLED:
+            self.refresh(force=True)
+
+    def ensure_fresh(self) -> None:
+        """Schedule a background sync check if the last one is older than refresh_interval"""
+        if self.loader is None or time.time() - self._checked_at < self.refresh_interval:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="listing-index-refresh", daemon=True).start()
+
+    def _filter(self, state: Dict, ids: np.ndarray,
+                min_price: Optional[float] = None, max_price: Optional[float] = None,
+                min_area: Optional[float] = None, max_area: Optional[float] = None,
+                property_type: Optional[str] = None, transaction_type: Optional[str] = None,
+                min_bedrooms: Optional[int] = None, min_bathrooms: Optional[int] = None) -> np.ndarray:
+        """Mask over ids for the attribute filters"""
+        mask = np.ones(len(ids), dtype=bool)
+        with np.errstate(invalid="ignore"):
+            if min_price is not None:
+                mask &= state["price"][ids] >= float(min_price)
+            if max_price is not None:
+                mask &= state["price"][ids] <= float(max_price)
+            if min_area is not None:
+                mask &= state["area"][ids] >= float(min_area)
+            if max_area is not None:
+                mask &= state["area"][ids] <= float(max_area)
+            if min_bedrooms is not None:
+                mask &= state["bedrooms"][ids] >= int(min_bedrooms)
+            if min_bathrooms is not None:
+                mask &= state["bathrooms"][ids] >= int(min_bathrooms)
+        if property_type is not None:
+            mask &= state["property_type"][ids] == str(property_type).lower()
+        if transaction_type is not None:
+            mask &= state["transaction_type"][ids] == str(transaction_type).lower()
+        return mask
+
+    @staticmethod
+    def _page(items: List, page: int, limit: int) -> List:
+        page = max(int(page or 1), 1)
+        return items[(page - 1) * limit: page * limit]
+
+    def nearby(self, lat: float, lon: float, radius_km: float, page: int = 1, limit: int = 10,
+               **filters) -> Tuple[List[Dict], int]:
+        """
+        Listings within radius_km, nearest first, with "distance_km" set
+
+        Returns:
+            Tuple[List[Dict], int]: (records on this page, total matches)
+        """
+        state = self._state
+        if state is None:
+            return [], 0
+        self.ensure_fresh()
+        ids, distances = state["grid"].radius(lat, lon, float(radius_km))
+        mask = self._filter(state, ids, **filters)
+        ids, distances = ids[mask], distances[mask]
+        hits = [
+            {**state["records"][i], "distance_km": round(float(d), 2)}
+            for i, d in self._page(list(zip(ids.tolist(), distances.tolist())), page, limit)
+        ]
+        return hits, len(ids)
+
+    def nearest(self, lat: float, lon: float, k: int = 10, max_radius_km: Optional[float] = None) -> List[Dict]:
+        """The k nearest listings, with "distance_km" set"""
+        state = self._state
+        if state is None:
+            return []
+        self.ensure_fresh()
+        ids, distances = state["grid"].nearest(lat, lon, k, max_radius_km)
+        return [
+            {**state["records"][i], "distance_km": round(float(d), 2)}
+            for i, d in zip(ids.tolist(), distances.tolist())
+        ]
+
+    def within_bounds(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                      page: int = 1, limit: int = 10, **filters) -> Tuple[List[Dict], int]:
+        """
+        Listings inside a lat/lon box, in id order
+
+        Returns:
+            Tuple[List[Dict], int]: (records on this page, total matches)
+        """
+        state = self._state
+        if state is None:
+            return [], 0
+        self.ensure_fresh()
+        ids = state["grid"].bounds(min_lat, min_lon, max_lat, max_lon)
+        ids = np.sort(ids[self._filter(state, ids, **filters)])
+        return [state["records"][i] for i in self._page(ids.tolist(), page, limit)], len(ids)
+
+    def get_stats(self) -> Dict:
+        return {
+            "ready": self.is_ready,
+            "listings": len(self),
+            "version": str(self.version) if self.version is not None else None,
+            "loaded_at": self.loaded_at,
+            "build_ms": round(self.build_seconds * 1000, 2) if self.build_seconds is not None else None,
+        }
+
+
+def parse_bounds(bounds: Any) -> Optional[Tuple[float, float, float, float]]:
+    """Parse "[minLat, minLng, maxLat, maxLng]" (string or sequence); None if malformed"""
+    try:
+        if isinstance(bounds, str):
+            values = [float(v) for v in bounds.strip().strip("[]()").split(",")]
+        else:
+            values = [float(v) for v in bounds]
+    except (TypeError, ValueError):
+        return None
+    if len(values) != 4:
+        return None
+    min_lat, min_lon, max_lat, max_lon = values
+    return min(min_lat, max_lat), min(min_lon, max_lon), max(min_lat, max_lat), max(min_lon, max_lon)
+
+
+def _load_active_listings() -> Optional[List[Dict]]:
+    # Imported lazily so the index (and its benchmark) can be used without a database
+    from app.database.product_service import get_active_listings
+    return get_active_listings()
+
+
+def _load_listings_version() -> Optional[tuple]:
+    from app.database.product_service import get_listings_version
+    return get_listings_version()
+
+
+# Shared index used by the location tools (empty until warm_up/refresh)
+listing_index = ListingIndex(loader=_load_active_listings, version_loader=_load_listings_version)
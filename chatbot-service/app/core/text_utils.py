@@ -0,0 +1,69 @@
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r"\s+")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def fold_accents(text: str) -> str:
+    """
+    Remove Vietnamese diacritics: "Bình Thạnh" -> "Binh Thanh", "Đức" -> "Duc"
+    """
+    text = text.replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(c for c in decomposed if unicodedata.category(c) != "Mn")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Build an accent-insensitive lookup key: lowercase, no diacritics,
+    punctuation replaced by spaces, whitespace collapsed
+
+    Example: "  ĐH Bách-Khoa, TP.HCM " -> "dh bach khoa tp hcm"
+    """
+    if not text:
+        return ""
+    text = fold_accents(unicodedata.normalize("NFC", text)).casefold()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+# "Quận 3", "Q.3", "District 3", "quan 03" -> "3"
+_NUMBERED_DISTRICT = re.compile(r"^(?:quận|quan|district|q)\s*\.?\s*0*(\d+)$", re.IGNORECASE)
+# Administrative prefixes dropped from district keys ("Quận Bình Thạnh", "Huyện Củ Chi", "TP Thủ Đức")
+_DISTRICT_PREFIXES = ("thanh pho ", "tp ", "quan ", "huyen ", "district ", "q ")
+
+
+def normalize_district(district: str) -> str:
+    """
+    Normalize a district name to the format expected by the rental API
+    - "Quận X" / "District X" / "Q.X" -> "X"
+    - other names ("Bình Thạnh", "Thủ Đức") are kept as typed (stripped)
+    """
+    if district is None:
+        return None
+
+    district = district.strip()
+    match = _NUMBERED_DISTRICT.match(district)
+    if match:
+        return match.group(1)
+    return district
+
+
+def district_key(district: str) -> str:
+    """
+    Accent-folded key stored in properties.district_key and used for
+    equality lookups
+
+    Example: "Quận 03" -> "3", "Q. Bình Thạnh" -> "binh thanh", "TP Thủ Đức" -> "thu duc"
+    """
+    if not district:
+        return ""
+    key = normalize_text(normalize_district(district))
+    for prefix in _DISTRICT_PREFIXES:
+        if key.startswith(prefix):
+            key = key[len(prefix):]
+            break
+    if key.isdigit():
+        key = str(int(key))
+    return key
@@ -0,0 +1,182 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+import aiomysql
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Async pool configuration
+ASYNC_DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': int(os.getenv('DB_PORT', 3306)),
+    'user': os.getenv('DB_USERNAME'),
+    'password': os.getenv('DB_PASSWORD'),
+    'db': os.getenv('DB_NAME'),
+    'charset': 'utf8mb4',
+    'autocommit': False,
+}
+ASYNC_POOL_MIN_SIZE = int(os.getenv('DB_ASYNC_POOL_MIN_SIZE', 1))
+ASYNC_POOL_MAX_SIZE = int(os.getenv('DB_ASYNC_POOL_MAX_SIZE', 20))
+ASYNC_POOL_ACQUIRE_TIMEOUT = float(os.getenv('DB_ASYNC_POOL_ACQUIRE_TIMEOUT', 5))  # seconds
+ASYNC_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv('DB_ASYNC_POOL_HEALTH_CHECK_INTERVAL', 30))  # seconds idle
+ASYNC_POOL_RECYCLE = int(os.getenv('DB_ASYNC_POOL_RECYCLE', 3600))  # seconds
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be acquired within the acquire timeout"""
+
+
+class AsyncConnectionPool:
+    """
+    aiomysql pool created lazily on the running event loop.
+
+    - acquire() waits at most acquire_timeout for a connection
+    - connections idle for longer than health_check_interval are pinged
+      (and reconnected) before being handed out
+    - get_stats() reports pool size, usage and wait times
+    """
+
+    def __init__(self, config: Dict = ASYNC_DB_CONFIG,
+                 min_size: int = ASYNC_POOL_MIN_SIZE,
+                 max_size: int = ASYNC_POOL_MAX_SIZE,
+                 acquire_timeout: float = ASYNC_POOL_ACQUIRE_TIMEOUT,
+                 health_check_interval: float = ASYNC_POOL_HEALTH_CHECK_INTERVAL,
+                 recycle: int = ASYNC_POOL_RECYCLE):
+        self.config = config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.recycle = recycle
+
+        self._pool: Optional[aiomysql.Pool] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._create_lock: Optional[asyncio.Lock] = None
+        self._last_used: Dict[int, float] = {}
+        self.stats = {
+            "acquired": 0,
+            "timeouts": 0,
+            "health_checks": 0,
+            "reconnects": 0,
+            "errors": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    async def _get_pool(self) -> aiomysql.Pool:
+        loop = asyncio.get_running_loop()
+        if self._pool is not None and self._loop is loop:
+            return self._pool
+
+        if self._create_lock is None or self._loop is not loop:
+            self._create_lock = asyncio.Lock()
+            self._pool = None
+            self._loop = loop
+        async with self._create_lock:
+            if self._pool is None:
+                try:
+                    self._pool = await aiomysql.create_pool(
+                        minsize=self.min_size,
+                        maxsize=self.max_size,
+                        pool_recycle=self.recycle,
+                        **self.config
+                    )
+                except Exception:
+                    self.stats["errors"] += 1
+                    raise
+                print(f"[DB] Async pool created (min={self.min_size}, max={self.max_size})")
+        return self._pool
+
+    async def _health_check(self, conn) -> None:
+        last_used = self._last_used.get(id(conn))
+        if last_used is None or time.monotonic() - last_used < self.health_check_interval:
+            return
+        self.stats["health_checks"] += 1
+        try:
+            await conn.ping(reconnect=False)
+        except Exception:
+            # Stale connection: reconnect in place
+            self.stats["reconnects"] += 1
+            await conn.ping(reconnect=True)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        Acquire a raw connection; the caller owns the transaction
+
+        Raises:
+            PoolTimeoutError: If no connection is free within acquire_timeout
+        """
+        pool = await self._get_pool()
+        start = time.monotonic()
+        try:
+            conn = await asyncio.wait_for(pool.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise PoolTimeoutError(
+                f"No database connection available after {self.acquire_timeout}s "
+                f"({pool.size - pool.freesize}/{self.max_size} in use)"
+            )
+        waited = time.monotonic() - start
+        self.stats["acquired"] += 1
+        self.stats["wait_seconds_total"] += waited
+        self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], waited)
+
+        try:
+            await self._health_check(conn)
+            yield conn
+        finally:
+            self._last_used[id(conn)] = time.monotonic()
+            pool.release(conn)
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+            self._last_used.clear()
+
+    def get_stats(self) -> Dict:
+        pool = self._pool
+        acquired = self.stats["acquired"]
+        return {
+            **self.stats,
+            "wait_seconds_total": round(self.stats["wait_seconds_total"], 4),
+            "wait_seconds_max": round(self.stats["wait_seconds_max"], 4),
+            "wait_ms_avg": round(self.stats["wait_seconds_total"] / acquired * 1000, 3) if acquired else 0.0,
+            "size": pool.size if pool is not None else 0,
+            "free": pool.freesize if pool is not None else 0,
+            "in_use": (pool.size - pool.freesize) if pool is not None else 0,
+            "max_size": self.max_size,
+        }
+
+
+# Shared async pool for the chatbot service
+async_db_pool = AsyncConnectionPool()
+
+
+@asynccontextmanager
+async def get_async_db_connection():
+    """
+    Async counterpart of get_db_connection: commits on success, rolls back
+    on error and returns the connection to the pool.
+
+    Usage:
+        async with get_async_db_connection() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute("SELECT * FROM table")
+                results = await cursor.fetchall()
+    """
+    async with async_db_pool.acquire() as conn:
+        try:
+            yield conn
+        except Exception as e:
+            async_db_pool.stats["errors"] += 1
+            await conn.rollback()
+            raise e
+        else:
+            await conn.commit()
@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+CHAT_HISTORY_CACHE_THREADS = int(os.getenv("CHAT_HISTORY_CACHE_THREADS", "2048"))
+CHAT_HISTORY_CACHE_TURNS = int(os.getenv("CHAT_HISTORY_CACHE_TURNS", "10"))
+CHAT_HISTORY_CACHE_TTL = int(os.getenv("CHAT_HISTORY_CACHE_TTL", "1800"))  # seconds since last use
+
+
+class ChatHistoryCache:
+    """
+    LRU of formatted conversation history per thread.
+
+    Each entry holds the last max_turns turns already formatted for the
+    model ({"role": "human"/"assistant", "content": ...}, oldest first).
+    After each answer the new turn is appended in place, so a thread only
+    goes to MySQL on a cold miss. Entries idle for longer than ttl are
+    reloaded, which bounds staleness when several workers serve one thread.
+    """
+
+    def __init__(self, max_threads: int = CHAT_HISTORY_CACHE_THREADS,
+                 max_turns: int = CHAT_HISTORY_CACHE_TURNS,
+                 ttl: int = CHAT_HISTORY_CACHE_TTL):
+        self.max_threads = max_threads
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "appends": 0, "evictions": 0}
+
+    def get(self, thread_id: str, limit: int = CHAT_HISTORY_CACHE_TURNS) -> Optional[List[Dict]]:
+        """Formatted history of the last `limit` turns, or None on a miss"""
+        if limit > self.max_turns:
+            return None
+        with self._lock:
+            entry = self._entries.get(thread_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.stats["misses"] += 1
+                return None
+            messages = entry[1]
+            self._entries[thread_id] = (time.monotonic(), messages)
+            self._entries.move_to_end(thread_id)
+            self.stats["hits"] += 1
+            return list(messages)[-2 * limit:] if limit else []
+
+    def put(self, thread_id: str, messages: List[Dict]) -> None:
+        """Store a freshly loaded history (formatted, oldest first)"""
+        with self._lock:
+            self._entries[thread_id] = (time.monotonic(), deque(messages[-2 * self.max_turns:],
+                                                                maxlen=2 * self.max_turns))
+            self._entries.move_to_end(thread_id)
+            while len(self._entries) > self.max_threads:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def append(self, thread_id: str, question: str, answer: str) -> None:
+        """
+        Add a new turn to a cached thread. Threads that aren't cached are left
+        alone: their next read loads the full history from MySQL.
+        """
+        with self._lock:
+            entry = self._entries.get(thread_id)
+            if entry is None:
+                return
+            messages = entry[1]
+            messages.append({"role": "human", "content": question})
+            messages.append({"role": "assistant", "content": answer})
+            self._entries[thread_id] = (time.monotonic(), messages)
+            self._entries.move_to_end(thread_id)
+            self.stats["appends"] += 1
+
+    def invalidate(self, thread_id: str) -> None:
+        with self._lock:
+            self._entries.pop(thread_id, None)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "threads": len(self._entries),
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0
+            }
+
+
+# Shared cache used by the chat service
+chat_history_cache = ChatHistoryCache()
@@ -2,7 +2,11 @@ import os
 from dotenv import load_dotenv
 from datetime import datetime
 from typing import List, Dict
+import aiomysql
 from app.database.db_connection import get_db_connection
+from app.database.async_db_connection import get_async_db_connection
+from app.database.chat_history_writer import chat_history_writer
+from app.database.chat_history_cache import chat_history_cache
 
 load_dotenv()
 
@@ -13,7 +17,17 @@ def init_chat_history_table():
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
-                # Table is created by schema.sql
+                # Table is created by schema.sql; databases created before
+                # idx_thread_created existed get it here
+                cursor.execute("""
+                    SELECT COUNT(*) FROM information_schema.STATISTICS
+                    WHERE TABLE_SCHEMA = DATABASE()
+                      AND TABLE_NAME = 'chat_history'
+                      AND INDEX_NAME = 'idx_thread_created'
+                """)
+                if cursor.fetchone()[0] == 0:
+                    cursor.execute("CREATE INDEX idx_thread_created ON chat_history (thread_id, created_at)")
+                    print("Added chat_history.idx_thread_created")
                 print("Chat history table initialized successfully")
     except Exception as e:
         print(f"Error initializing chat history table: {str(e)}")
@@ -43,6 +57,30 @@ def save_chat_history(thread_id: str, question: str, answer: str) -> Dict:
         print(f"Error saving chat history: {str(e)}")
         return {'error': str(e)}
 
+async def asave_chat_history(thread_id: str, question: str, answer: str) -> Dict:
+    """
+    Async version of save_chat_history (does not block the event loop)
+    """
+    try:
+        async with get_async_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("""
+                    INSERT INTO chat_history (thread_id, question, answer)
+                    VALUES (%s, %s, %s)
+                """, (thread_id, question, answer))
+                
+                return {'id': cursor.lastrowid}
+    except Exception as e:
+        print(f"Error saving chat history: {str(e)}")
+        return {'error': str(e)}
+
+def _with_pending(thread_id: str, rows: List[Dict], limit: int) -> List[Dict]:
+    """Put turns still queued in the write-behind buffer in front of the database rows"""
+    pending = chat_history_writer.pending(thread_id)
+    if not pending:
+        return rows
+    return (pending + list(rows))[:limit]
+
 def get_recent_chat_history(thread_id: str, limit: int = 10) -> List[Dict]:
     """
     Get recent chat history for a conversation
@@ -70,7 +108,32 @@ def get_recent_chat_history(thread_id: str, limit: int = 10) -> List[Dict]:
                     LIMIT %s
                 """, (thread_id, limit))
                 
-                return cursor.fetchall()
+                return _with_pending(thread_id, cursor.fetchall(), limit)
+    except Exception as e:
+        print(f"Error getting chat history: {str(e)}")
+        return []
+
+async def aget_recent_chat_history(thread_id: str, limit: int = 10) -> List[Dict]:
+    """
+    Async version of get_recent_chat_history (does not block the event loop)
+    """
+    try:
+        async with get_async_db_connection() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute("""
+                    SELECT 
+                        id,
+                        thread_id,
+                        question,
+                        answer,
+                        created_at
+                    FROM chat_history
+                    WHERE thread_id = %s
+                    ORDER BY created_at DESC
+                    LIMIT %s
+                """, (thread_id, limit))
+                
+                return _with_pending(thread_id, list(await cursor.fetchall()), limit)
     except Exception as e:
         print(f"Error getting chat history: {str(e)}")
         return []
@@ -93,5 +156,37 @@ def format_chat_history(history: List[Dict]) -> List[Dict]:
         ])
     return formatted_history
 
+def get_formatted_history(thread_id: str, limit: int = 10) -> List[Dict]:
+    """
+    Formatted recent history for the AI model, served from the per-thread
+    cache; MySQL is only read on a cold miss
+    """
+    history = chat_history_cache.get(thread_id, limit)
+    if history is None:
+        history = format_chat_history(get_recent_chat_history(thread_id, limit))
+        chat_history_cache.put(thread_id, history)
+    return history
+
+async def aget_formatted_history(thread_id: str, limit: int = 10) -> List[Dict]:
+    """Async version of get_formatted_history"""
+    history = chat_history_cache.get(thread_id, limit)
+    if history is None:
+        history = format_chat_history(await aget_recent_chat_history(thread_id, limit))
+        chat_history_cache.put(thread_id, history)
+    return history
+
+def record_turn(thread_id: str, question: str, answer: str) -> Dict:
+    """
+    Record an answered turn: update the cached history in place and queue
+    the row for the write-behind writer
+    """
+    chat_history_cache.append(thread_id, question, answer)
+    return chat_history_writer.enqueue(thread_id, question, answer)
+
+async def arecord_turn(thread_id: str, question: str, answer: str) -> Dict:
+    """Async version of record_turn"""
+    chat_history_cache.append(thread_id, question, answer)
+    return await chat_history_writer.aenqueue(thread_id, question, answer)
+
 # Initialize table when module is imported
 init_chat_history_table() 
\ No newline at end of file
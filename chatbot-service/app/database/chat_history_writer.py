@@ -0,0 +1,223 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.database.db_connection import get_db_connection
+
+CHAT_HISTORY_QUEUE_SIZE = int(os.getenv("CHAT_HISTORY_QUEUE_SIZE", "1000"))
+CHAT_HISTORY_BATCH_SIZE = int(os.getenv("CHAT_HISTORY_BATCH_SIZE", "50"))
+CHAT_HISTORY_FLUSH_INTERVAL = float(os.getenv("CHAT_HISTORY_FLUSH_INTERVAL", "1.0"))  # seconds
+CHAT_HISTORY_FLUSH_RETRIES = int(os.getenv("CHAT_HISTORY_FLUSH_RETRIES", "3"))
+
+_STOP = object()
+
+
+class ChatHistoryWriter:
+    """
+    Write-behind buffer for chat_history.
+
+    Turns are queued in memory and a background thread flushes them as one
+    multi-row INSERT (one commit) whenever batch_size rows are waiting or
+    flush_interval has passed. The queue is bounded: when it is full the
+    caller writes its own row directly (backpressure instead of data loss).
+    Rows not yet flushed are visible through pending() so history reads stay
+    consistent.
+    """
+
+    def __init__(self, max_queue: int = CHAT_HISTORY_QUEUE_SIZE,
+                 batch_size: int = CHAT_HISTORY_BATCH_SIZE,
+                 flush_interval: float = CHAT_HISTORY_FLUSH_INTERVAL,
+                 retries: int = CHAT_HISTORY_FLUSH_RETRIES):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._pending: Dict[str, List[Dict]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.stats = {
+            "enqueued": 0,
+            "flushed_rows": 0,
+            "batches": 0,
+            "direct_writes": 0,
+            "failed_batches": 0,
+            "dropped_rows": 0,
+        }
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="chat-history-writer", daemon=True)
+                self._thread.start()
+
+    @staticmethod
+    def _make_row(thread_id: str, question: str, answer: str) -> Dict:
+        return {
+            "id": None,
+            "thread_id": thread_id,
+            "question": question,
+            "answer": answer,
+            "created_at": datetime.now()
+        }
+
+    def _track(self, row: Dict) -> None:
+        with self._lock:
+            self._pending.setdefault(row["thread_id"], []).append(row)
+
+    def _untrack(self, rows: List[Dict]) -> None:
+        with self._lock:
+            for row in rows:
+                thread_rows = self._pending.get(row["thread_id"])
+                if thread_rows is None:
+                    continue
+                try:
+                    thread_rows.remove(row)
+                except ValueError:
+                    pass
+                if not thread_rows:
+                    del self._pending[row["thread_id"]]
+
+    def enqueue(self, thread_id: str, question: str, answer: str) -> Dict:
+        """
+        Queue a turn for writing; writes it directly if the queue is full or closed
+
+        Returns:
+            Dict: {'queued': True} or the result of the direct write
+        """
+        row = self._make_row(thread_id, question, answer)
+        if not self._closed:
+            self._ensure_started()
+            self._track(row)
+            try:
+                self._queue.put_nowait(row)
+                self.stats["enqueued"] += 1
+                return {"queued": True}
+            except queue.Full:
+                self._untrack([row])
+
+        # Backpressure: the caller pays for its own write
+        self.stats["direct_writes"] += 1
+        return self._write_direct(row)
+
+    async def aenqueue(self, thread_id: str, question: str, answer: str) -> Dict:
+        """Async version of enqueue; a direct write runs in a worker thread"""
+        row = self._make_row(thread_id, question, answer)
+        if not self._closed:
+            self._ensure_started()
+            self._track(row)
+            try:
+                self._queue.put_nowait(row)
+                self.stats["enqueued"] += 1
+                return {"queued": True}
+            except queue.Full:
+                self._untrack([row])
+
+        self.stats["direct_writes"] += 1
+        return await asyncio.to_thread(self._write_direct, row)
+
+    def _write_direct(self, row: Dict) -> Dict:
+        try:
+            self._insert_rows([row])
+            return {"queued": False}
+        except Exception as e:
+            print(f"Error saving chat history: {str(e)}")
+            return {"error": str(e)}
+
+    def pending(self, thread_id: str) -> List[Dict]:
+        """Queued turns of a thread that are not in the database yet, newest first"""
+        with self._lock:
+            return list(reversed(self._pending.get(thread_id, [])))
+
+    @staticmethod
+    def _insert_rows(rows: List[Dict]) -> None:
+        placeholders = ", ".join(["(%s, %s, %s, %s)"] * len(rows))
+        params = []
+        for row in rows:
+            params.extend([row["thread_id"], row["question"], row["answer"], row["created_at"]])
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO chat_history (thread_id, question, answer, created_at) VALUES {placeholders}",
+                    params
+                )
+
+    def _flush(self, batch: List[Dict]) -> None:
+        for attempt in range(1, self.retries + 1):
+            try:
+                self._insert_rows(batch)
+                self.stats["flushed_rows"] += len(batch)
+                self.stats["batches"] += 1
+                break
+            except Exception as e:
+                print(f"[CHAT_HISTORY] Flush of {len(batch)} rows failed (attempt {attempt}): {str(e)}")
+                if attempt < self.retries:
+                    time.sleep(0.2 * attempt)
+        else:
+            self.stats["failed_batches"] += 1
+            self.stats["dropped_rows"] += len(batch)
+        self._untrack(batch)
+
+    def _run(self) -> None:
+        batch: List[Dict] = []
+        deadline = None
+        stopping = False
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                pass
+
+            if stopping:
+                # Drain whatever is still queued
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+
+            due = deadline is not None and time.monotonic() >= deadline
+            while batch and (stopping or due or len(batch) >= self.batch_size):
+                self._flush(batch[:self.batch_size])
+                batch = batch[self.batch_size:]
+                due = False
+            if not batch:
+                deadline = None
+            if stopping:
+                return
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Stop accepting turns, flush everything queued and stop the thread"""
+        self._closed = True
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        if thread.is_alive():
+            print("[CHAT_HISTORY] Writer did not drain before the shutdown timeout")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            pending_rows = sum(len(rows) for rows in self._pending.values())
+        return {**self.stats, "queue_depth": self._queue.qsize(), "pending_rows": pending_rows}
+
+
+# Shared writer used by the chat service
+chat_history_writer = ChatHistoryWriter()
@@ -14,7 +14,7 @@ DB_CONFIG = {
     'password': os.getenv('DB_PASSWORD'),
     'database': os.getenv('DB_NAME'),
     'pool_name': 'mypool',
-    'pool_size': 5
+    'pool_size': int(os.getenv('DB_POOL_SIZE', 5))  # mysql.connector allows at most 32
 }
 
 # Create connection pool
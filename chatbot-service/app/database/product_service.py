@@ -1,9 +1,34 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Sequence, Tuple, Any
+import aiomysql
 from app.database.db_connection import get_db_connection
+from app.database.async_db_connection import get_async_db_connection
+from app.core.text_utils import district_key
 from decimal import Decimal
 from datetime import datetime
+import base64
+import json
 import os
 
+# Columns a paginated query may project (everything in properties except district_key)
+PROPERTY_COLUMNS = frozenset({
+    "id", "name", "description", "price", "area", "property_type", "transaction_type",
+    "source_url", "province", "district", "ward", "street", "longitude", "latitude",
+    "displayed_address", "status", "bedrooms", "bathrooms", "contact_name",
+    "contact_phone", "post_url", "created_at", "updated_at"
+})
+# Default projection for listing results: no description TEXT, no URLs
+LISTING_COLUMNS = (
+    "id", "name", "price", "area", "property_type", "transaction_type",
+    "district", "ward", "displayed_address", "bedrooms", "bathrooms",
+    "contact_name", "contact_phone", "latitude", "longitude", "status", "created_at"
+)
+MAX_PAGE_SIZE = 50
+DEFAULT_MAX_IMAGES = 3
+
+# Keyset orderings: (sort column, direction)
+_ORDER_NEWEST = ("created_at", "DESC")
+_ORDER_CHEAPEST = ("price", "ASC")
+
 def init_properties_table():
     """
     Initialize properties and property_images tables in MySQL if they don't exist
@@ -13,9 +38,49 @@ def init_properties_table():
             with conn.cursor() as cursor:
                 # Tables are created by schema.sql
                 print("Properties tables initialized successfully")
+        backfill_district_keys()
     except Exception as e:
         print(f"Error initializing properties table: {str(e)}")
 
+def backfill_district_keys(batch_size: int = 500) -> int:
+    """
+    Add the district_key column/index to databases created before it existed
+    and fill it for rows written without it
+
+    Returns:
+        int: Number of rows updated
+    """
+    updated = 0
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT COUNT(*) FROM information_schema.COLUMNS
+                    WHERE TABLE_SCHEMA = DATABASE()
+                      AND TABLE_NAME = 'properties'
+                      AND COLUMN_NAME = 'district_key'
+                """)
+                if cursor.fetchone()[0] == 0:
+                    cursor.execute("ALTER TABLE properties ADD COLUMN district_key VARCHAR(100) AFTER district")
+                    cursor.execute("CREATE INDEX idx_district_key ON properties (district_key, created_at)")
+                    print("Added properties.district_key")
+
+                # The key is computed in Python so it matches the lookup side exactly
+                cursor.execute("SELECT id, district FROM properties WHERE district_key IS NULL")
+                rows = cursor.fetchall()
+                for start in range(0, len(rows), batch_size):
+                    batch = rows[start:start + batch_size]
+                    cursor.executemany(
+                        "UPDATE properties SET district_key = %s WHERE id = %s",
+                        [(district_key(district), property_id) for property_id, district in batch]
+                    )
+                    updated += len(batch)
+        if updated:
+            print(f"Backfilled district_key for {updated} properties")
+    except Exception as e:
+        print(f"Error in backfill_district_keys: {str(e)}")
+    return updated
+
 def get_properties_by_district(district: str) -> List[Dict]:
     """
     Search for properties in a specific district
@@ -29,39 +94,20 @@ def get_properties_by_district(district: str) -> List[Dict]:
     try:
         with get_db_connection() as conn:
             with conn.cursor(dictionary=True) as cursor:
-                # Normalize district name
-                district = district.strip()
-                
-                # Handle district name variations
-                district_variations = [
-                    district,  # Original name
-                    district.lower(),  # Lowercase
-                    district.upper(),  # Uppercase
-                    f"Quận {district}",  # With Quận prefix
-                    f"quận {district.lower()}",  # With quận prefix
-                    f"Quan {district}",  # Without diacritics
-                    f"quan {district.lower()}"  # Without diacritics
-                ]
-                
-                # Build the WHERE clause for district variations
-                where_clause = " OR ".join(["p.district LIKE %s"] * len(district_variations))
-                
-                # Add wildcards to catch partial matches
-                search_patterns = [f"%{d}%" for d in district_variations]
-                
-                # Query with district variations
-                query = f"""
+                # "Quận 3", "quan 3", "Q.3" and "3" all share one key, so the
+                # lookup is an equality probe on idx_district_key
+                query = """
                     SELECT 
                         p.*,
                         GROUP_CONCAT(pi.url) as image_urls
                     FROM properties p
                     LEFT JOIN property_images pi ON p.id = pi.property_id
-                    WHERE {where_clause}
+                    WHERE p.district_key = %s
                     GROUP BY p.id
                     ORDER BY p.created_at DESC
                 """
                 
-                cursor.execute(query, search_patterns)
+                cursor.execute(query, (district_key(district),))
                 results = cursor.fetchall()
                 
                 # Process image URLs
@@ -156,6 +202,291 @@ def get_properties_by_price_range(min_price: float, max_price: float) -> List[Di
         print(f"Error in get_properties_by_price_range: {str(e)}")
         return []
 
+def get_active_listings() -> Optional[List[Dict]]:
+    """
+    Load the columns needed by the in-process spatial index for every active
+    property with coordinates (one image URL each)
+
+    Returns:
+        Optional[List[Dict]]: Rows, or None if the query failed
+    """
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor(dictionary=True) as cursor:
+                cursor.execute("""
+                    SELECT
+                        p.id, p.name, p.price, p.area,
+                        p.property_type, p.transaction_type,
+                        p.district, p.ward, p.latitude, p.longitude,
+                        p.displayed_address, p.bedrooms, p.bathrooms,
+                        p.contact_name, p.contact_phone,
+                        (SELECT pi.url FROM property_images pi
+                         WHERE pi.property_id = p.id
+                         ORDER BY pi.id LIMIT 1) as image_url
+                    FROM properties p
+                    WHERE p.status = 'active'
+                      AND p.latitude IS NOT NULL
+                      AND p.longitude IS NOT NULL
+                """)
+                return cursor.fetchall()
+    except Exception as e:
+        print(f"Error in get_active_listings: {str(e)}")
+        return None
+
+def get_listings_version() -> Optional[tuple]:
+    """
+    Cheap signature of the active listings (count, last update), used to
+    detect changes without reloading every row
+
+    Returns:
+        Optional[tuple]: (count, max updated_at), or None if the query failed
+    """
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT COUNT(*), MAX(updated_at)
+                    FROM properties
+                    WHERE status = 'active'
+                """)
+                return tuple(cursor.fetchone())
+    except Exception as e:
+        print(f"Error in get_listings_version: {str(e)}")
+        return None
+
+def _encode_cursor(sort_column: str, sort_value: Any, last_id: Any) -> str:
+    """Opaque cursor for the last row of a page"""
+    if isinstance(sort_value, (datetime, Decimal)):
+        sort_value = str(sort_value)
+    raw = json.dumps([sort_column, sort_value, last_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor: str, sort_column: str) -> Tuple[Any, Any]:
+    """
+    Raises:
+        ValueError: If the cursor is malformed or belongs to another ordering
+    """
+    try:
+        column, sort_value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+    if column != sort_column:
+        raise ValueError(f"Cursor is for ordering by {column}, not {sort_column}")
+    return sort_value, last_id
+
+def _images_query(property_ids: List[Any], max_images: int) -> Optional[Tuple[str, Tuple]]:
+    """First max_images image URLs of each property, one query for the whole page"""
+    if not property_ids or max_images <= 0:
+        return None
+    placeholders = ", ".join(["%s"] * len(property_ids))
+    return f"""
+        SELECT property_id, url FROM (
+            SELECT
+                pi.property_id,
+                pi.url,
+                ROW_NUMBER() OVER (PARTITION BY pi.property_id ORDER BY pi.id) as rn
+            FROM property_images pi
+            WHERE pi.property_id IN ({placeholders})
+        ) ranked
+        WHERE rn <= %s
+        ORDER BY property_id, rn
+    """, (*property_ids, max_images)
+
+def _page_query(where: str, params: Sequence[Any], order: Tuple[str, str],
+                limit: int, cursor: Optional[str],
+                columns: Optional[Sequence[str]]) -> Tuple[str, Tuple, int]:
+    """
+    Build the keyset-paginated properties query shared by the *_page functions
+
+    Args:
+        where (str): SQL condition on alias p (without WHERE)
+        params (Sequence[Any]): Parameters for the condition
+        order (Tuple[str, str]): Sort column and direction; id breaks ties
+        limit (int): Page size, capped at MAX_PAGE_SIZE
+        cursor (Optional[str]): next_cursor of the previous page
+        columns (Optional[Sequence[str]]): Projection (id and the sort column are always included)
+
+    Returns:
+        Tuple[str, Tuple, int]: (SQL, parameters, effective page size)
+
+    Raises:
+        ValueError: If columns contains a name that isn't a properties column,
+            or the cursor is invalid
+    """
+    columns = list(columns or LISTING_COLUMNS)
+    unknown = set(columns) - PROPERTY_COLUMNS
+    if unknown:
+        raise ValueError(f"Unknown property columns: {sorted(unknown)}")
+
+    sort_column, direction = order
+    for required in ("id", sort_column):
+        if required not in columns:
+            columns.append(required)
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    conditions = [f"({where})"]
+    query_params = list(params)
+    if cursor:
+        sort_value, last_id = _decode_cursor(cursor, sort_column)
+        comparison = "<" if direction == "DESC" else ">"
+        conditions.append(
+            f"(p.{sort_column} {comparison} %s OR (p.{sort_column} = %s AND p.id {comparison} %s))"
+        )
+        query_params.extend([sort_value, sort_value, last_id])
+
+    # Fetch one extra row to know whether another page exists
+    sql = f"""
+        SELECT {", ".join(f"p.{column}" for column in columns)}
+        FROM properties p
+        WHERE {" AND ".join(conditions)}
+        ORDER BY p.{sort_column} {direction}, p.id {direction}
+        LIMIT %s
+    """
+    return sql, (*query_params, limit + 1), limit
+
+def _build_page(rows: List[Dict], image_rows: List[Dict], sort_column: str, limit: int) -> Dict:
+    """Attach images and compute the next cursor; rows holds up to limit + 1 rows"""
+    has_more = len(rows) > limit
+    rows = list(rows[:limit])
+
+    images: Dict[Any, List[Dict]] = {}
+    for row in image_rows:
+        images.setdefault(row["property_id"], []).append({"url": row["url"]})
+    for row in rows:
+        row["images"] = images.get(row["id"], [])
+
+    next_cursor = _encode_cursor(sort_column, rows[-1][sort_column], rows[-1]["id"]) if has_more else None
+    return {"items": rows, "next_cursor": next_cursor, "has_more": has_more}
+
+def _get_properties_page(where: str, params: Sequence[Any], order: Tuple[str, str],
+                         limit: int, cursor: Optional[str],
+                         columns: Optional[Sequence[str]], max_images: int) -> Dict:
+    """
+    Run a keyset-paginated properties query (see _page_query)
+
+    Returns:
+        Dict: {"items": [...], "next_cursor": str or None, "has_more": bool}
+    """
+    sql, query_params, limit = _page_query(where, params, order, limit, cursor, columns)
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor(dictionary=True) as db_cursor:
+                db_cursor.execute(sql, query_params)
+                rows = db_cursor.fetchall()
+
+                image_rows = []
+                images_query = _images_query([row["id"] for row in rows[:limit]], max_images)
+                if images_query:
+                    db_cursor.execute(*images_query)
+                    image_rows = db_cursor.fetchall()
+
+                return _build_page(rows, image_rows, order[0], limit)
+    except Exception as e:
+        print(f"Error in _get_properties_page: {str(e)}")
+        return {"items": [], "next_cursor": None, "has_more": False}
+
+async def _aget_properties_page(where: str, params: Sequence[Any], order: Tuple[str, str],
+                                limit: int, cursor: Optional[str],
+                                columns: Optional[Sequence[str]], max_images: int) -> Dict:
+    """
+    Async version of _get_properties_page on the aiomysql pool
+
+    Returns:
+        Dict: {"items": [...], "next_cursor": str or None, "has_more": bool}
+    """
+    sql, query_params, limit = _page_query(where, params, order, limit, cursor, columns)
+    try:
+        async with get_async_db_connection() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as db_cursor:
+                await db_cursor.execute(sql, query_params)
+                rows = list(await db_cursor.fetchall())
+
+                image_rows = []
+                images_query = _images_query([row["id"] for row in rows[:limit]], max_images)
+                if images_query:
+                    await db_cursor.execute(*images_query)
+                    image_rows = list(await db_cursor.fetchall())
+
+                return _build_page(rows, image_rows, order[0], limit)
+    except Exception as e:
+        print(f"Error in _aget_properties_page: {str(e)}")
+        return {"items": [], "next_cursor": None, "has_more": False}
+
+def get_properties_page_by_district(district: str, limit: int = 10, cursor: Optional[str] = None,
+                                    columns: Optional[Sequence[str]] = None,
+                                    max_images: int = DEFAULT_MAX_IMAGES) -> Dict:
+    """
+    One page of properties in a district, newest first
+
+    Args:
+        district (str): District name in any spelling ("Quận 3", "Bình Thạnh", "binh thanh")
+        limit (int): Page size (at most MAX_PAGE_SIZE)
+        cursor (Optional[str]): next_cursor from the previous page
+        columns (Optional[Sequence[str]]): Columns to return (default LISTING_COLUMNS)
+        max_images (int): Maximum image URLs per property
+
+    Returns:
+        Dict: {"items": [...], "next_cursor": str or None, "has_more": bool}
+    """
+    return _get_properties_page("p.district_key = %s", (district_key(district),), _ORDER_NEWEST,
+                                limit, cursor, columns, max_images)
+
+def get_properties_page_by_status(status: str, limit: int = 10, cursor: Optional[str] = None,
+                                  columns: Optional[Sequence[str]] = None,
+                                  max_images: int = DEFAULT_MAX_IMAGES) -> Dict:
+    """
+    One page of properties with a status, newest first
+
+    Args:
+        status (str): Property status (active, inactive)
+        limit, cursor, columns, max_images: See get_properties_page_by_district
+
+    Returns:
+        Dict: {"items": [...], "next_cursor": str or None, "has_more": bool}
+    """
+    return _get_properties_page("p.status = %s", (status,), _ORDER_NEWEST,
+                                limit, cursor, columns, max_images)
+
+def get_properties_page_by_price_range(min_price: float, max_price: float, limit: int = 10,
+                                       cursor: Optional[str] = None,
+                                       columns: Optional[Sequence[str]] = None,
+                                       max_images: int = DEFAULT_MAX_IMAGES) -> Dict:
+    """
+    One page of properties within a price range, cheapest first
+
+    Args:
+        min_price (float): Minimum price in millions VND
+        max_price (float): Maximum price in millions VND
+        limit, cursor, columns, max_images: See get_properties_page_by_district
+
+    Returns:
+        Dict: {"items": [...], "next_cursor": str or None, "has_more": bool}
+    """
+    return _get_properties_page("p.price BETWEEN %s AND %s", (min_price, max_price), _ORDER_CHEAPEST,
+                                limit, cursor, columns, max_images)
+
+async def aget_properties_page_by_district(district: str, limit: int = 10, cursor: Optional[str] = None,
+                                           columns: Optional[Sequence[str]] = None,
+                                           max_images: int = DEFAULT_MAX_IMAGES) -> Dict:
+    """Async version of get_properties_page_by_district"""
+    return await _aget_properties_page("p.district_key = %s", (district_key(district),), _ORDER_NEWEST,
+                                       limit, cursor, columns, max_images)
+
+async def aget_properties_page_by_status(status: str, limit: int = 10, cursor: Optional[str] = None,
+                                         columns: Optional[Sequence[str]] = None,
+                                         max_images: int = DEFAULT_MAX_IMAGES) -> Dict:
+    """Async version of get_properties_page_by_status"""
+    return await _aget_properties_page("p.status = %s", (status,), _ORDER_NEWEST,
+                                       limit, cursor, columns, max_images)
+
+async def aget_properties_page_by_price_range(min_price: float, max_price: float, limit: int = 10,
+                                              cursor: Optional[str] = None,
+                                              columns: Optional[Sequence[str]] = None,
+                                              max_images: int = DEFAULT_MAX_IMAGES) -> Dict:
+    """Async version of get_properties_page_by_price_range"""
+    return await _aget_properties_page("p.price BETWEEN %s AND %s", (min_price, max_price), _ORDER_CHEAPEST,
+                                       limit, cursor, columns, max_images)
+
 def main():
     """
     Hàm test các chức năng tìm kiếm bất động sản
@@ -12,6 +12,7 @@ CREATE TABLE IF NOT EXISTS properties (
     source_url VARCHAR(255),
     province VARCHAR(100) DEFAULT 'TPHCM',
     district VARCHAR(100) NOT NULL,
+    district_key VARCHAR(100), -- accent-folded district ("Quận 3" -> "3", "Bình Thạnh" -> "binh thanh"), set on write
     ward VARCHAR(100),
     street VARCHAR(255),
     longitude DECIMAL(10,8) CHECK (longitude BETWEEN -90 AND 90),
@@ -29,7 +30,8 @@ CREATE TABLE IF NOT EXISTS properties (
     PRIMARY KEY (id),
     -- Indexes for common queries
     INDEX idx_district (district),
-    INDEX idx_status (status),
+    INDEX idx_district_key (district_key, created_at),
+    INDEX idx_status (status, created_at),
     INDEX idx_price (price),
     INDEX idx_property_type (property_type),
     INDEX idx_transaction_type (transaction_type),
@@ -59,7 +61,8 @@ CREATE TABLE IF NOT EXISTS chat_history (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     
     PRIMARY KEY (id),
-    INDEX idx_thread_id (thread_id)
+    -- Serves "last N turns of a thread" without a filesort
+    INDEX idx_thread_created (thread_id, created_at)
 );
 
 -- User wallet table
@@ -6,6 +6,7 @@ from typing import List, Dict
 from app.database.chat_history_service import get_db_connection
 import json
 from app.database.product_service import init_properties_table
+from app.core.text_utils import district_key
 # from app.database.order_service import init_order_table
 # from app.database.wallet_service import init_wallet_table, create_wallet
 from decimal import Decimal
@@ -150,7 +151,7 @@ def seed_properties():
                         property_type, transaction_type, status,
                         bedrooms, bathrooms, area,
                         owner_name, owner_contact,
-                        street, ward, district, province,
+                        street, ward, district, district_key, province,
                         latitude, longitude
                     )
                     VALUES (
@@ -158,7 +159,7 @@ def seed_properties():
                         %s, %s, %s,
                         %s, %s, %s,
                         %s, %s,
-                        %s, %s, %s, %s,
+                        %s, %s, %s, %s, %s,
                         %s, %s
                     )
                     """,
@@ -178,6 +179,7 @@ def seed_properties():
                         specs["address"]["street"],
                         specs["address"]["ward"],
                         specs["address"]["district"],
+                        district_key(specs["address"]["district"]),
                         specs["address"]["province"],
                         specs["coordinates"]["latitude"],
                         specs["coordinates"]["longitude"]
@@ -0,0 +1,110 @@
+"""
+Benchmark the in-process listing index against the rental API radius search.
+
+Usage:
+    python benchmark_spatial_index.py                   # synthetic listings only
+    python benchmark_spatial_index.py --listings 50000
+    python benchmark_spatial_index.py --db              # index the properties table
+    python benchmark_spatial_index.py --http            # also time GET /posts?centerLat=...
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from app.core.geo_batch import HCMC_LAT_RANGE, HCMC_LON_RANGE
+from app.core.spatial_index import ListingIndex
+
+# Query points spread over the inner districts
+CENTER = (10.7769, 106.7009)
+
+
+def synthetic_rows(count: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    lats = rng.normal(CENTER[0], 0.06, count).clip(*HCMC_LAT_RANGE)
+    lons = rng.normal(CENTER[1], 0.06, count).clip(*HCMC_LON_RANGE)
+    prices = rng.uniform(1.5, 30.0, count).round(1)
+    types = np.array(["room", "apartment", "house"])[rng.integers(0, 3, count)]
+    return [
+        {
+            "id": i + 1,
+            "name": f"Listing {i + 1}",
+            "price": float(prices[i]),
+            "area": 20.0 + i % 80,
+            "property_type": str(types[i]),
+            "transaction_type": "rent",
+            "district": "Quận 1",
+            "latitude": float(lats[i]),
+            "longitude": float(lons[i]),
+        }
+        for i in range(count)
+    ]
+
+
+def timed(fn, runs: int):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 4),
+        "max_ms": round(samples[-1], 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listings", type=int, default=20000, help="Synthetic listing count")
+    parser.add_argument("--runs", type=int, default=500, help="Queries per benchmark")
+    parser.add_argument("--radius", type=float, default=2.0, help="Radius in km")
+    parser.add_argument("--db", action="store_true", help="Index the properties table instead of synthetic rows")
+    parser.add_argument("--http", action="store_true", help="Also time the rental API radius search")
+    args = parser.parse_args()
+
+    if args.db:
+        from app.core.spatial_index import listing_index as index
+        index.refresh(force=True)
+    else:
+        index = ListingIndex()
+        index.load(synthetic_rows(args.listings))
+    print(f"Index: {index.get_stats()}")
+
+    rng = np.random.default_rng(7)
+    points = list(zip(rng.normal(CENTER[0], 0.05, args.runs), rng.normal(CENTER[1], 0.05, args.runs)))
+    queries = iter(points * 4)
+
+    results = {
+        "radius": timed(lambda: index.nearby(*next(queries), args.radius), args.runs),
+        "radius+filters": timed(lambda: index.nearby(*next(queries), args.radius, max_price=10,
+                                                     property_type="room"), args.runs),
+        "knn(k=10)": timed(lambda: index.nearest(*next(queries), 10), args.runs),
+        "bounds(2x2km)": timed(lambda: index.within_bounds(*(lambda p: (p[0] - 0.009, p[1] - 0.009,
+                                                                         p[0] + 0.009, p[1] + 0.009))(next(queries))),
+                               args.runs),
+    }
+
+    if args.http:
+        from app.core.http_client import http_client, rental_posts_request
+
+        def http_radius():
+            lat, lng = next(queries)
+            http_client.send(rental_posts_request({
+                "page": 1, "limit": 10, "centerLat": lat, "centerLng": lng,
+                "radius": args.radius, "status": "active"
+            }))
+
+        try:
+            results["http radius"] = timed(http_radius, min(args.runs, 50))
+        except Exception as e:
+            print(f"HTTP benchmark skipped: {str(e)}")
+
+    for name, stats in results.items():
+        print(f"{name:<16} {stats}")
+
+
+if __name__ == "__main__":
+    main()
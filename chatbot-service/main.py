@@ -1,8 +1,27 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import router as api_router
+from app.core.ai.ai_service import warm_up_agent
+from app.core.http_client import http_client
+from app.core.spatial_index import listing_index
+from app.database.async_db_connection import async_db_pool
+from app.database.chat_history_writer import chat_history_writer
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the agent executor once so the first chat request doesn't pay for it
+    warm_up_agent()
+    # Load active listings into the spatial index used by radius/bounds searches
+    listing_index.warm_up()
+    yield
+    # Flush queued chat turns before the connections go away
+    await asyncio.to_thread(chat_history_writer.close)
+    await http_client.aclose()
+    await async_db_pool.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
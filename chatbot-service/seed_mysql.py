@@ -4,6 +4,7 @@ from datetime import datetime
 from dotenv import load_dotenv
 from app.database.db_connection import get_db_connection
 from app.database.db_connection import init_database
+from app.core.text_utils import district_key
 
 # Load environment variables
 load_dotenv()
@@ -68,7 +69,7 @@ def seed_data():
                         INSERT INTO properties (
                             id, name, description, price, area,
                             property_type, transaction_type, source_url,
-                            province, district, ward, street,
+                            province, district, district_key, ward, street,
                             latitude, longitude, displayed_address,
                             status, bedrooms, bathrooms,
                             contact_name, contact_phone, post_url,
@@ -76,7 +77,7 @@ def seed_data():
                         ) VALUES (
                             %s, %s, %s, %s, %s,
                             %s, %s, %s,
-                            %s, %s, %s, %s,
+                            %s, %s, %s, %s, %s,
                             %s, %s, %s,
                             %s, %s, %s,
                             %s, %s, %s,
@@ -93,6 +94,7 @@ def seed_data():
                         post.get('sourceUrl'),
                         post.get('province'),
                         post.get('district'),
+                        district_key(post.get('district')),
                         post.get('ward'),
                         post.get('street'),
                         post.get('latitude'),
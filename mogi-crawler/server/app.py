@@ -2,7 +2,10 @@ from flask import Flask, request, jsonify, redirect
 from flask_cors import CORS
 from flask_restful import Api, Resource
 import prediction
+from model_registry import model_registry
 import os
+import json
+import pandas as pd
 from dotenv import load_dotenv
 from utils import (
     standardize_province,
@@ -12,6 +15,9 @@ from utils import (
 
 load_dotenv()
 
+PREDICTION_BATCH_MAX_ROWS = int(os.getenv("PREDICTION_BATCH_MAX_ROWS", "10000"))
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
 app = Flask(__name__)
 cors = CORS(app, resources={r"/*": {"origins": "*"}})
 api = Api(app)
@@ -20,10 +26,27 @@ current_env = os.getenv("FLASK_ENV", "production")
 print(current_env)
 print(app.config["DEBUG"]) 
 
+# Load the model once at startup instead of on every prediction
+try:
+    model_registry.load()
+except Exception as e:
+    print(f"[MODEL] No model loaded at startup: {str(e)}")
+
 
 class CheckHealth(Resource):
     def get(self):
-        return {"status": "ok"}
+        stats = model_registry.get_stats()
+        if stats["model"] is None:
+            return {"status": "model unavailable", "model_version": None, "model": stats}, 503
+        return {
+            "status": "ok",
+            "model_version": model_registry.version,
+            "model": stats,
+            "unknown_categories": prediction.unknown_category_counts,
+            "micro_batching": prediction.micro_batcher.get_stats(),
+            "prediction_cache": prediction.prediction_cache.get_stats(),
+            "pid": os.getpid(),
+        }
 
 
 class PricePrediction(Resource):
@@ -38,8 +61,45 @@ class PricePrediction(Resource):
         return jsonify(prediction_result)
 
 
+class BatchPricePrediction(Resource):
+    def post(self):
+        # JSON array of listings, or NDJSON (one listing per line) read line by line
+        if request.mimetype in NDJSON_MIMETYPES:
+            try:
+                rows = [json.loads(line) for line in request.stream if line.strip()]
+            except ValueError as e:
+                return {"message": f"Invalid NDJSON: {str(e)}"}, 400
+        else:
+            rows = request.get_json()
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            return {"message": "Expected a JSON array or NDJSON of listing objects"}, 400
+        if len(rows) > PREDICTION_BATCH_MAX_ROWS:
+            return {"message": f"At most {PREDICTION_BATCH_MAX_ROWS} listings per batch"}, 413
+        if not rows:
+            return {"model_version": model_registry.version, "count": 0, "errors": 0, "predictions": []}
+
+        data = pd.DataFrame.from_records(rows)
+        missing = [column for column in prediction.FEATURE_COLUMNS if column not in data.columns]
+        if missing:
+            return {"message": f"Missing fields: {', '.join(missing)}"}, 400
+
+        data["province"] = standardize_province(data["province"])
+        data["district"] = standardize_district(data["district"])
+        data["ward"] = standardize_ward(data["ward"])
+        print(f"Batch received: {len(data)} listings")
+
+        predictions = prediction.predict_batch(data)
+        return {
+            "model_version": model_registry.version,
+            "count": len(predictions),
+            "errors": sum("error" in result for result in predictions),
+            "predictions": predictions,
+        }
+
+
 api.add_resource(CheckHealth, "/prices/health")
 api.add_resource(PricePrediction, "/prices/prediction")
+api.add_resource(BatchPricePrediction, "/prices/prediction/batch")
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
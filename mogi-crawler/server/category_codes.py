@@ -0,0 +1,50 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Code given to labels the encoder never saw (a district/ward missing from the
+# training data). It is outside the 0..n-1 range of the known labels, so the
+# forest routes it like the lowest codes instead of failing the request.
+UNKNOWN_CATEGORY_CODE = int(os.getenv("UNKNOWN_CATEGORY_CODE", "-1"))
+
+
+class CategoryCodes:
+    """
+    Label -> code lookup of one fitted LabelEncoder, built once at model load.
+
+    LabelEncoder codes are the positions of the labels in classes_, so the
+    lookup is a hash index over classes_ plus a code array whose last slot is
+    the unknown bucket. Encoding a column is one get_indexer call (-1 for
+    unseen labels) and one gather from the code array.
+    """
+
+    def __init__(self, classes, unknown_code=UNKNOWN_CATEGORY_CODE):
+        self.index = pd.Index(np.asarray(classes).astype(str))
+        self.unknown_code = unknown_code
+        # codes[-1] is the unknown bucket, which is where position -1 lands
+        self.codes = np.append(np.arange(len(self.index)), unknown_code)
+
+    @classmethod
+    def from_encoder(cls, encoder, unknown_code=UNKNOWN_CATEGORY_CODE):
+        return cls(encoder.classes_, unknown_code)
+
+    def __len__(self):
+        return len(self.index)
+
+    def encode(self, values):
+        """
+        Returns:
+            (codes, unknown): code per value and a mask of the values not seen
+            in training
+        """
+        positions = self.index.get_indexer(pd.Index(values).astype(str))
+        return self.codes[positions], positions < 0
+
+
+def build_category_codes(encoders):
+    """Lookups for the label encoders of a model, keyed by feature column"""
+    return {
+        "province": CategoryCodes.from_encoder(encoders["le_province"]),
+        "district": CategoryCodes.from_encoder(encoders["le_district"]),
+        "ward": CategoryCodes.from_encoder(encoders["le_ward"]),
+    }
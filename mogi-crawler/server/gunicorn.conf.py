@@ -0,0 +1,38 @@
+import gc
+import multiprocessing
+import os
+
+# Production serving mode for the price prediction API:
+#   cd mogi-crawler/server && gunicorn -c gunicorn.conf.py app:app
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("PREDICTION_WORKERS", multiprocessing.cpu_count()))
+# Threads per worker; concurrent requests of a worker share its model and
+# their single predictions are micro-batched
+worker_class = "gthread"
+threads = int(os.getenv("PREDICTION_THREADS", "8"))
+timeout = int(os.getenv("PREDICTION_TIMEOUT", "60"))
+accesslog = "-"
+
+# Import the app, and with it load the model, in the master before forking:
+# the forest's node arrays are then shared copy-on-write by all workers
+preload_app = True
+
+os.environ.setdefault("MICRO_BATCH_ENABLED", "1")
+# No hot reload inside the workers: each would unpickle its own copy of a new
+# model, losing the shared pages. A new model is picked up with
+# `kill -HUP <master pid>`, which loads it once in the master (on_reload) and
+# replaces the workers with fresh forks sharing it
+os.environ.setdefault("MODEL_RELOAD_INTERVAL", "0")
+
+
+def on_reload(server):
+    from model_registry import model_registry
+
+    model_registry.load()
+
+
+def pre_fork(server, worker):
+    # Keep the preloaded objects out of the workers' garbage collections, which
+    # would otherwise write to their headers and copy the shared pages
+    gc.freeze()
@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+# Group single predictions from concurrent requests into one model.predict call
+MICRO_BATCH_ENABLED = os.getenv("MICRO_BATCH_ENABLED", "0") == "1"
+# Extra time the first request of a batch waits for others to join. With 0 a
+# batch is whatever queued up while the previous one was being scored, which
+# adds no latency when traffic is low
+MICRO_BATCH_WAIT_MS = float(os.getenv("MICRO_BATCH_WAIT_MS", "0"))
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "64"))
+MICRO_BATCH_TIMEOUT = float(os.getenv("MICRO_BATCH_TIMEOUT", "30"))
+
+
+class MicroBatcher:
+    """
+    Collects rows submitted by concurrent request threads and scores them
+    together.
+
+    A worker thread takes the pending rows, optionally waits up to wait_ms for
+    more (at most max_size) and calls predict_many once for all of them; each
+    caller gets its own result back. If a batch fails, its rows are retried
+    one by one so a single bad row only fails its own request.
+
+    The worker thread is started on first use in each process, so a batcher
+    created before gunicorn forks works in every worker.
+    """
+
+    def __init__(self, predict_many, wait_ms=MICRO_BATCH_WAIT_MS, max_size=MICRO_BATCH_MAX_SIZE):
+        self.predict_many = predict_many
+        self.wait = wait_ms / 1000
+        self.max_size = max_size
+        self._pending = []
+        self._condition = threading.Condition()
+        self._pid = None
+        self.stats = {"requests": 0, "batches": 0, "largest_batch": 0, "batch_errors": 0}
+
+    def _ensure_worker(self):
+        if self._pid == os.getpid():
+            return
+        with self._condition:
+            if self._pid != os.getpid():
+                # Fresh after a fork: rows queued in the parent don't belong here
+                self._pending = []
+                threading.Thread(target=self._run, name="micro-batcher", daemon=True).start()
+                self._pid = os.getpid()
+
+    def submit(self, row):
+        """Queue a row and return a Future of its prediction"""
+        self._ensure_worker()
+        future = Future()
+        with self._condition:
+            self._pending.append((row, future))
+            self.stats["requests"] += 1
+            self._condition.notify()
+        return future
+
+    def predict(self, row, timeout=MICRO_BATCH_TIMEOUT):
+        return self.submit(row).result(timeout=timeout)
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+            deadline = time.monotonic() + self.wait
+            while len(self._pending) < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch = self._pending[:self.max_size]
+            del self._pending[:self.max_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            self.stats["batches"] += 1
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+            rows = [row for row, _ in batch]
+            try:
+                results = self.predict_many(rows)
+            except Exception as e:
+                self.stats["batch_errors"] += 1
+                print(f"[BATCH] Batch of {len(batch)} failed, predicting rows one by one: {str(e)}")
+                self._run_one_by_one(batch)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _run_one_by_one(self, batch):
+        for row, future in batch:
+            try:
+                future.set_result(self.predict_many([row])[0])
+            except Exception as e:
+                future.set_exception(e)
+
+    def get_stats(self):
+        with self._condition:
+            batches = self.stats["batches"]
+            return {
+                **self.stats,
+                "enabled": MICRO_BATCH_ENABLED,
+                "pending": len(self._pending),
+                "avg_batch_size": round(self.stats["requests"] / batches, 2) if batches else 0.0,
+            }
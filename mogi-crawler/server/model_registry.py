@@ -0,0 +1,151 @@
+import glob
+import hashlib
+import os
+import pickle
+import threading
+import time
+from datetime import datetime
+
+from category_codes import build_category_codes
+
+MODEL_DIR = os.getenv(
+    "MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "website_scraper", "models"),
+)
+MODEL_PATTERN = os.getenv("MODEL_PATTERN", "re_model*.pkl")
+ENCODER_PREFIX = os.getenv("ENCODER_PREFIX", "label_encoder")
+# How often (seconds) the model directory is checked for a new pickle, 0 disables hot reload
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "30"))
+
+
+class LoadedModel:
+    """A model with its label encoders, as loaded from one pair of pickles"""
+
+    def __init__(self, model, encoders, version, model_path, encoder_path):
+        self.model = model
+        self.encoders = encoders
+        # Category -> code lookups, built once per model instead of per request
+        self.category_codes = build_category_codes(encoders)
+        self.version = version
+        self.model_path = model_path
+        self.encoder_path = encoder_path
+        self.loaded_at = datetime.now().isoformat(timespec="seconds")
+
+    def info(self):
+        return {
+            "version": self.version,
+            "model_file": os.path.basename(self.model_path),
+            "encoder_file": os.path.basename(self.encoder_path),
+            "categories": {column: len(codes) for column, codes in self.category_codes.items()},
+            "loaded_at": self.loaded_at,
+        }
+
+
+class ModelRegistry:
+    """
+    Keeps the price model and its encoders in memory.
+
+    The newest pickle matching MODEL_PATTERN is loaded once (at startup) and
+    shared by all requests. Every MODEL_RELOAD_INTERVAL seconds a request
+    checks the directory; when a newer or changed pickle appears it is loaded
+    and swapped in. Requests in flight keep the model they started with.
+    A pickle that fails to load (e.g. still being copied) leaves the current
+    model in place and is retried on the next check.
+
+    Under gunicorn the check is off (MODEL_RELOAD_INTERVAL=0 in
+    gunicorn.conf.py): the master reloads on HUP and forks new workers.
+
+    The encoders of re_model_<suffix>.pkl are read from
+    label_encoder_<suffix>.pkl, or label_encoder.pkl if there is none.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, pattern=MODEL_PATTERN, reload_interval=MODEL_RELOAD_INTERVAL):
+        self.model_dir = model_dir
+        self.pattern = pattern
+        self.reload_interval = reload_interval
+        self._current = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"loads": 0, "reloads": 0, "load_errors": 0}
+
+    def _find_files(self):
+        models = glob.glob(os.path.join(self.model_dir, self.pattern))
+        if not models:
+            raise FileNotFoundError(f"No model matching {self.pattern} in {self.model_dir}")
+        model_path = max(models, key=os.path.getmtime)
+
+        prefix = self.pattern.split("*")[0]
+        suffix = os.path.basename(model_path)[len(prefix):]
+        encoder_path = os.path.join(self.model_dir, ENCODER_PREFIX + suffix)
+        if not os.path.exists(encoder_path):
+            encoder_path = os.path.join(self.model_dir, ENCODER_PREFIX + ".pkl")
+        return model_path, encoder_path
+
+    @staticmethod
+    def _signature_of(paths):
+        return tuple((path, os.path.getmtime(path), os.path.getsize(path)) for path in paths)
+
+    def _load(self, model_path, encoder_path):
+        with open(model_path, "rb") as f:
+            model_bytes = f.read()
+        with open(encoder_path, "rb") as f:
+            encoder_bytes = f.read()
+
+        model = pickle.loads(model_bytes)
+        encoders = pickle.loads(encoder_bytes)
+
+        name = os.path.splitext(os.path.basename(model_path))[0]
+        digest = hashlib.sha1(model_bytes + encoder_bytes).hexdigest()[:10]
+        return LoadedModel(model, encoders, f"{name}-{digest}", model_path, encoder_path)
+
+    def load(self):
+        """Load the newest model now (raises if there is none and nothing is loaded yet)"""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                paths = self._find_files()
+                signature = self._signature_of(paths)
+                if self._current is not None and signature == self._signature:
+                    return self._current
+
+                started = time.perf_counter()
+                loaded = self._load(*paths)
+            except Exception as e:
+                self.stats["load_errors"] += 1
+                print(f"[MODEL] Failed to load model: {str(e)}")
+                if self._current is None:
+                    raise
+                return self._current
+
+            if self._current is not None:
+                self.stats["reloads"] += 1
+            self.stats["loads"] += 1
+            self._current = loaded
+            self._signature = signature
+            print(f"[MODEL] Loaded {loaded.version} in {(time.perf_counter() - started) * 1000:.0f}ms")
+            return loaded
+
+    def get(self):
+        """Current model, reloading first if the check interval has passed"""
+        current = self._current
+        if current is None:
+            return self.load()
+        if self.reload_interval > 0 and time.monotonic() - self._checked_at >= self.reload_interval:
+            return self.load()
+        return current
+
+    @property
+    def version(self):
+        return self._current.version if self._current is not None else None
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "model": self._current.info() if self._current is not None else None,
+            "reload_interval": self.reload_interval,
+        }
+
+
+# Shared registry used by the prediction module
+model_registry = ModelRegistry()
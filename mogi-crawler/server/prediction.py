@@ -1,29 +1,153 @@
-import pickle
+import threading
+import numpy as np
 import pandas as pd
-from sklearn.preprocessing import LabelEncoder
+from model_registry import model_registry
+from micro_batcher import MicroBatcher, MICRO_BATCH_ENABLED
+from prediction_cache import PredictionCache
 
+FEATURE_COLUMNS = [
+    "province",
+    "district",
+    "ward",
+    "location_latitude",
+    "location_longitude",
+    "area",
+    "bedrooms",
+    "bathrooms",
+]
+CATEGORY_COLUMNS = ["province", "district", "ward"]
+NUMERIC_COLUMNS = [column for column in FEATURE_COLUMNS if column not in CATEGORY_COLUMNS]
 
-def predict_price(data):
-    model = pickle.load(open("../website_scraper/models/re_model.pkl", "rb"))
-    encoders = pickle.load(open("../website_scraper/models/label_encoder.pkl", "rb"))
+# Rows encoded with the unknown bucket, per column
+unknown_category_counts = {column: 0 for column in CATEGORY_COLUMNS}
+_stats_lock = threading.Lock()
 
-    if type(data) == dict:
-        data = pd.DataFrame(data, index=[0])
-        data["district"] = encoders["le_district"].transform(data["district"])
-        data["province"] = encoders["le_province"].transform(data["province"])
-        data["ward"] = encoders["le_ward"].transform(data["ward"])
-
-    data = data[
-        [
-            "province",
-            "district",
-            "ward",
-            "location_latitude",
-            "location_longitude",
-            "area",
-            "bedrooms",
-            "bathrooms",
-        ]
+
+def encode_features(data, category_codes):
+    """
+    Replace the category columns with their codes (a vectorized gather per
+    column). Labels the model never saw get the unknown code.
+
+    Returns:
+        (encoded frame, boolean mask of unknown labels per row and category column)
+    """
+    data = data.copy()
+    unknown = np.zeros((len(data), len(CATEGORY_COLUMNS)), dtype=bool)
+    for i, column in enumerate(CATEGORY_COLUMNS):
+        data[column], unknown[:, i] = category_codes[column].encode(data[column])
+
+    counts = unknown.sum(axis=0)
+    if counts.any():
+        with _stats_lock:
+            for column, count in zip(CATEGORY_COLUMNS, counts):
+                unknown_category_counts[column] += int(count)
+    return data, unknown
+
+
+def coerce_numeric_features(data):
+    """
+    Convert the numeric feature columns to floats. Values that aren't finite
+    numbers ("30 m2", missing) become NaN and can't be scored.
+
+    Returns:
+        (converted frame, list with the invalid numeric columns of each row)
+    """
+    data = data.copy()
+    invalid = np.zeros((len(data), len(NUMERIC_COLUMNS)), dtype=bool)
+    for i, column in enumerate(NUMERIC_COLUMNS):
+        data[column] = pd.to_numeric(data[column], errors="coerce").astype(float)
+        invalid[:, i] = ~np.isfinite(data[column].to_numpy())
+    return data, [[column for column, flag in zip(NUMERIC_COLUMNS, row) if flag] for row in invalid]
+
+
+def _score(data, loaded):
+    # One model.predict call for all rows; results are returned in row order
+    data, unknown = encode_features(data, loaded.category_codes)
+    prices = loaded.model.predict(data[FEATURE_COLUMNS]).tolist()
+
+    results = []
+    for price, row_unknown in zip(prices, unknown):
+        result = {"price": price}
+        if row_unknown.any():
+            # Still predicted, but from a location the model doesn't know
+            result["unknown_fields"] = [column for column, flag in zip(CATEGORY_COLUMNS, row_unknown) if flag]
+        results.append(result)
+    return results
+
+
+def _score_rows(rows):
+    return _score(pd.DataFrame.from_records(rows), model_registry.get())
+
+
+def predict_prices(data):
+    # Score many standardized rows (a DataFrame or a list of dicts); rows seen
+    # before are answered from the cache and the rest are scored together
+    if not isinstance(data, pd.DataFrame):
+        data = pd.DataFrame.from_records(data)
+    loaded = model_registry.get()
+    if not prediction_cache.enabled:
+        return _score(data, loaded)
+
+    prediction_cache.sync(loaded.version)
+    keys = prediction_cache.keys(data)
+    results = [prediction_cache.get(key) for key in keys]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        for i, result in zip(missing, _score(data.iloc[missing], loaded)):
+            results[i] = result
+            prediction_cache.put(keys[i], result, loaded.version)
+    return results
+
+
+def predict_batch(data):
+    """
+    Score a standardized batch, one result per row in input order. A row that
+    can't be scored gets {"error": ...} instead of failing the whole batch.
+    """
+    data, invalid = coerce_numeric_features(data)
+    results = [
+        {"error": f"Invalid or missing numeric fields: {', '.join(columns)}"} if columns else None
+        for columns in invalid
     ]
-    prediction = model.predict(data)
-    return {"price": prediction[0]}
+    valid = [i for i, result in enumerate(results) if result is None]
+    if not valid:
+        return results
+
+    try:
+        scored = predict_prices(data.iloc[valid])
+    except Exception as e:
+        # Something else in the batch breaks the model: retry row by row
+        print(f"[BATCH] Batch of {len(valid)} failed, predicting rows one by one: {str(e)}")
+        scored = []
+        for i in valid:
+            try:
+                scored.append(predict_prices(data.iloc[[i]])[0])
+            except Exception as row_error:
+                scored.append({"error": str(row_error)})
+    for i, result in zip(valid, scored):
+        results[i] = result
+    return results
+
+
+# Results by standardized, rounded features; emptied when the model is reloaded
+prediction_cache = PredictionCache()
+# Single predictions of concurrent requests are scored together when enabled
+micro_batcher = MicroBatcher(_score_rows)
+
+
+def predict_price(data):
+    if type(data) == dict:
+        loaded = model_registry.get()
+        prediction_cache.sync(loaded.version)
+        key = prediction_cache.key(data)
+        cached = prediction_cache.get(key)
+        if cached is not None:
+            return cached
+
+        if MICRO_BATCH_ENABLED:
+            result = micro_batcher.predict(data)
+        else:
+            result = _score_rows([data])[0]
+        prediction_cache.put(key, result, loaded.version)
+        return result
+    return predict_prices(data)[0]
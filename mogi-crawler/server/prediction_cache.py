@@ -0,0 +1,118 @@
+import os
+import threading
+from collections import OrderedDict
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+# Coordinates are rounded to 4 decimals (~11 m) and area to 1 decimal, so a
+# re-submitted or re-crawled listing maps to the same key
+PREDICTION_CACHE_COORD_DECIMALS = int(os.getenv("PREDICTION_CACHE_COORD_DECIMALS", "4"))
+PREDICTION_CACHE_AREA_DECIMALS = int(os.getenv("PREDICTION_CACHE_AREA_DECIMALS", "1"))
+
+
+class PredictionCache:
+    """
+    LRU of prediction results keyed on the standardized feature tuple
+    (province, district, ward, lat, lon, area, bedrooms, bathrooms) with
+    coordinates and area rounded.
+
+    Entries belong to one model version: sync() with a different version
+    (after a reload) empties the cache.
+    """
+
+    def __init__(self, max_size=PREDICTION_CACHE_SIZE, coord_decimals=PREDICTION_CACHE_COORD_DECIMALS,
+                 area_decimals=PREDICTION_CACHE_AREA_DECIMALS):
+        self.max_size = max_size
+        self.coord_decimals = coord_decimals
+        self.area_decimals = area_decimals
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def key(self, row):
+        """Cache key of a standardized row (a dict), or None if its values can't be keyed"""
+        try:
+            return (
+                str(row["province"]),
+                str(row["district"]),
+                str(row["ward"]),
+                round(float(row["location_latitude"]), self.coord_decimals),
+                round(float(row["location_longitude"]), self.coord_decimals),
+                round(float(row["area"]), self.area_decimals),
+                float(row["bedrooms"]),
+                float(row["bathrooms"]),
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def keys(self, data):
+        """Cache keys of all rows of a standardized DataFrame, computed column-wise"""
+        try:
+            columns = [
+                data["province"].astype(str),
+                data["district"].astype(str),
+                data["ward"].astype(str),
+                data["location_latitude"].astype(float).round(self.coord_decimals),
+                data["location_longitude"].astype(float).round(self.coord_decimals),
+                data["area"].astype(float).round(self.area_decimals),
+                data["bedrooms"].astype(float),
+                data["bathrooms"].astype(float),
+            ]
+        except (KeyError, TypeError, ValueError):
+            # Some row can't be converted: key row by row, that row gets None
+            return [self.key(row) for row in data.to_dict("records")]
+        return list(zip(*(column.tolist() for column in columns)))
+
+    def sync(self, version):
+        """Drop all entries when the model version changed"""
+        if version == self.version:
+            return
+        with self._lock:
+            if version != self.version:
+                if self._entries:
+                    self.stats["invalidations"] += 1
+                self._entries.clear()
+                self.version = version
+
+    def get(self, key):
+        if key is None or not self.enabled:
+            return None
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return dict(result)
+
+    def put(self, key, result, version):
+        if key is None or not self.enabled:
+            return
+        with self._lock:
+            # A result computed with a model that was replaced meanwhile is not stored
+            if version != self.version:
+                return
+            self._entries[key] = dict(result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "model_version": self.version,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
@@ -1,4 +1,5 @@
 import re
+import pandas as pd
 
 province_dict = {
     "Hồ Chí Minh": "TPHCM",
@@ -80,21 +81,46 @@ province_dict = {
 }
 
 
+_DISTRICT_PREFIXES = r"Quận|Huyện|Thị xã|Thị trấn"
+_WARD_PREFIXES = r"Xã|Phường|Thị trấn|Thị xã"
+
+
+def _standardize_column(values, transform):
+    # A crawl repeats the same few provinces/districts/wards: transform each
+    # distinct value once, then gather the results back into row order.
+    # Missing values become "" (never the -1 sentinel, which would wrap to
+    # another row's value), so they reach the model's unknown bucket
+    codes, uniques = pd.factorize(values.fillna("").astype(str), use_na_sentinel=False)
+    standardized = transform(pd.Series(uniques)).to_numpy()
+    return pd.Series(standardized[codes], index=values.index)
+
+
 def standardize_province(province):
+    # Vectorized for a whole column (batch prediction)
+    if isinstance(province, pd.Series):
+        return _standardize_column(province, lambda names: names.map(province_dict).fillna(names))
     print("PROVINCE", province)
     print("STANDARDIZED PROVINCE", province_dict.get(province, province))
     return province_dict.get(province, province)
 
 
 def standardize_district(district):
+    if isinstance(district, pd.Series):
+        return _standardize_column(
+            district, lambda names: names.str.replace(_DISTRICT_PREFIXES, "", regex=True).str.strip()
+        )
     # district = district.lower()
-    district = re.sub(r"Quận|Huyện|Thị xã|Thị trấn", "", district)
+    district = re.sub(_DISTRICT_PREFIXES, "", district)
     district = district.strip()
     return district
 
 
 def standardize_ward(ward):
+    if isinstance(ward, pd.Series):
+        return _standardize_column(
+            ward, lambda names: names.str.replace(_WARD_PREFIXES, "", regex=True).str.strip()
+        )
     # ward = ward.lower()
-    ward = re.sub(r"Xã|Phường|Thị trấn|Thị xã", "", ward)
+    ward = re.sub(_WARD_PREFIXES, "", ward)
     ward = ward.strip()
     return ward